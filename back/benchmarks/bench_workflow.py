@@ -0,0 +1,228 @@
+"""
+Banc d'essai hors ligne du NewsProcessingWorkflow : chaque étape est chronométrée (durée, pic mémoire)
+sur des corpus synthétiques de tailles croissantes, contre une base MongoDB locale et de faux services
+OpenAI / Telegram / sites d'actualité. Les résultats sont enregistrés en JSON (voir `compare.py`).
+
+    python benchmarks/bench_workflow.py --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACK_DIR = os.path.dirname(BENCH_DIR)
+for module_dir in ("core", "ingestion", "workflow"):
+    sys.path.insert(0, os.path.join(BACK_DIR, module_dir))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_corpus import SyntheticCorpus
+from fake_services import FakeAPIServer, FixtureServer
+from mongo_standin import MongoStandIn
+
+STEPS = [
+    "scrape_articles",
+    "index_articles",
+    "refine_article_categories",
+    "label_clusters",
+    "summarize_clusters",
+    "finalize_workflow",
+]
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def git_revision():
+    """Commit courant (et présence de modifications non commitées), pour comparer les résultats entre commits."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACK_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACK_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def max_rss_mb():
+    """
+    Pic de mémoire résidente du processus et de ses enfants (processus d'extraction), en Mo.
+    Valeurs cumulées depuis le lancement : une étape ne peut que les conserver ou les augmenter.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+
+def configure_environment(api, mongo_uri, args):
+    """Variables lues par le code du workflow : elles doivent être en place avant son import."""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{api.url}/v1",
+        "TELEGRAM_API_URL": api.url,
+        "TELEGRAM_TOKEN": "bench",
+        "TELEGRAM_ID": "bench-chat",
+        "MONGO_URI": mongo_uri,
+        "MONGO_COLLECTION": "articles",
+        "VECTOR_STORAGE_FORMAT": "float32",
+        "VECTOR_STORE_PATH": "",
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_REQUESTS_PER_MINUTE": str(args.client_rpm),
+        "LLM_TOKENS_PER_MINUTE": str(args.client_tpm),
+    })
+
+
+async def run_size(size, args, api):
+    """Pré-charge un corpus de `size` articles puis exécute et mesure chaque étape du workflow."""
+    from llama_index.core.workflow import StartEvent
+    from rss_scraper import RSSScraper
+    from workflow import NewsProcessingWorkflow
+    from metrics import get_metrics
+
+    corpus = SyntheticCorpus(size, seed=args.seed)
+    api.corpus = corpus
+    scraped = int(size * args.scrape_fraction)
+    seeded = size - scraped
+    os.environ["MONGO_DB_NAME"] = f"bench_{size}"
+
+    with FixtureServer(corpus, range(seeded, size), latency=args.fixture_latency) as fixtures:
+        workflow = NewsProcessingWorkflow(duration=7, timeout=None, incremental_clusters=not args.full_clustering,
+                                          combined_labels=args.combined_labels)
+        workflow.scraper = RSSScraper(workflow.db_manager, politeness_delay=0, max_per_host=args.max_per_host,
+                                      extract_workers=args.extract_workers)
+        workflow.outbox.chat_interval = 0
+        db = workflow.db_manager.db
+
+        print(f"🧪 {size} articles : pré-chargement de {seeded} articles"
+              f"{' sans embedding' if args.unembedded_seed else ''}, {scraped} à scraper...")
+        started = time.perf_counter()
+        for batch in corpus.documents(stop=seeded, batch_size=1000, embedded=not args.unembedded_seed):
+            workflow.db_manager.collection.insert_many(batch, ordered=False)
+        db["sources"].insert_many([{"url": url, "category": category} for url, category in fixtures.feed_urls().items()])
+        seed_seconds = time.perf_counter() - started
+
+        get_metrics().reset()
+        steps, event = {}, StartEvent()
+        quiet = None if args.verbose else open(os.devnull, "w")  # Les traces du workflow faussent les mesures
+        for name in STEPS:
+            requests_before = Counter(api.counters)
+            if args.tracemalloc:
+                tracemalloc.reset_peak()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+                event = await getattr(workflow, name)(event)
+            seconds = time.perf_counter() - started
+            own_rss, children_rss = max_rss_mb()
+            steps[name] = {
+                "seconds": round(seconds, 3),
+                "peak_mb": round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1) if args.tracemalloc else None,
+                "max_rss_mb_cumulative": own_rss,
+                "children_max_rss_mb_cumulative": children_rss,
+                "requests": dict(Counter(api.counters) - requests_before),
+            }
+            print(f"   ⏱️ {name} : {seconds:.2f}s (pic Python {steps[name]['peak_mb']} Mo, RSS max. cumulé {own_rss} Mo)")
+
+        counts = {
+            "articles": db["articles"].count_documents({}),
+            "duplicates": db["articles"].count_documents({"duplicate_of": {"$exists": True}}),
+            "clusters": db["clusters"].count_documents({}),
+            "telegram_messages": db["telegram_outbox"].count_documents({"status": "sent"}),
+        }
+        fixture_requests = dict(fixtures.counters)
+        if quiet:
+            quiet.close()
+
+    if not args.keep_data:
+        workflow.db_manager.client.drop_database(db.name)
+    return {
+        "articles": size,
+        "seeded": seeded,
+        "scraped": scraped,
+        "seed_seconds": round(seed_seconds, 3),
+        "total_seconds": round(sum(step["seconds"] for step in steps.values()), 3),
+        "steps": steps,
+        "counts": counts,
+        "fixture_requests": fixture_requests,
+        "metrics": get_metrics().steps_summary(),  # Allers-retours MongoDB, requêtes et tokens OpenAI par étape
+    }
+
+
+async def main(args):
+    commit, dirty = git_revision()
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": vars(args),
+        # Quotas du pool LLM côté client : trop bas, ils mesurent l'attente du limiteur plutôt que le code
+        "client_limits": {"requests_per_minute": args.client_rpm, "tokens_per_minute": args.client_tpm},
+        "runs": {},
+    }
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    api = FakeAPIServer(
+        SyntheticCorpus(1, seed=args.seed),
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency,
+        telegram_latency=args.telegram_latency,
+        requests_per_minute=args.server_rpm,
+        telegram_per_minute=args.telegram_rpm,
+        error_rate=args.error_rate,
+    )
+    with api, MongoStandIn(args.mongo_uri) as mongo:
+        configure_environment(api, mongo.uri, args)
+        results["mongo"] = mongo.kind
+        # Tailles croissantes : le pic RSS du processus reste attribuable au plus gros corpus traité
+        for size in sorted(args.sizes):
+            results["runs"][str(size)] = await run_size(size, args, api)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nocommit'}{'-dirty' if dirty else ''}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"💾 Résultats enregistrés dans {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne du workflow (étapes chronométrées, pic mémoire)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Tailles de corpus à mesurer")
+    parser.add_argument("--scrape-fraction", type=float, default=0.05, help="Part du corpus servie par les flux (le reste est pré-chargé)")
+    parser.add_argument("--unembedded-seed", action="store_true", help="Pré-charge le corpus sans embeddings : l'encodage porte sur tous les articles")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du corpus synthétique")
+    parser.add_argument("--mongo-uri", help="Serveur MongoDB à utiliser (par défaut : mongod temporaire, sinon mongomock)")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Latence simulée d'une requête d'embeddings (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Latence simulée d'une requête de chat (s)")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Latence simulée d'un envoi Telegram (s)")
+    parser.add_argument("--fixture-latency", type=float, default=0.0, help="Latence simulée des sites d'actualité (s)")
+    parser.add_argument("--server-rpm", type=int, default=0, help="Quota du faux serveur OpenAI, en requêtes/minute (0 : illimité)")
+    parser.add_argument("--telegram-rpm", type=int, default=0, help="Quota du faux serveur Telegram, en messages/minute (0 : illimité)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part de réponses 500 du faux serveur OpenAI")
+    parser.add_argument("--client-rpm", type=int, default=100000, help="Quota requêtes/minute du pool LLM côté client")
+    parser.add_argument("--client-tpm", type=int, default=100000000, help="Quota tokens/minute du pool LLM côté client")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Requêtes de chat simultanées")
+    parser.add_argument("--max-per-host", type=int, default=20, help="Téléchargements simultanés vers le serveur de fixtures")
+    parser.add_argument("--extract-workers", type=int, help="Processus d'extraction HTML (par défaut, un par cœur)")
+    parser.add_argument("--full-clustering", action="store_true", help="Clustering complet à chaque passage (sans ClusterStore)")
+    parser.add_argument("--combined-labels", action="store_true", help="Label et résumé en un seul appel")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false", help="Désactive la mesure du pic mémoire Python (plus rapide)")
+    parser.add_argument("--keep-data", action="store_true", help="Conserve les bases de test après la mesure")
+    parser.add_argument("--verbose", action="store_true", help="Affiche la sortie des étapes du workflow")
+    parser.add_argument("--output", help="Fichier JSON de résultats (par défaut benchmarks/results/<date>-<commit>.json)")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,76 @@
+"""
+Compare deux résultats du banc d'essai (ex. deux commits) étape par étape :
+
+    python benchmarks/compare.py benchmarks/results/avant.json benchmarks/results/apres.json --threshold 0.1
+
+Le code de sortie vaut 1 si une étape ralentit (ou consomme plus de mémoire) au-delà du seuil.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def relative_change(before, after):
+    if before is None or after is None:
+        return None
+    if before == 0:
+        return 0.0 if after == 0 else float("inf")
+    return (after - before) / before
+
+
+def compare(baseline, candidate, threshold=0.1, min_seconds=0.05):
+    """
+    Écarts par taille de corpus et par étape.
+    :param threshold: Hausse relative à partir de laquelle une mesure est une régression.
+    :param min_seconds: Durée en dessous de laquelle une étape est ignorée (bruit de mesure).
+    :return: Liste de lignes {size, step, metric, before, after, change, regression}.
+    """
+    rows = []
+    for size, run in candidate["runs"].items():
+        base_run = baseline["runs"].get(size)
+        if base_run is None:
+            continue
+        for step, measures in run["steps"].items():
+            base_measures = base_run["steps"].get(step)
+            if base_measures is None:
+                continue
+            for metric in ("seconds", "peak_mb"):
+                before, after = base_measures.get(metric), measures.get(metric)
+                change = relative_change(before, after)
+                if change is None:
+                    continue
+                noisy = metric == "seconds" and max(before, after) < min_seconds
+                rows.append({
+                    "size": size, "step": step, "metric": metric, "before": before, "after": after,
+                    "change": change, "regression": change > threshold and not noisy
+                })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparaison de deux résultats du banc d'essai")
+    parser.add_argument("baseline", help="Résultats de référence (JSON)")
+    parser.add_argument("candidate", help="Résultats à évaluer (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Hausse relative tolérée (0.1 = +10 %%)")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Durée en dessous de laquelle les écarts sont ignorés")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"📊 {baseline.get('commit')} → {candidate.get('commit')} (seuil +{args.threshold:.0%})")
+    rows = compare(baseline, candidate, args.threshold, args.min_seconds)
+    for row in rows:
+        flag = "⚠️" if row["regression"] else ("✅" if row["change"] < -args.threshold else "  ")
+        unit = "s" if row["metric"] == "seconds" else " Mo"
+        print(f"{flag} {row['size']:>7} {row['step']:<27} {row['metric']:<8} "
+              f"{row['before']:>10.2f}{unit} → {row['after']:>10.2f}{unit} ({row['change']:+.1%})")
+
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"❌ {len(regressions)} régression(s) au-delà de +{args.threshold:.0%}")
+        sys.exit(1)
+    print("✅ Aucune régression")
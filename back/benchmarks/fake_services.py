@@ -0,0 +1,242 @@
+import asyncio
+import base64
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import timedelta, date
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+import numpy as np
+from aiohttp import web
+
+
+class RateLimiter:
+    """Seau à jetons côté serveur : au-delà de `per_minute` requêtes par minute, le serveur répond 429."""
+
+    def __init__(self, per_minute=0):
+        self.per_minute = per_minute
+        self.capacity = per_minute / 60 * 5 if per_minute else 0  # Rafale de 5 secondes
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def allow(self):
+        """Consomme un jeton ; renvoie (autorisé, délai conseillé en secondes)."""
+        if not self.per_minute:
+            return True, 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) * 60 / self.per_minute
+
+
+class BackgroundServer:
+    """Application aiohttp servie depuis un thread dédié (sa propre boucle), sur un port libre de 127.0.0.1."""
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.socket.getsockname()[1]}"
+
+    async def _start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.SockSite(self.runner, self.socket).start()
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class FakeAPIServer(BackgroundServer):
+    """
+    Faux serveur OpenAI (`/v1/embeddings`, `/v1/chat/completions`) et Telegram (`/bot<token>/sendMessage`),
+    avec latence, limites de débit (429 + `retry-after`) et taux d'erreurs 5xx réglables.
+    Les embeddings sont calculés à partir du texte par le corpus synthétique (mêmes vecteurs que le corpus pré-chargé).
+    """
+
+    def __init__(self, corpus, embedding_latency=0.05, chat_latency=0.5, telegram_latency=0.05,
+                 requests_per_minute=0, telegram_per_minute=0, error_rate=0.0):
+        """
+        :param corpus: SyntheticCorpus servant à calculer les embeddings.
+        :param embedding_latency: Latence (en secondes) d'une requête d'embeddings.
+        :param chat_latency: Latence (en secondes) d'une requête de chat.
+        :param telegram_latency: Latence (en secondes) d'un envoi Telegram.
+        :param requests_per_minute: Quota OpenAI (requêtes/minute, 0 pour aucune limite).
+        :param telegram_per_minute: Quota Telegram (messages/minute, 0 pour aucune limite).
+        :param error_rate: Probabilité qu'une requête OpenAI échoue en 500.
+        """
+        self.corpus = corpus
+        self.embedding_latency = embedding_latency
+        self.chat_latency = chat_latency
+        self.telegram_latency = telegram_latency
+        self.error_rate = error_rate
+        self.openai_limit = RateLimiter(requests_per_minute)
+        self.telegram_limit = RateLimiter(telegram_per_minute)
+        self.counters = Counter()
+        self.message_id = 0
+
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/bot{token}/sendMessage", self.send_message)
+        super().__init__(app)
+
+    def _openai_error(self, endpoint):
+        """Réponse d'erreur simulée (quota ou panne) à renvoyer, ou None."""
+        allowed, retry_after = self.openai_limit.allow()
+        if not allowed:
+            self.counters[f"{endpoint}_429"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429, headers={"retry-after": f"{retry_after:.2f}"}
+            )
+        if self.error_rate and random.random() < self.error_rate:
+            self.counters[f"{endpoint}_500"] += 1
+            return web.json_response({"error": {"message": "Internal error", "type": "server_error"}}, status=500)
+        return None
+
+    async def embeddings(self, request):
+        error = self._openai_error("embeddings")
+        if error is not None:
+            return error
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(self.embedding_latency)
+
+        vectors = [self.corpus.embed_text(text) for text in texts]
+        if body.get("encoding_format") == "base64":
+            encoded = [base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode() for vector in vectors]
+        else:
+            encoded = [vector.tolist() for vector in vectors]
+        tokens = sum(len(text.split()) for text in texts)
+        self.counters["embeddings"] += 1
+        self.counters["embedding_inputs"] += len(texts)
+        return web.json_response({
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(encoded)],
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    async def chat_completions(self, request):
+        error = self._openai_error("chat")
+        if error is not None:
+            return error
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        await asyncio.sleep(self.chat_latency)
+
+        words = prompt.split()
+        summary = " ".join(words[-60:])
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps({"label": " ".join(words[-4:]), "summary": summary}, ensure_ascii=False)
+        else:
+            content = summary
+        self.counters["chat"] += 1
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return web.json_response({
+            "id": f"chatcmpl-{self.counters['chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+    async def send_message(self, request):
+        allowed, retry_after = self.telegram_limit.allow()
+        if not allowed:
+            self.counters["telegram_429"] += 1
+            return web.json_response({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                      "parameters": {"retry_after": max(1, round(retry_after))}}, status=429)
+        await request.json()
+        await asyncio.sleep(self.telegram_latency)
+        self.counters["telegram"] += 1
+        self.message_id += 1
+        return web.json_response({"ok": True, "result": {"message_id": self.message_id}})
+
+
+class FixtureServer(BackgroundServer):
+    """
+    Serveur local de flux RSS et de pages HTML pour le scraper : un flux par catégorie
+    (`/feeds/<catégorie>.xml`), une page par article (`/articles/<numéro>.html`), générées depuis le corpus synthétique.
+    """
+
+    def __init__(self, corpus, numbers, latency=0.0):
+        """
+        :param corpus: SyntheticCorpus d'où viennent les articles.
+        :param numbers: Numéros des articles publiés dans les flux (articles « nouveaux » pour le scraper).
+        :param latency: Latence (en secondes) de chaque réponse.
+        """
+        self.corpus = corpus
+        self.latency = latency
+        self.counters = Counter()
+        self.feeds = {}
+        for number in numbers:
+            self.feeds.setdefault(corpus.category_of(number), []).append(number)
+
+        app = web.Application()
+        app.router.add_get("/feeds/{category}.xml", self.feed)
+        app.router.add_get("/articles/{number}.html", self.page)
+        super().__init__(app)
+
+    def feed_urls(self):
+        """{url du flux: catégorie}, à enregistrer dans la collection `sources`."""
+        return {f"{self.url}/feeds/{category}.xml": category for category in self.feeds}
+
+    def _article(self, number):
+        return self.corpus.article(number, base_url=self.url, day=date.today() - timedelta(days=1))
+
+    async def feed(self, request):
+        await asyncio.sleep(self.latency)
+        self.counters["feeds"] += 1
+        items = []
+        for number in self.feeds.get(request.match_info["category"], []):
+            article = self._article(number)
+            items.append(
+                f"<item><title>{escape(article['title'])}</title><link>{article['link']}</link>"
+                f"<guid>{article['link']}</guid><pubDate>{format_datetime(article['pub_date'])}</pubDate>"
+                f"<description>{escape(article['description'])}</description></item>"
+            )
+        xml = (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+               f"<title>{request.match_info['category']}</title><link>{self.url}</link>"
+               f"<description>Flux de test</description>{''.join(items)}</channel></rss>")
+        return web.Response(text=xml, content_type="application/rss+xml")
+
+    async def page(self, request):
+        await asyncio.sleep(self.latency)
+        self.counters["pages"] += 1
+        article = self._article(int(request.match_info["number"]))
+        paragraphs = "".join(f"<p>{escape(paragraph)}</p>" for paragraph in article["content"].split("\n\n"))
+        html = (f"<html><head><title>{escape(article['title'])}</title></head><body>"
+                f"<nav><a href='/'>Accueil</a></nav><article><h1>{escape(article['title'])}</h1>{paragraphs}</article>"
+                f"<footer><p>Mentions légales</p></footer></body></html>")
+        return web.Response(text=html, content_type="text/html")
@@ -0,0 +1,86 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from mongo_registry import set_client, close_clients
+
+
+class MongoStandIn:
+    """
+    Base MongoDB locale et jetable pour les bancs d'essai :
+    - une URI fournie (serveur existant) est utilisée telle quelle ;
+    - sinon un `mongod` temporaire est lancé si le binaire est disponible (`MONGOD_PATH` ou `PATH`) ;
+    - à défaut, repli sur mongomock (en mémoire, sans index : les étapes liées à MongoDB n'y sont pas représentatives).
+    """
+
+    def __init__(self, uri=None, mongod_path=None):
+        self.uri = uri
+        self.mongod_path = mongod_path or os.getenv("MONGOD_PATH") or shutil.which("mongod")
+        self.kind = None
+        self.process = None
+        self.directory = None
+
+    @staticmethod
+    def _free_port():
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def _start_mongod(self, timeout=30):
+        self.directory = tempfile.mkdtemp(prefix="bench-mongod-")
+        port = self._free_port()
+        self.process = subprocess.Popen(
+            [self.mongod_path, "--dbpath", self.directory, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        uri = f"mongodb://127.0.0.1:{port}"
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with MongoClient(uri, serverSelectionTimeoutMS=500) as client:
+                    client.admin.command("ping")
+                return uri
+            except PyMongoError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.stop()
+                    raise RuntimeError("❌ Impossible de démarrer le mongod temporaire.")
+                time.sleep(0.2)
+
+    def start(self):
+        """Démarre la base et renvoie son URI (à placer dans `MONGO_URI` avant de créer le workflow)."""
+        if self.uri:
+            self.kind = "external"
+        elif self.mongod_path:
+            self.uri = self._start_mongod()
+            self.kind = "mongod"
+        else:
+            import mongomock
+
+            self.uri = "mongodb://mongomock.local"
+            set_client(mongomock.MongoClient(), self.uri)
+            self.kind = "mongomock"
+            print("⚠️ mongod introuvable : repli sur mongomock, les durées des étapes MongoDB ne sont pas représentatives.")
+        return self.uri
+
+    def stop(self):
+        close_clients()
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            self.process = None
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
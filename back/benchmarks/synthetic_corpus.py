@@ -0,0 +1,140 @@
+import zlib
+from datetime import datetime, timedelta, date
+
+import numpy as np
+
+from vector_codec import encode_vector
+
+EMBEDDING_DIM = 1536
+CATEGORIES = ["politique", "économie", "international", "sport", "culture", "sciences", "technologie", "santé"]
+SYLLABLES = ["ba", "lo", "ri", "ta", "mé", "son", "cha", "vi", "pra", "do", "lu", "gen", "té", "mar", "ni", "quo",
+             "fer", "pon", "sa", "tri", "vol", "ca", "dé", "mi", "ur", "gal", "bre", "po", "zo", "lan"]
+
+
+class SyntheticCorpus:
+    """
+    Corpus synthétique déterministe : des « affaires » (clusters) par catégorie, des articles isolés,
+    des textes de longueur réaliste (loi log-normale) et des embeddings dérivés du texte.
+    Chaque article est reconstructible à partir de son numéro : le serveur de fixtures HTML et
+    le faux serveur OpenAI produisent les mêmes textes et les mêmes vecteurs que le corpus pré-chargé.
+    """
+
+    def __init__(self, size, seed=42, cluster_size=8, outlier_rate=0.2, median_words=400, story_word_rate=0.7,
+                 duplicate_rate=0.05, vocabulary_size=2000, story_vocabulary=30):
+        """
+        :param size: Nombre d'articles du corpus.
+        :param cluster_size: Taille moyenne d'une affaire (nombre d'articles qui en parlent).
+        :param outlier_rate: Part d'articles isolés (bruit pour le clustering).
+        :param median_words: Longueur médiane d'un article, en mots.
+        :param story_word_rate: Part des mots d'un article tirés du vocabulaire propre à son affaire.
+        :param duplicate_rate: Part d'articles reprenant mot pour mot une dépêche (quasi-doublons à l'ingestion).
+        """
+        self.size = size
+        self.seed = seed
+        self.median_words = median_words
+        self.story_word_rate = story_word_rate
+        self.duplicate_rate = duplicate_rate
+        self.outlier_rate = outlier_rate
+
+        rng = np.random.default_rng(seed)
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add("".join(rng.choice(SYLLABLES, size=rng.integers(2, 5))))
+        self.vocabulary = np.array(sorted(words))
+        # Une direction aléatoire par mot : l'embedding d'un texte est la somme normalisée de ses mots
+        self.word_vectors = rng.standard_normal((vocabulary_size, EMBEDDING_DIM), dtype=np.float32)
+        self.word_index = {word: i for i, word in enumerate(self.vocabulary)}
+
+        self.story_count = max(1, int(size * (1 - outlier_rate) / cluster_size))
+        self.story_words = rng.integers(0, vocabulary_size, size=(self.story_count, story_vocabulary))
+        self.story_categories = rng.integers(0, len(CATEGORIES), size=self.story_count)
+
+    def _rng(self, number):
+        return np.random.default_rng([self.seed, number])
+
+    def original(self, number):
+        """Numéro de l'article dont un quasi-doublon reprend le texte (lui-même pour un article original)."""
+        rng = self._rng(number)
+        if number > 0 and rng.random() < self.duplicate_rate:
+            return self.original(int(rng.integers(0, number)))
+        return number
+
+    def story_of(self, number):
+        """Affaire d'un article (None pour un article isolé)."""
+        number = self.original(number)
+        story = int(self._rng(number).integers(0, self.story_count / (1 - self.outlier_rate) + 1))
+        return story if story < self.story_count else None
+
+    def word_indexes(self, number):
+        """Indices des mots du texte d'un article (un quasi-doublon reprend ceux de l'article qu'il copie)."""
+        number = self.original(number)
+        rng = self._rng(number)
+        rng.random()  # Tirage du test de doublon (voir `original`)
+        story = self.story_of(number)
+        length = int(np.clip(rng.lognormal(np.log(self.median_words), 0.6), 40, 5000))
+        indexes = rng.integers(0, len(self.vocabulary), size=length)
+        if story is not None:
+            from_story = rng.random(length) < self.story_word_rate
+            indexes[from_story] = rng.choice(self.story_words[story], size=int(from_story.sum()))
+        return indexes
+
+    def category_of(self, number):
+        story = self.story_of(number)
+        if story is None:
+            return CATEGORIES[int(self._rng(self.original(number)).integers(0, len(CATEGORIES)))]
+        return CATEGORIES[int(self.story_categories[story])]
+
+    def article(self, number, base_url="http://fixtures.local", day=None):
+        """
+        Champs d'un article tels que produits par le scraper (sans embedding).
+        :param day: Date de publication (par défaut, un des 7 jours précédant aujourd'hui).
+        """
+        rng = self._rng(number)
+        indexes = self.word_indexes(number)
+        words = self.vocabulary[indexes]
+        day = day or date.today() - timedelta(days=int(rng.integers(1, 8)))
+        paragraphs = [" ".join(words[i:i + 80]) + "." for i in range(0, len(words), 80)]
+        return {
+            "title": " ".join(words[:8]).capitalize(),
+            "link": f"{base_url}/articles/{number}.html",
+            "pub_date": datetime.combine(day, datetime.min.time()) + timedelta(seconds=int(rng.integers(0, 86400))),
+            "description": " ".join(words[:30]),
+            "category": self.category_of(number),
+            "content": "\n\n".join(paragraphs),
+            "token_count": int(len(words) * 1.4),  # Approximation : les mots synthétiques font 1 à 2 tokens
+        }
+
+    def embed_indexes(self, indexes):
+        """Embedding normalisé d'un texte donné par ses indices de mots."""
+        vector = np.bincount(indexes, minlength=len(self.vocabulary)).astype(np.float32) @ self.word_vectors
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def embed_text(self, text):
+        """Embedding d'un texte quelconque (faux serveur OpenAI) : les mots hors vocabulaire sont hachés."""
+        indexes = [
+            self.word_index.get(word, zlib.crc32(word.encode()) % len(self.vocabulary))
+            for word in text.lower().replace(".", " ").split()
+        ]
+        if not indexes:
+            indexes = [0]
+        return self.embed_indexes(np.array(indexes))
+
+    def documents(self, start=0, stop=None, batch_size=1000, source="http://fixtures.local/feeds/seed.xml",
+                  embedded=True):
+        """
+        Articles complets (avec `content_vector` au format float32) prêts à insérer, par lots.
+        :param start: Premier numéro d'article.
+        :param stop: Numéro de fin, exclu (par défaut la taille du corpus).
+        :param embedded: Si False, les articles sont insérés sans embedding (`needs_embedding`) : tout le corpus passe
+                         alors par l'étape d'encodage.
+        """
+        stop = self.size if stop is None else stop
+        for batch_start in range(start, stop, batch_size):
+            batch = []
+            for number in range(batch_start, min(stop, batch_start + batch_size)):
+                document = self.article(number)
+                document.update({"source": source, "needs_embedding": not embedded})
+                if embedded:
+                    document["content_vector"] = encode_vector(self.embed_indexes(self.word_indexes(number)), "float32")
+                batch.append(document)
+            yield batch
@@ -0,0 +1,289 @@
+import argparse
+import glob
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import Binary
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import CollectionInvalid
+
+from vector_codec import decode_vector
+
+load_dotenv()
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 90))
+VECTOR_MODES = ("keep", "int8", "drop")  # Sort des embeddings à l'archivage
+
+# Colonnes des partitions Parquet (la date du jour est portée par le répertoire `day=AAAA-MM-JJ`)
+PARQUET_COLUMNS = """
+    CAST(_id AS VARCHAR) AS _id, CAST(link AS VARCHAR) AS link, CAST(title AS VARCHAR) AS title,
+    CAST(content AS VARCHAR) AS content, CAST(description AS VARCHAR) AS description,
+    CAST(source AS VARCHAR) AS source, CAST(category AS VARCHAR) AS category,
+    CAST(pub_date AS TIMESTAMP) AS pub_date, CAST(token_count AS INTEGER) AS token_count,
+    CAST(duplicate_of AS VARCHAR) AS duplicate_of, CAST(duplicate_count AS INTEGER) AS duplicate_count,
+    CAST(vector AS BLOB) AS vector, CAST(vector_scale AS FLOAT) AS vector_scale,
+    CAST(vector_dtype AS VARCHAR) AS vector_dtype, CAST(archived_at AS TIMESTAMP) AS archived_at
+"""
+
+
+def quantize_vector(vector):
+    """
+    Quantification int8 symétrique d'un embedding (4 fois plus compact que float32).
+    :return: (octets int8, échelle) ; la composante i vaut environ octet[i] × échelle.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8).tobytes(), scale
+
+
+def restore_vector(data, dtype, scale=None):
+    """Relit un embedding archivé (float32 ou int8 quantifié) sous forme de np.ndarray float32."""
+    if data is None:
+        return None
+    if dtype == "int8":
+        return np.frombuffer(data, dtype=np.int8).astype(np.float32) * np.float32(scale)
+    return np.frombuffer(data, dtype="<f4")
+
+
+def archive_record(document, vectors="int8", archived_at=None):
+    """
+    Convertit un article MongoDB en enregistrement d'archive (champs utiles aux digests, embedding réduit ou supprimé).
+    :param vectors: "keep" (float32), "int8" (quantifié) ou "drop".
+    """
+    vector = decode_vector(document.get("content_vector"))
+    data, scale, dtype = None, None, None
+    if vector is not None and len(vector) and vectors != "drop":
+        if vectors == "int8":
+            data, scale = quantize_vector(vector)
+            dtype = "int8"
+        else:
+            data, dtype = np.asarray(vector, dtype="<f4").tobytes(), "float32"
+
+    return {
+        "_id": document["_id"],
+        "link": document.get("link"),
+        "title": document.get("title"),
+        "content": document.get("content"),
+        "description": document.get("description"),
+        "source": document.get("source"),
+        "category": document.get("category"),
+        "pub_date": document.get("pub_date"),
+        "token_count": document.get("token_count"),
+        "duplicate_of": document.get("duplicate_of"),
+        "duplicate_count": document.get("duplicate_count"),
+        "vector": data,
+        "vector_scale": scale,
+        "vector_dtype": dtype,
+        "archived_at": archived_at or datetime.now(),
+    }
+
+
+class ArticleArchiver:
+    """
+    Rétention par paliers : les articles plus anciens que `max_age_days` quittent la collection chaude
+    pour une archive froide compressée, soit des partitions Parquet (zstd) par jour écrites avec DuckDB,
+    soit une collection MongoDB d'archive (compression zstd). L'archive reste interrogeable pour les digests mensuels.
+    """
+
+    def __init__(self, collection, backend="parquet", archive_dir=None, archive_collection=None,
+                 vectors="int8", batch_size=1000, vector_store=None):
+        """
+        :param collection: Collection chaude des articles.
+        :param backend: "parquet" (fichiers par jour) ou "collection" (collection MongoDB d'archive).
+        :param archive_dir: Répertoire des partitions Parquet (par défaut `ARCHIVE_DIR`).
+        :param archive_collection: Collection d'archive (par défaut `<collection>_archive` dans la même base).
+        :param vectors: Sort des embeddings : "keep", "int8" ou "drop".
+        :param batch_size: Nombre d'articles déplacés par lot.
+        :param vector_store: VectorFileStore optionnel dont les vecteurs archivés sont retirés.
+        """
+        if backend not in ("parquet", "collection"):
+            raise ValueError(f"Backend d'archive inconnu : {backend}")
+        if vectors not in VECTOR_MODES:
+            raise ValueError(f"Mode de vecteurs inconnu : {vectors}")
+        self.collection = collection
+        self.backend = backend
+        self.archive_dir = archive_dir or ARCHIVE_DIR
+        self.vectors = vectors
+        self.batch_size = batch_size
+        self.vector_store = vector_store
+
+        if backend == "collection":
+            self.archive_collection = (archive_collection if archive_collection is not None
+                                       else self._create_archive_collection(f"{collection.name}_archive"))
+            self.archive_collection.create_index([("pub_date", ASCENDING)], name="pub_date")
+            self.archive_collection.create_index([("category", ASCENDING), ("pub_date", ASCENDING)],
+                                                 name="category_pub_date")
+        else:
+            self.archive_collection = None
+            os.makedirs(self.archive_dir, exist_ok=True)
+
+    def _create_archive_collection(self, name):
+        """Crée la collection d'archive avec la compression zstd de WiredTiger (sans effet si elle existe)."""
+        db = self.collection.database
+        try:
+            return db.create_collection(name, storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}})
+        except CollectionInvalid:
+            return db[name]
+
+    def archive(self, max_age_days=RETENTION_DAYS, dry_run=False):
+        """
+        Déplace vers l'archive les articles publiés il y a plus de `max_age_days` jours.
+        Chaque lot est écrit dans l'archive avant d'être supprimé de la collection chaude :
+        une interruption peut au pire archiver deux fois un article (dédoublonné à la lecture), jamais le perdre.
+        :return: {"archived": nombre d'articles déplacés, "days": jours touchés, "cutoff": date limite}.
+        """
+        cutoff = datetime.combine(datetime.now().date() - timedelta(days=max_age_days), datetime.min.time())
+        query = {"pub_date": {"$lt": cutoff}}
+        if dry_run:
+            count = self.collection.count_documents(query)
+            print(f"🔎 {count} articles antérieurs au {cutoff.date()} seraient archivés.")
+            return {"archived": 0, "candidates": count, "days": [], "cutoff": cutoff}
+
+        archived, days = 0, set()
+        while True:
+            documents = list(self.collection.find(query).sort("pub_date", ASCENDING).limit(self.batch_size))
+            if not documents:
+                break
+            archived_at = datetime.now()
+            records = [archive_record(document, self.vectors, archived_at) for document in documents]
+
+            if self.backend == "parquet":
+                by_day = {}
+                for record in records:
+                    by_day.setdefault(record["pub_date"].date(), []).append(record)
+                for day, day_records in by_day.items():
+                    self._write_partition(day, day_records)
+                days.update(by_day)
+            else:
+                self._write_collection(records)
+                days.update(record["pub_date"].date() for record in records)
+
+            ids = [document["_id"] for document in documents]
+            self.collection.delete_many({"_id": {"$in": ids}})
+            if self.vector_store is not None:
+                self.vector_store.delete(ids)
+            archived += len(documents)
+            print(f"📦 {archived} articles archivés (jusqu'au {records[-1]['pub_date'].date()})...")
+
+        print(f"✅ Rétention : {archived} articles antérieurs au {cutoff.date()} archivés ({self.backend}, vecteurs {self.vectors}).")
+        return {"archived": archived, "days": sorted(days), "cutoff": cutoff}
+
+    def _partition_dir(self, day):
+        return os.path.join(self.archive_dir, f"day={day.isoformat()}")
+
+    def _write_partition(self, day, records):
+        """Écrit un fichier Parquet zstd dans la partition du jour (écriture dans un fichier temporaire puis renommage)."""
+        import duckdb
+        import pandas as pd
+
+        directory = self._partition_dir(day)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{uuid.uuid4().hex[:12]}.parquet")
+        tmp_path = path + ".tmp"
+
+        batch = pd.DataFrame([{**record, "_id": str(record["_id"])} for record in records])
+        with duckdb.connect() as con:
+            con.register("batch", batch)
+            con.execute(f"COPY (SELECT {PARQUET_COLUMNS} FROM batch) TO '{tmp_path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+        os.replace(tmp_path, path)
+
+    def _write_collection(self, records):
+        """Écrit un lot dans la collection d'archive (idempotent : remplacement par `_id`)."""
+        operations = [
+            ReplaceOne({"_id": record["_id"]},
+                       {**record, "vector": Binary(record["vector"]) if record["vector"] is not None else None},
+                       upsert=True)
+            for record in records
+        ]
+        self.archive_collection.bulk_write(operations, ordered=False)
+
+    def query(self, start, end, category=None, with_vectors=False):
+        """
+        Articles archivés publiés entre `start` (inclus) et `end` (exclu), dans l'ordre chronologique.
+        Seules les partitions des jours concernés sont lues.
+        :param with_vectors: Restitue les embeddings (float32) dans `content_vector` s'ils ont été conservés.
+        :return: Liste de documents au format des articles de la collection chaude.
+        """
+        if self.backend == "collection":
+            filters = {"pub_date": {"$gte": start, "$lt": end}}
+            if category:
+                filters["category"] = category
+            projection = None if with_vectors else {"vector": 0, "vector_scale": 0, "vector_dtype": 0}
+            documents = list(self.archive_collection.find(filters, projection).sort("pub_date", ASCENDING))
+        else:
+            documents = self._query_parquet(start, end, category, with_vectors)
+
+        if with_vectors:
+            for document in documents:
+                document["content_vector"] = restore_vector(
+                    document.pop("vector", None), document.pop("vector_dtype", None), document.pop("vector_scale", None)
+                )
+        return documents
+
+    def _query_parquet(self, start, end, category, with_vectors):
+        import duckdb
+
+        pattern = os.path.join(self.archive_dir, "day=*", "*.parquet")
+        if not glob.glob(pattern):
+            return []
+        excluded = "EXCLUDE (day)" if with_vectors else "EXCLUDE (day, vector, vector_scale, vector_dtype)"
+        sql = f"""
+            SELECT * {excluded} FROM read_parquet(?, hive_partitioning = true, union_by_name = true)
+            WHERE day >= ? AND day <= ? AND pub_date >= ? AND pub_date < ? {"AND category = ?" if category else ""}
+            QUALIFY row_number() OVER (PARTITION BY _id ORDER BY archived_at DESC) = 1
+            ORDER BY pub_date
+        """
+        params = [pattern, start.date(), end.date(), start, end] + ([category] if category else [])
+        with duckdb.connect() as con:
+            cursor = con.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def monthly(self, year, month, category=None, with_vectors=False):
+        """Articles archivés d'un mois (pour les digests mensuels)."""
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        return self.query(start, end, category=category, with_vectors=with_vectors)
+
+
+def get_archiver(collection, vector_store=None, **overrides):
+    """ArticleArchiver configuré par les variables d'environnement (`ARCHIVE_BACKEND`, `ARCHIVE_VECTORS`)."""
+    options = {
+        "backend": os.getenv("ARCHIVE_BACKEND", "parquet"),
+        "vectors": os.getenv("ARCHIVE_VECTORS", "int8"),
+        "vector_store": vector_store,
+    }
+    return ArticleArchiver(collection, **{**options, **overrides})
+
+
+if __name__ == "__main__":
+    from collections import Counter
+    from mongo_registry import get_collection, close_clients
+
+    parser = argparse.ArgumentParser(description="Archivage des articles anciens et consultation de l'archive")
+    parser.add_argument("--max-age-days", type=int, default=RETENTION_DAYS, help="Âge (en jours) au-delà duquel un article est archivé")
+    parser.add_argument("--backend", choices=["parquet", "collection"], default=os.getenv("ARCHIVE_BACKEND", "parquet"))
+    parser.add_argument("--vectors", choices=VECTOR_MODES, default=os.getenv("ARCHIVE_VECTORS", "int8"), help="Sort des embeddings archivés")
+    parser.add_argument("--dry-run", action="store_true", help="Compte les articles à archiver sans rien déplacer")
+    parser.add_argument("--month", metavar="AAAA-MM", help="N'archive rien : résume le contenu archivé d'un mois")
+    args = parser.parse_args()
+
+    vector_store = None
+    if os.getenv("VECTOR_STORE_PATH") and not args.month:
+        from vector_file_store import VectorFileStore
+        vector_store = VectorFileStore(os.getenv("VECTOR_STORE_PATH"))
+
+    archiver = get_archiver(get_collection(), vector_store=vector_store, backend=args.backend, vectors=args.vectors)
+    if args.month:
+        year, month = map(int, args.month.split("-"))
+        articles = archiver.monthly(year, month)
+        print(f"📚 {len(articles)} articles archivés en {args.month}")
+        for category, count in Counter(article["category"] for article in articles).most_common():
+            print(f"   - {category} : {count}")
+    else:
+        archiver.archive(args.max_age_days, dry_run=args.dry_run)
+    close_clients()
@@ -0,0 +1,254 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from clustering import normalize
+from vector_codec import encode_vector, decode_vector
+
+class ClusterStore:
+    """
+    Clusters persistés d'un passage à l'autre (collection `clusters`) : centroïde, membres, label, dates.
+    Les nouveaux articles rejoignent le cluster existant le plus proche ou en créent de nouveaux ;
+    un re-clustering complet de la fenêtre n'a lieu que périodiquement, pour absorber la dérive.
+    """
+
+    def __init__(self, collection, engine, assign_threshold=0.2, recluster_every_days=7, min_overlap=0.5):
+        """
+        :param collection: Collection MongoDB des clusters (ex. `db["clusters"]`).
+        :param engine: ClusteringEngine utilisé pour créer les nouveaux clusters et pour les re-clusterings.
+        :param assign_threshold: Distance cosinus maximale au centroïde pour rejoindre un cluster existant.
+        :param recluster_every_days: Intervalle entre deux re-clusterings complets d'une catégorie.
+        :param min_overlap: Recouvrement (Jaccard) minimal pour qu'un cluster re-calculé garde l'id et le label d'un ancien.
+        """
+        self.collection = collection
+        self.meta = collection.database[f"{collection.name}_meta"]
+        self.engine = engine
+        self.assign_threshold = assign_threshold
+        self.recluster_every = timedelta(days=recluster_every_days)
+        self.min_overlap = min_overlap
+        self.collection.create_index([("category", ASCENDING)], name="category")
+        self.collection.create_index([("member_ids", ASCENDING)], name="member_ids")
+
+    def memberships(self, article_ids):
+        """Renvoie {id d'article: id de cluster} pour les articles déjà rattachés à un cluster."""
+        article_ids = set(article_ids)
+        result = {}
+        for cluster in self.collection.find({"member_ids": {"$in": list(article_ids)}}, {"member_ids": 1}):
+            for member_id in cluster["member_ids"]:
+                if member_id in article_ids:
+                    result[member_id] = str(cluster["_id"])
+        return result
+
+    def needs_reclustering(self, category):
+        """Indique si le dernier re-clustering complet de la catégorie est trop ancien."""
+        state = self.meta.find_one({"_id": category})
+        return state is None or datetime.now() - state["last_reclustered"] >= self.recluster_every
+
+    def get_label(self, cluster_id):
+        """Label enregistré d'un cluster (None s'il n'en a pas encore)."""
+        cluster = self.collection.find_one({"_id": ObjectId(cluster_id)}, {"label": 1})
+        return cluster.get("label") if cluster else None
+
+    def set_label(self, cluster_id, label):
+        """Enregistre le label d'un cluster (il restera stable d'un passage à l'autre)."""
+        self.collection.update_one({"_id": ObjectId(cluster_id)}, {"$set": {"label": label}})
+
+    def _seed(self, category, articles, vectors, labels, now):
+        """
+        Crée de nouveaux clusters parmi des articles non rattachés, à partir de leurs labels de clustering.
+        :return: ({id de cluster: [articles]}, [articles isolés]).
+        """
+        if len(articles) == 0:
+            return {}, []
+        groups = defaultdict(list)
+        outliers = []
+        for index, (label, article) in enumerate(zip(labels, articles)):
+            if label == -1:
+                outliers.append(article)
+            else:
+                groups[label].append(index)
+
+        clusters = {}
+        for indexes in groups.values():
+            members = [articles[i] for i in indexes]
+            cluster_id = ObjectId()
+            self.collection.insert_one({
+                "_id": cluster_id,
+                "category": category,
+                "centroid": encode_vector(vectors[indexes].mean(axis=0), "float32"),
+                "size": len(members),
+                "member_ids": [str(article["_id"]) for article in members],
+                "label": None,
+                "created_at": now,
+                "updated_at": now
+            })
+            clusters[str(cluster_id)] = members
+        return clusters, outliers
+
+    def _assign(self, category, articles, vectors, now):
+        """
+        Rattache les articles nouveaux de la fenêtre aux clusters existants de la catégorie.
+        Les membres sortis de la fenêtre sont retirés : centroïde et taille sont recalculés sur les seuls membres
+        de la fenêtre, et un cluster sans membre dans la fenêtre est supprimé.
+        :return: ({id de cluster: [articles de la fenêtre]}, indices des articles restés sans cluster).
+        """
+        positions = {str(article["_id"]): i for i, article in enumerate(articles)}
+        members, stale, changed = {}, [], set()
+        for cluster in self.collection.find({"category": category}, {"member_ids": 1}):
+            live = [positions[member_id] for member_id in cluster["member_ids"] if member_id in positions]
+            if not live:
+                stale.append(cluster["_id"])
+                continue
+            members[cluster["_id"]] = live
+            if len(live) != len(cluster["member_ids"]):
+                changed.add(cluster["_id"])
+
+        known = {i for live in members.values() for i in live}
+        new = [i for i in range(len(articles)) if i not in known]
+        print(f"🧷 {category} : {len(new)} nouveaux articles à rattacher")
+
+        leftovers = new
+        if members and new:
+            cluster_ids = list(members)
+            centroids = normalize([vectors[members[cluster_id]].mean(axis=0) for cluster_id in cluster_ids])
+            similarities = vectors[new] @ centroids.T
+            best = np.argmax(similarities, axis=1)
+            best_distance = 1.0 - similarities[np.arange(len(new)), best]
+            leftovers = []
+            for i, cluster_index, distance in zip(new, best, best_distance):
+                if distance <= self.assign_threshold:
+                    members[cluster_ids[cluster_index]].append(i)
+                    changed.add(cluster_ids[cluster_index])
+                else:
+                    leftovers.append(i)
+
+        # 🎯 Centroïde (moyenne des membres normalisés) et taille calculés sur le même ensemble de membres
+        operations = [
+            UpdateOne({"_id": cluster_id}, {"$set": {
+                "centroid": encode_vector(vectors[members[cluster_id]].mean(axis=0), "float32"),
+                "size": len(members[cluster_id]),
+                "member_ids": [str(articles[i]["_id"]) for i in members[cluster_id]],
+                "updated_at": now
+            }})
+            for cluster_id in changed
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        if stale:
+            self.collection.delete_many({"_id": {"$in": stale}})
+
+        clusters = {str(cluster_id): [articles[i] for i in live] for cluster_id, live in members.items()}
+        return clusters, leftovers
+
+    def _recluster(self, category, articles, vectors, labels, now):
+        """
+        Applique le re-clustering complet de la fenêtre d'une catégorie ; les nouveaux clusters reprennent l'id
+        et le label de l'ancien cluster avec lequel ils se recouvrent le plus.
+        :return: ({id de cluster: [articles]}, [articles isolés]).
+        """
+        window_ids = {str(article["_id"]) for article in articles}
+
+        groups = defaultdict(list)
+        outliers = []
+        for index, (label, article) in enumerate(zip(labels, articles)):
+            if label == -1:
+                outliers.append(article)
+            else:
+                groups[label].append(index)
+
+        old_clusters = {
+            str(cluster["_id"]): cluster
+            for cluster in self.collection.find({"category": category}, {"member_ids": 1})
+        }
+        old_members = {
+            cluster_id: set(cluster["member_ids"]) & window_ids for cluster_id, cluster in old_clusters.items()
+        }
+
+        clusters, taken, operations = {}, set(), []
+        for indexes in sorted(groups.values(), key=len, reverse=True):
+            members = [articles[i] for i in indexes]
+            member_ids = {str(article["_id"]) for article in members}
+            centroid = encode_vector(vectors[indexes].mean(axis=0), "float32")
+
+            best_id, best_overlap = None, 0.0
+            for cluster_id, previous in old_members.items():
+                if cluster_id in taken or not previous:
+                    continue
+                overlap = len(member_ids & previous) / len(member_ids | previous)
+                if overlap > best_overlap:
+                    best_id, best_overlap = cluster_id, overlap
+
+            if best_id is not None and best_overlap >= self.min_overlap:
+                # ♻️ Même cluster qu'avant : on garde l'id et le label (les membres hors fenêtre sont retirés)
+                taken.add(best_id)
+                operations.append(UpdateOne({"_id": ObjectId(best_id)}, {"$set": {
+                    "centroid": centroid,
+                    "member_ids": sorted(member_ids),
+                    "size": len(member_ids),
+                    "updated_at": now
+                }}))
+                clusters[best_id] = members
+            else:
+                cluster_id = ObjectId()
+                self.collection.insert_one({
+                    "_id": cluster_id,
+                    "category": category,
+                    "centroid": centroid,
+                    "size": len(members),
+                    "member_ids": sorted(member_ids),
+                    "label": None,
+                    "created_at": now,
+                    "updated_at": now
+                })
+                clusters[str(cluster_id)] = members
+
+        # 🧹 Les anciens clusters non repris disparaissent
+        dropped = [ObjectId(cluster_id) for cluster_id in set(old_clusters) - taken]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        if dropped:
+            self.collection.delete_many({"_id": {"$in": dropped}})
+
+        self.meta.update_one({"_id": category}, {"$set": {"last_reclustered": now}}, upsert=True)
+        print(f"♻️ Re-clustering complet de {category} : {len(clusters)} clusters, {len(taken)} conservés")
+        return clusters, outliers
+
+    async def aupdate(self, groups):
+        """
+        Met à jour les clusters de chaque catégorie pour les articles de la fenêtre. Les clusterings à calculer
+        (re-clusterings complets et nouveaux clusters) de toutes les catégories passent en une fois par
+        `engine.acluster_many`, hors de la boucle d'événements.
+        :param groups: Dictionnaire {catégorie: [articles vectorisés de la fenêtre]}.
+        :return: ({catégorie: {id de cluster: [articles de la fenêtre]}}, [(article isolé, catégorie)]).
+        """
+        now = datetime.now()
+        plans, pending = {}, {}
+        for category, articles in groups.items():
+            vectors = normalize([article["content_vector"] for article in articles])
+            if self.needs_reclustering(category):
+                plans[category] = (articles, vectors, None, None)
+                pending[category] = vectors
+            else:
+                assigned, leftovers = self._assign(category, articles, vectors, now)
+                plans[category] = (articles, vectors, assigned, leftovers)
+                if leftovers:
+                    pending[category] = vectors[leftovers]
+
+        labels = await self.engine.acluster_many(pending) if pending else {}
+
+        clusters, isolated = {}, []
+        for category, (articles, vectors, assigned, leftovers) in plans.items():
+            if assigned is None:
+                category_clusters, outliers = self._recluster(category, articles, vectors, labels[category], now)
+            else:
+                seeded, outliers = self._seed(
+                    category, [articles[i] for i in leftovers], vectors[leftovers], labels.get(category, []), now
+                )
+                category_clusters = {**assigned, **seeded}
+            clusters[category] = category_clusters
+            isolated.extend((article, category) for article in outliers)
+
+        return clusters, isolated
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import DBSCAN, HDBSCAN
+
+
+def normalize(vectors):
+    """Normalise (L2) les embeddings : la distance cosinus devient 1 − produit scalaire."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def radius_graph(vectors, eps, block_size=2048):
+    """
+    Graphe creux des voisins à distance cosinus ≤ eps, construit par blocs de produits matriciels.
+    La mémoire est bornée par un bloc (block_size × n) et par le nombre de voisins retenus.
+    """
+    n = len(vectors)
+    rows, cols, data = [], [], []
+    for start in range(0, n, block_size):
+        block = vectors[start:start + block_size]
+        distances = 1.0 - block @ vectors.T
+        row, col = np.nonzero(distances <= eps)
+        rows.append(row + start)
+        cols.append(col)
+        data.append(np.maximum(distances[row, col], 0.0))
+    return sparse.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n)
+    )
+
+
+def cluster_vectors(vectors, eps=0.2, min_samples=4, algorithm="auto", brute_force_max=2000,
+                    hdbscan_min_size=None, block_size=2048):
+    """
+    Clusterise des embeddings (labels DBSCAN, -1 pour le bruit).
+    :param algorithm: "brute" (DBSCAN cosinus classique), "radius_graph" (DBSCAN sur graphe creux pré-calculé),
+                      "hdbscan", ou "auto" pour choisir selon la taille.
+    :param brute_force_max: Taille au-delà de laquelle "auto" passe au graphe creux.
+    :param hdbscan_min_size: Taille à partir de laquelle "auto" utilise HDBSCAN (None pour ne jamais l'utiliser).
+    """
+    vectors = normalize(vectors)
+    n = len(vectors)
+    if n == 0:
+        return np.array([], dtype=int)
+
+    if algorithm == "auto":
+        if hdbscan_min_size is not None and n >= hdbscan_min_size:
+            algorithm = "hdbscan"
+        elif n > brute_force_max:
+            algorithm = "radius_graph"
+        else:
+            algorithm = "brute"
+
+    if algorithm == "hdbscan":
+        # Sur des vecteurs normalisés, la distance euclidienne est monotone en distance cosinus
+        return HDBSCAN(min_cluster_size=max(min_samples, 2), min_samples=min_samples).fit_predict(vectors)
+    if algorithm == "radius_graph":
+        graph = radius_graph(vectors, eps, block_size)
+        return DBSCAN(eps=eps, min_samples=min_samples, metric="precomputed").fit_predict(graph)
+    return DBSCAN(eps=eps, min_samples=min_samples, metric="cosine", algorithm="brute").fit_predict(vectors)
+
+
+def _cluster_group(args):
+    """Point d'entrée des processus du pool (fonction de module, sérialisable)."""
+    name, vectors, options = args
+    return name, cluster_vectors(vectors, **options)
+
+
+class ClusteringEngine:
+    """Moteur de clustering partagé : choix de l'algorithme selon la taille et exécution parallèle par groupe."""
+
+    def __init__(self, eps=0.2, min_samples=4, brute_force_max=2000, hdbscan_min_size=None,
+                 block_size=2048, max_workers=None, parallel_min_size=5000):
+        """
+        :param eps: Distance cosinus maximale entre voisins.
+        :param min_samples: Nombre minimal de voisins d'un point central.
+        :param max_workers: Nombre de processus (par défaut, un par cœur).
+        :param parallel_min_size: Nombre total de vecteurs en dessous duquel on reste dans le processus courant.
+        """
+        self.options = {
+            "eps": eps,
+            "min_samples": min_samples,
+            "brute_force_max": brute_force_max,
+            "hdbscan_min_size": hdbscan_min_size,
+            "block_size": block_size,
+        }
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parallel_min_size = parallel_min_size
+
+    def fit_predict(self, vectors):
+        """Clusterise un seul groupe de vecteurs."""
+        return cluster_vectors(vectors, **self.options)
+
+    def cluster_many(self, groups):
+        """
+        Clusterise plusieurs groupes (ex. une catégorie chacun), en parallèle sur un pool de processus si utile.
+        :param groups: Dictionnaire {nom: matrice de vecteurs}.
+        :return: Dictionnaire {nom: labels}.
+        """
+        tasks = [(name, vectors, self.options) for name, vectors in groups.items()]
+        total = sum(len(vectors) for vectors in groups.values())
+        if self.max_workers == 1 or len(tasks) < 2 or total < self.parallel_min_size:
+            return dict(_cluster_group(task) for task in tasks)
+
+        # Les plus gros groupes partent en premier pour équilibrer le pool
+        tasks.sort(key=lambda task: len(task[1]), reverse=True)
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks))) as executor:
+            return dict(executor.map(_cluster_group, tasks))
+
+    async def acluster_many(self, groups):
+        """Version asynchrone de `cluster_many` (n'occupe pas la boucle d'événements)."""
+        return await asyncio.to_thread(self.cluster_many, groups)
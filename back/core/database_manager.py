@@ -1,45 +1,119 @@
 import os
+import logging
 from dotenv import load_dotenv
-from pymongo import MongoClient, TEXT
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from datetime import datetime, timedelta, date
+from vector_codec import encode_vector, decode_document, has_vector
+from mongo_registry import get_client
+from schema import ensure_schema
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     def __init__(self):
-        """Initialisation de la connexion MongoDB"""
-        self.client = MongoClient(os.getenv("MONGO_URI"))
+        """Initialisation de la connexion MongoDB (client partagé du processus)"""
+        self.client = get_client()
         self.db = self.client[os.getenv("MONGO_DB_NAME")]
         self.collection = self.db[os.getenv("MONGO_COLLECTION")]
 
-        # 🔍 Vérification des index existants
-        existing_indexes = self.collection.index_information()
-        index_name = "content_text_title_text"
-
-        if index_name in existing_indexes:
-            print(f"🔄 Index {index_name} existe déjà, suppression et recréation...")
-            self.collection.drop_index(index_name)
-
-        # ✅ Création d'un nouvel index texte si besoin
-        self.collection.create_index([("title", TEXT), ("content", TEXT)], name=index_name)
-        print(f"✅ Index {index_name} créé avec succès.")
+        # 🔑 Index créés seulement s'ils manquent (schéma versionné, aucune reconstruction au démarrage)
+        ensure_schema(self.db, self.collection.name)
 
     def get_rss_feeds(self):
         """Récupère les flux RSS stockés dans MongoDB."""
         feeds = self.db["sources"].find({}, {"_id": 0, "url": 1})
         return [feed["url"] for feed in feeds]
 
+    def get_feed_state(self, feed_url):
+        """Récupère l'état de cache HTTP (ETag, Last-Modified, GUIDs vus ou à retenter) d'un flux."""
+        state = self.db["sources"].find_one(
+            {"url": feed_url},
+            {"_id": 0, "etag": 1, "last_modified": 1, "seen_guids": 1, "retry_entries": 1, "last_entry_date": 1}
+        )
+        return state or {}
+
+    def update_feed_state(self, feed_url, state):
+        """Enregistre l'état de cache HTTP d'un flux sur son document `sources`."""
+        self.db["sources"].update_one({"url": feed_url}, {"$set": state})
+
     def insert_article(self, article):
         """Ajoute un article à MongoDB s'il n'existe pas déjà"""
-        if not self.collection.find_one({"link": article["link"]}):
+        try:
             self.collection.insert_one(article)
-            print(f"✅ Article inséré : {article['title']}")
-        else:
-            print(f"🔵 Article déjà en base : {article['title']}")
+            logger.debug(f"✅ Article inséré : {article['title']}")
+        except DuplicateKeyError:
+            logger.debug(f"🔵 Article déjà en base : {article['title']}")
+
+    def get_links_with_content(self, links):
+        """Renvoie, en une seule requête, les liens déjà en base avec un contenu non vide (ou rattachés à un article canonique)."""
+        if not links:
+            return set()
+        cursor = self.collection.find(
+            {"link": {"$in": list(links)}, "$or": [
+                {"content": {"$nin": [None, ""]}},
+                {"duplicate_of": {"$exists": True}}
+            ]},
+            {"_id": 0, "link": 1}
+        )
+        return {doc["link"] for doc in cursor}
+
+    def upsert_articles(self, articles):
+        """
+        Insère ou met à jour un lot d'articles avec un seul `bulk_write` non ordonné.
+        :return: Compteurs {"inserted", "updated", "skipped"}, identifiants des articles écrits ("ids")
+                 et statut de chaque article, aligné sur `articles` ("statuses" : [(statut, id ou None)]).
+        """
+        if not articles:
+            return {"inserted": 0, "updated": 0, "skipped": 0, "ids": [], "statuses": []}
+
+        operations = [
+            UpdateOne({"link": article["link"]}, {"$set": article}, upsert=True)
+            for article in articles
+        ]
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            counts = {"inserted": result.upserted_count, "updated": result.matched_count, "skipped": 0}
+            upserted = set(result.upserted_ids)
+            rejected = set()
+        except BulkWriteError as e:
+            # ⚠️ Doublons concurrents rejetés par l'index unique : on compte le reste normalement
+            details = e.details
+            counts = {
+                "inserted": details.get("nUpserted", 0),
+                "updated": details.get("nMatched", 0),
+                "skipped": len(details.get("writeErrors", []))
+            }
+            upserted = {entry["index"] for entry in details.get("upserted", [])}
+            rejected = {error["index"] for error in details.get("writeErrors", [])}
+
+        # 🆔 Identifiants des articles écrits, pour les événements du workflow
+        written = self.collection.find({"link": {"$in": [article["link"] for article in articles]}}, {"_id": 1, "link": 1})
+        ids_by_link = {doc["link"]: str(doc["_id"]) for doc in written}
+        counts["ids"] = list(ids_by_link.values())
+        counts["statuses"] = [
+            ("skipped", None) if index in rejected
+            else ("inserted" if index in upserted else "updated", ids_by_link.get(article["link"]))
+            for index, article in enumerate(articles)
+        ]
+        return counts
+
+    def register_duplicates(self, duplicates):
+        """
+        Comptabilise les doublons sur leurs articles canoniques.
+        :param duplicates: Liste de (lien de l'article canonique, source du doublon).
+        """
+        operations = [
+            UpdateOne({"link": canonical}, {"$inc": {"duplicate_count": 1}, "$addToSet": {"duplicate_sources": source}})
+            for canonical, source in duplicates
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
 
     def get_articles(self):
         """Récupère tous les articles de la collection MongoDB."""
-        return list(self.collection.find({}, {"_id": 0}))  # Exclure l'ID MongoDB
+        return [decode_document(doc) for doc in self.collection.find({}, {"_id": 0})]  # Exclure l'ID MongoDB
     
     
 
@@ -47,9 +121,9 @@ class DatabaseManager:
         start = datetime.combine(target_date, datetime.min.time())
         end = datetime.combine(target_date + timedelta(days=1), datetime.min.time())
         
-        articles = list(db_manager.collection.find({
+        articles = [decode_document(doc) for doc in db_manager.collection.find({
             "pub_date": {"$gte": start, "$lt": end}  # 🔥 Ne filtre plus sur `content_vector`
-        }, {"_id": 0}))
+        }, {"_id": 0})]
         
         print(f"📌 Articles récupérés pour {target_date} : {len(articles)}")
         
@@ -57,9 +131,9 @@ class DatabaseManager:
     
     from datetime import datetime
 
-    def get_articles_since(self, duration):
-        """Récupère les articles publiés depuis une période définie (en jours)."""
-        
+    def get_time_window(self, duration):
+        """Renvoie la plage [début, fin) couvrant les `duration` derniers jours complets."""
+
         # Vérifie que `duration` est bien un entier (sécurisation)
         if not isinstance(duration, int):
             raise ValueError("❌ Erreur: `duration` doit être un entier représentant le nombre de jours.")
@@ -67,10 +141,32 @@ class DatabaseManager:
         # Calcul correct de la plage de dates
         start_date = datetime.combine(date.today() - timedelta(days=duration), datetime.min.time())
         end_date = datetime.combine(date.today(), datetime.min.time())
+        return start_date, end_date
+
+    def iter_articles_between(self, start_date, end_date, projection=None, batch_size=1000, filters=None):
+        """
+        Parcourt en flux (curseur par lots) les articles publiés dans une plage de dates.
+        :param filters: Conditions supplémentaires (ex. `{"duplicate_of": {"$exists": False}}`).
+        """
+        cursor = self.collection.find(
+            {"pub_date": {"$gte": start_date, "$lt": end_date}, **(filters or {})},
+            projection,
+            batch_size=batch_size
+        )
+        for doc in cursor:
+            yield decode_document(doc)
+
+    def get_articles_since(self, duration, with_vectors=True):
+        """
+        Récupère les articles publiés depuis une période définie (en jours).
+        :param with_vectors: Si False, `content_vector` n'est pas transféré (vecteurs lus ailleurs, ex. VectorFileStore).
+        """
         
-        articles = list(self.collection.find({
+        start_date, end_date = self.get_time_window(duration)
+        projection = None if with_vectors else {"content_vector": 0}
+        articles = [decode_document(doc) for doc in self.collection.find({
             "pub_date": {"$gte": start_date, "$lt": end_date}
-        }, {"_id": 0}))
+        }, projection)]
 
         print(f"📌 Articles récupérés depuis {start_date.strftime('%Y-%m-%d')} : {len(articles)}")
         return articles
@@ -81,18 +177,20 @@ class DatabaseManager:
         """Met à jour l'embedding seulement s'il n'existe pas déjà"""
         existing_article = self.collection.find_one({"link": link}, {"content_vector": 1})
 
-        if existing_article and "content_vector" in existing_article and existing_article["content_vector"]:
-            print(f"⚠️ Embedding déjà existant pour {link}, SKIP")
+        if existing_article and has_vector(existing_article):
+            logger.debug(f"⚠️ Embedding déjà existant pour {link}, SKIP")
             return  # On ne remplace pas
 
-        print(f"📡 Enregistrement de l'embedding pour {link} en base")
+        logger.debug(f"📡 Enregistrement de l'embedding pour {link} en base")
         self.collection.update_one(
-            {"link": link}, {"$set": {"content_vector": embedding}}
+            {"link": link}, {"$set": {"content_vector": encode_vector(embedding), "needs_embedding": False}}
         )
-        print(f"✅ Embedding stocké pour {link}")
+        logger.debug(f"✅ Embedding stocké pour {link}")
 
 
     
     def close(self):
-        """Ferme la connexion MongoDB"""
-        self.client.close()
+        """
+        Ne ferme rien : le client MongoDB est partagé (docstore, outbox, registre...) ;
+        c'est au point d'entrée du processus d'appeler `close_clients()`.
+        """
@@ -0,0 +1,118 @@
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from vector_codec import encode_vector, decode_vector
+
+class EmbeddingCache:
+    """Cache persistant d'embeddings, indexé par modèle + hash du texte normalisé."""
+
+    def __init__(self, collection, max_entries=200000, lru_size=10000):
+        """
+        :param collection: Collection MongoDB dédiée au cache (ex. `db["embedding_cache"]`).
+        :param max_entries: Nombre maximal d'entrées conservées en base (les moins récemment utilisées sont évincées).
+        :param lru_size: Taille du cache LRU en mémoire placé devant MongoDB (0 pour le désactiver).
+        """
+        self.collection = collection
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.collection.create_index([("last_used", ASCENDING)], name="last_used")
+
+    @staticmethod
+    def normalize(text):
+        """Normalise un texte (Unicode NFC, espaces compactés) pour que deux reprises identiques partagent la même clé."""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+    def key(self, model, text):
+        """Clé de cache : hash SHA-256 du nom du modèle et du texte normalisé."""
+        return hashlib.sha256(f"{model}\0{self.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        """Ajoute une entrée au cache LRU en mémoire."""
+        if not self.lru_size:
+            return
+        self.lru[key] = vector
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def get_many(self, model, texts):
+        """Renvoie les embeddings en cache, alignés sur `texts` (None pour les absents)."""
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+
+        for key in keys:
+            if key in self.lru:
+                self.lru.move_to_end(key)
+                found[key] = self.lru[key]
+
+        missing = list({key for key in keys if key not in found})
+        if missing:
+            for doc in self.collection.find({"_id": {"$in": missing}}, {"vector": 1}):
+                vector = decode_vector(doc["vector"])
+                found[doc["_id"]] = vector
+                self._remember(doc["_id"], vector)
+            stored_hits = [key for key in missing if key in found]
+            if stored_hits:
+                self.collection.update_many({"_id": {"$in": stored_hits}}, {"$set": {"last_used": datetime.now()}})
+
+        results = [found.get(key) for key in keys]
+        hits = sum(1 for vector in results if vector is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def get(self, model, text):
+        """Renvoie l'embedding en cache d'un texte, ou None."""
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model, texts, vectors):
+        """Enregistre des embeddings dans le cache puis applique la politique d'éviction."""
+        now = datetime.now()
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                continue
+            key = self.key(model, text)
+            # 🗜️ Le cache est toujours stocké en float32 binaire
+            entries[key] = {"model": model, "vector": encode_vector(vector, "float32"), "created_at": now, "last_used": now}
+            self._remember(key, vector)
+
+        if not entries:
+            return
+        self.collection.bulk_write(
+            [UpdateOne({"_id": key}, {"$set": entry}, upsert=True) for key, entry in entries.items()],
+            ordered=False
+        )
+        self.evict()
+
+    def put(self, model, text, vector):
+        """Enregistre l'embedding d'un texte dans le cache."""
+        self.put_many(model, [text], [vector])
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de `max_entries`."""
+        excess = self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return
+        oldest = self.collection.find({}, {"_id": 1}).sort("last_used", ASCENDING).limit(excess)
+        keys = [doc["_id"] for doc in oldest]
+        self.collection.delete_many({"_id": {"$in": keys}})
+        for key in keys:
+            self.lru.pop(key, None)
+        print(f"🧹 Cache d'embeddings : {len(keys)} entrées évincées")
+
+    def stats(self):
+        """Compteurs de succès/échecs du cache."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
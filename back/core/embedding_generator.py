@@ -1,41 +1,217 @@
+import asyncio
+import logging
+import random
 import openai
 import numpy as np
+import tiktoken
+from openai import AsyncOpenAI, OpenAI
+from vector_codec import encode_vector
+from text_normalization import embedding_text, truncate_to_tokens
+from metrics import get_metrics
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+MAX_INPUT_TOKENS = 8191       # Limite par texte du modèle d'embedding
+MAX_BATCH_TOKENS = 300000     # Limite de tokens par requête de l'API
+MAX_BATCH_ITEMS = 2048        # Limite de textes par requête de l'API
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
 
 class EmbeddingGenerator:
-    def __init__(self, db_manager, docstore, api_key):
+    def __init__(self, db_manager, docstore, api_key, base_url=None, model=EMBEDDING_MODEL,
+                 max_batch_tokens=MAX_BATCH_TOKENS, max_batch_items=MAX_BATCH_ITEMS,
+                 max_concurrency=4, max_retries=6, cache=None):
+        """
+        :param base_url: URL de l'API compatible OpenAI (par défaut `OPENAI_BASE_URL`, utile pour un serveur local de test).
+        :param max_batch_tokens: Nombre maximal de tokens envoyés par requête.
+        :param max_batch_items: Nombre maximal de textes envoyés par requête.
+        :param max_concurrency: Nombre de requêtes d'embedding simultanées.
+        :param max_retries: Nombre de tentatives en cas de limite de débit ou d'erreur serveur.
+        :param cache: EmbeddingCache optionnel consulté avant tout appel à OpenAI.
+        """
         self.db_manager = db_manager
         self.docstore = docstore
-        openai.api_key = api_key
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        self.model = model
+        self.tokenizer = tiktoken.encoding_for_model(model)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.cache = cache
+        self.vector_sinks = []  # Index (ex. SearchEmbeddings) à alimenter au fil des nouveaux embeddings
 
     def generate_embedding(self, text):
         """Génère un embedding à partir du texte en utilisant OpenAI."""
+        if self.cache:
+            embedding = self.cache.get(self.model, text)
+            if embedding is not None:
+                return embedding
         try:
-            print(f"🚀 Envoi d'un embedding pour : {text[:50]}...")
-            response = openai.embeddings.create(model="text-embedding-ada-002", input=text)
+            logger.debug(f"🚀 Envoi d'un embedding pour : {text[:50]}...")
+            truncated, _ = self.truncate(text)
+            with get_metrics().openai_call("embeddings", self.model) as call:
+                response = self.client.embeddings.create(model=self.model, input=truncated)
+                call.usage = response.usage
             embedding = response.data[0].embedding
-            print(f"✅ Embedding généré ({len(embedding)} valeurs) pour : {text[:50]}...")
+            logger.debug(f"✅ Embedding généré ({len(embedding)} valeurs) pour : {text[:50]}...")
+            if self.cache:
+                self.cache.put(self.model, text, embedding)
             return embedding
         except Exception as e:
-            print(f"❌ Erreur OpenAI : {e}")
+            logger.info(f"❌ Erreur OpenAI : {e}")
             return None
 
+    def truncate(self, text):
+        """Tronque un texte à la limite de tokens du modèle et renvoie (texte, nombre de tokens)."""
+        truncated, count, _ = truncate_to_tokens(text, MAX_INPUT_TOKENS, self.tokenizer)
+        return truncated, count
+
+    def pack_batches(self, token_counts):
+        """Regroupe les indices des textes en lots respectant les limites de tokens et de textes par requête."""
+        batches, current, current_tokens = [], [], 0
+        for index, count in enumerate(token_counts):
+            if current and (current_tokens + count > self.max_batch_tokens or len(current) >= self.max_batch_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += count
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_batch(self, texts):
+        """Envoie un lot de textes à l'API, avec backoff exponentiel (et jitter) sur les erreurs temporaires."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with get_metrics().openai_call("embeddings", self.model) as call:
+                    response = await self.async_client.embeddings.create(model=self.model, input=texts)
+                    call.usage = response.usage
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt) * (0.5 + random.random())
+                print(f"⏳ Limite OpenAI atteinte ({type(e).__name__}), nouvel essai dans {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def agenerate_embeddings(self, texts, on_batch=None, token_counts=None):
+        """
+        Génère les embeddings d'une liste de textes par lots concurrents.
+        :param on_batch: Callback optionnel appelé avec (indices, embeddings) à la fin de chaque lot.
+        :param token_counts: Comptes de tokens pré-calculés (alignés sur `texts`, None pour un texte à tokeniser) ;
+                             les textes comptés doivent déjà respecter la limite du modèle.
+        :return: Liste alignée sur `texts` (None pour les textes dont le lot a échoué).
+        """
+        results = [None] * len(texts)
+
+        # 🗃️ Les textes déjà encodés (reprises, articles re-scrapés) sont servis par le cache
+        if self.cache:
+            results = self.cache.get_many(self.model, texts)
+            hit_indexes = [i for i, embedding in enumerate(results) if embedding is not None]
+            if hit_indexes:
+                print(f"🗃️ {len(hit_indexes)} embeddings trouvés dans le cache")
+                if on_batch:
+                    on_batch(hit_indexes, [results[i] for i in hit_indexes])
+
+        pending = [i for i, embedding in enumerate(results) if embedding is None]
+        truncated = [
+            (texts[i], token_counts[i]) if token_counts and token_counts[i] is not None else self.truncate(texts[i])
+            for i in pending
+        ]
+        batches = [
+            [pending[j] for j in batch]
+            for batch in self.pack_batches([count for _, count in truncated])
+        ]
+        inputs = {i: text for i, (text, _) in zip(pending, truncated)}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_batch(indexes):
+            async with semaphore:
+                try:
+                    embeddings = await self._embed_batch([inputs[i] for i in indexes])
+                except RETRYABLE_ERRORS as e:
+                    print(f"❌ Erreur OpenAI sur un lot de {len(indexes)} textes : {e}")
+                    return
+                except Exception as e:
+                    error = e
+                    embeddings = None
+            if embeddings is None:
+                # ✂️ Erreur non temporaire (ex. un texte refusé) : le lot est coupé en deux pour isoler le fautif
+                if len(indexes) == 1:
+                    print(f"❌ Texte refusé par OpenAI (indice {indexes[0]}) : {error}")
+                    return
+                middle = len(indexes) // 2
+                await asyncio.gather(run_batch(indexes[:middle]), run_batch(indexes[middle:]))
+                return
+            for i, embedding in zip(indexes, embeddings):
+                results[i] = embedding
+            if self.cache:
+                self.cache.put_many(self.model, [texts[i] for i in indexes], embeddings)
+            if on_batch:
+                on_batch(indexes, embeddings)
+
+        print(f"🚀 {len(pending)} textes à encoder en {len(batches)} requêtes...")
+        await asyncio.gather(*(run_batch(indexes) for indexes in batches))
+        return results
+
+    def generate_embeddings(self, texts):
+        """Version synchrone de `agenerate_embeddings`."""
+        return asyncio.run(self.agenerate_embeddings(texts))
+
+    async def aembed_articles(self, articles):
+        """
+        Génère les embeddings d'articles et les enregistre avec une mise à jour groupée par lot.
+        Les articles normalisés à l'ingestion (`token_count`) ne sont pas re-tokenisés, sauf ceux qui ont été
+        tronqués : leur coupe est re-vérifiée avant l'envoi.
+        """
+        texts = [embedding_text(article) for article in articles]
+        token_counts = [
+            article["token_count"] if article.get("token_count") is not None and not article.get("embedding_char_limit")
+            else None
+            for article in articles
+        ]
+
+        def write_batch(indexes, embeddings):
+            self.docstore.bulk_update_documents([
+                (articles[i]["_id"], {"content_vector": encode_vector(embedding), "needs_embedding": False})
+                for i, embedding in zip(indexes, embeddings)
+            ])
+            for sink in self.vector_sinks:
+                sink.add_articles([articles[i] for i in indexes], embeddings)
+
+        results = await self.agenerate_embeddings(texts, on_batch=write_batch, token_counts=token_counts)
+        done = [str(article["_id"]) for article, embedding in zip(articles, results) if embedding is not None]
+        print(f"✅ Embeddings ajoutés : {len(done)}/{len(articles)}")
+        return done
+
+    async def aembed_missing(self, batch_size=1000):
+        """
+        Génère les embeddings des seuls articles qui n'en ont pas, lus en flux par lots.
+        :return: Identifiants des articles encodés.
+        """
+        cursor = self.docstore.iter_documents(
+            {"needs_embedding": True},  # Index partiel : seuls les articles à encoder sont parcourus
+            {"title": 1, "content": 1, "category": 1, "pub_date": 1, "token_count": 1, "embedding_char_limit": 1},
+            batch_size=batch_size
+        )
+        embedded, batch = [], []
+        for article in cursor:
+            batch.append(article)
+            if len(batch) >= batch_size:
+                embedded.extend(await self.aembed_articles(batch))
+                batch = []
+        if batch:
+            embedded.extend(await self.aembed_articles(batch))
+        return embedded
+
     def update_embeddings(self):
         """Met à jour les articles en ajoutant des embeddings si absents."""
-        articles = self.docstore.get_all_documents()
-
-        for article in articles:
-            if "content_vector" in article and article["content_vector"]:
-                print(f"⚠️ Embedding déjà existant pour {article['title']}, SKIP")
-                continue  
-
-            text = f"{article['title']} {article.get('content', '')}"
-            embedding = self.generate_embedding(text)
-
-            if embedding:
-                self.docstore.update_document(
-                    doc_id=article["_id"], 
-                    updates={"content_vector": embedding}
-                )
-                print(f"✅ Embedding ajouté pour {article['title']}")
-            else:
-                print(f"❌ Échec de l'embedding pour {article['title']}")
+        asyncio.run(self.aembed_missing())
@@ -0,0 +1,347 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+PREFIX = "veille_"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Prix OpenAI en dollars par million de tokens (entrée, sortie), surchargeables par `OPENAI_PRICES` (JSON)
+OPENAI_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+OPENAI_PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("OPENAI_PRICES", "{}")).items()})
+
+_current_step = contextvars.ContextVar("metrics_step", default="none")
+
+
+def configure_logging(level=None):
+    """
+    Niveau de journalisation (`LOG_LEVEL`) : DEBUG affiche les traces article par article,
+    INFO seulement les échecs par article, WARNING aucune sortie par article.
+    """
+    level = logging.getLevelName((level or LOG_LEVEL).upper())
+    logging.basicConfig(level=level, format="%(message)s")
+    # Une ligne par requête HTTP dans ces bibliothèques : seulement en DEBUG
+    for name in ("httpx", "openai", "urllib3"):
+        logging.getLogger(name).setLevel(max(level, logging.WARNING) if level > logging.DEBUG else level)
+
+
+def _escape(value):
+    """Échappement d'une valeur de label Prometheus."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Histogramme à seaux fixes (format Prometheus) avec somme, nombre et maximum observés."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Dernier seau : +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Quantile approché (borne supérieure du seau qui le contient)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": round(self.quantile(0.5), 6) if self.count else None,
+            "p95": round(self.quantile(0.95), 6) if self.count else None,
+            "max": round(self.max, 6),
+        }
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Compte les allers-retours MongoDB (par étape et par commande) et mesure leur durée."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        self.metrics.inc("mongo_commands_total", step=_current_step.get(), command=event.command_name)
+
+    def succeeded(self, event):
+        self.metrics.observe("mongo_command_seconds", event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        self.metrics.inc("mongo_command_failures_total", step=_current_step.get(), command=event.command_name)
+        self.metrics.observe("mongo_command_seconds", event.duration_micros / 1e6, command=event.command_name)
+
+
+class Metrics:
+    """
+    Métriques d'un passage du workflow : durée des étapes, allers-retours MongoDB, requêtes OpenAI
+    (latence, tokens, coût estimé), téléchargements par domaine et envois Telegram.
+    Chaque mesure est attribuée à l'étape en cours (variable de contexte, héritée par les tâches et les threads).
+    Export JSON et Prometheus (texte) ; spans OpenTelemetry si `setup_tracing` a été appelé.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)  # {(nom, labels): valeur}
+        self.histograms = {}                # {(nom, labels): Histogram}
+        self.tracer = None
+        self.mongo_listener = MongoCommandListener(self)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[self._key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @staticmethod
+    def current_step():
+        return _current_step.get()
+
+    def span(self, name, **attributes):
+        """Span OpenTelemetry (sans effet si le tracing n'est pas configuré)."""
+        if self.tracer is None:
+            return contextlib.nullcontext()
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+    @contextlib.contextmanager
+    def step(self, name):
+        """Mesure une étape ; les métriques enregistrées pendant son exécution portent son nom."""
+        token = _current_step.set(name)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            with self.span(f"step.{name}"):
+                yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.inc("step_seconds", time.perf_counter() - started, step=name)
+            self.inc("step_runs_total", step=name, status=status)
+            _current_step.reset(token)
+
+    def instrument_step(self, fn):
+        """Décorateur d'étape asynchrone du workflow (à placer sous `@step`)."""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with self.step(fn.__name__):
+                return await fn(*args, **kwargs)
+        return wrapper
+
+    def observe_openai(self, kind, model, seconds, usage=None, status="ok"):
+        """
+        Requête OpenAI terminée (ou en échec) : latence, tokens consommés et coût estimé.
+        :param kind: "chat" ou "embeddings".
+        :param usage: Objet `usage` de la réponse (prompt_tokens, completion_tokens).
+        """
+        step = _current_step.get()
+        self.inc("openai_requests_total", step=step, kind=kind, model=model, status=status)
+        self.observe("openai_request_seconds", seconds, kind=kind, model=model)
+        if usage is None:
+            return
+        tokens_in = getattr(usage, "prompt_tokens", 0) or 0
+        tokens_out = getattr(usage, "completion_tokens", 0) or 0
+        self.inc("openai_tokens_total", tokens_in, step=step, model=model, direction="in")
+        self.inc("openai_tokens_total", tokens_out, step=step, model=model, direction="out")
+        price_in, price_out = OPENAI_PRICES.get(model, (0.0, 0.0))
+        self.inc("openai_cost_dollars_total", (tokens_in * price_in + tokens_out * price_out) / 1e6, step=step, model=model)
+
+    @contextlib.contextmanager
+    def openai_call(self, kind, model):
+        """
+        Mesure une requête OpenAI ; l'appelant renseigne `call.usage` avec l'usage de la réponse.
+        Une exception est comptée avec son type comme statut (RateLimitError, APITimeoutError...).
+        """
+        call = SimpleNamespace(usage=None)
+        started = time.perf_counter()
+        with self.span(f"openai.{kind}", model=model):
+            try:
+                yield call
+            except Exception as e:
+                self.observe_openai(kind, model, time.perf_counter() - started, status=type(e).__name__)
+                raise
+        self.observe_openai(kind, model, time.perf_counter() - started, call.usage)
+
+    def observe_fetch(self, url, seconds, status):
+        """Téléchargement HTTP (flux ou article) : latence par domaine."""
+        domain = urlparse(url).netloc
+        self.inc("fetch_requests_total", step=_current_step.get(), domain=domain, status=status)
+        self.observe("fetch_seconds", seconds, domain=domain)
+
+    def observe_telegram(self, seconds, ok):
+        self.inc("telegram_messages_total", step=_current_step.get(), status="sent" if ok else "failed")
+        if seconds is not None:
+            self.observe("telegram_send_seconds", seconds)
+
+    def steps_summary(self):
+        """Synthèse par étape : durée, allers-retours MongoDB, requêtes, tokens et coût OpenAI, téléchargements."""
+        fields = {
+            "step_seconds": "seconds",
+            "mongo_commands_total": "mongo_commands",
+            "openai_requests_total": "openai_requests",
+            "openai_cost_dollars_total": "openai_cost_dollars",
+            "fetch_requests_total": "fetches",
+        }
+        summary = defaultdict(lambda: {field: 0 for field in (*fields.values(), "tokens_in", "tokens_out")})
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                labels = dict(labels)
+                if "step" not in labels:
+                    continue
+                if name in fields:
+                    summary[labels["step"]][fields[name]] += value
+                elif name == "openai_tokens_total":
+                    summary[labels["step"]][f"tokens_{labels['direction']}"] += value
+        return {
+            step: {field: round(value, 6) if isinstance(value, float) else value for field, value in values.items()}
+            for step, values in summary.items()
+        }
+
+    def to_dict(self, run_id=None):
+        with self._lock:
+            counters = [{"name": PREFIX + name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{"name": PREFIX + name, "labels": dict(labels), **histogram.as_dict()}
+                          for (name, labels), histogram in sorted(self.histograms.items())]
+        return {
+            "run_id": run_id,
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "steps": self.steps_summary(),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+    def to_prometheus(self, run_id=None):
+        """Export au format texte Prometheus (node_exporter textfile, pushgateway...)."""
+        run_label = (("run_id", run_id),) if run_id else ()
+        lines = []
+        with self._lock:
+            by_name = defaultdict(list)
+            for (name, labels), value in sorted(self.counters.items()):
+                by_name[name].append((labels, value))
+            for name, samples in by_name.items():
+                metric_type = "gauge" if name == "step_seconds" else "counter"
+                lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+                lines.extend(f"{PREFIX}{name}{self._labels(labels, run_label)} {value}" for labels, value in samples)
+
+            by_name = defaultdict(list)
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                by_name[name].append((labels, histogram))
+            for name, samples in by_name.items():
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for labels, histogram in samples:
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{PREFIX}{name}_bucket{self._labels(labels, (*run_label, ('le', bound)))} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_sum{self._labels(labels, run_label)} {histogram.sum}")
+                    lines.append(f"{PREFIX}{name}_count{self._labels(labels, run_label)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, run_id, directory=None):
+        """Écrit les métriques du passage en JSON et au format Prometheus ; renvoie les chemins des fichiers."""
+        directory = directory or METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, f"{run_id}.json")
+        prom_path = os.path.join(directory, f"{run_id}.prom")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(run_id), f, indent=2, ensure_ascii=False)
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(run_id))
+        return json_path, prom_path
+
+    def report(self):
+        """Affiche la synthèse par étape."""
+        for step, values in self.steps_summary().items():
+            print(f"📈 {step} : {values['seconds']:.2f}s, {values['mongo_commands']:.0f} requêtes MongoDB, "
+                  f"{values['openai_requests']:.0f} requêtes OpenAI ({values['tokens_in']:.0f} tokens in / "
+                  f"{values['tokens_out']:.0f} out, ~{values['openai_cost_dollars']:.4f} $), {values['fetches']:.0f} téléchargements")
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Registre de métriques du processus."""
+    return _metrics
+
+
+def setup_tracing(service_name="veille_mediatique"):
+    """
+    Active les spans OpenTelemetry si `OTEL_EXPORTER_OTLP_ENDPOINT` est défini et que le SDK est installé
+    (étapes du workflow et appels externes). Sans effet sinon.
+    """
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return False
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("⚠️ OpenTelemetry n'est pas installé : spans désactivés.")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _metrics.tracer = trace.get_tracer(service_name)
+    return True
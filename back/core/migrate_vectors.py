@@ -0,0 +1,53 @@
+from pymongo import UpdateOne
+import argparse
+import os
+from dotenv import load_dotenv
+from vector_codec import encode_vector, decode_vector
+from mongo_registry import get_client, close_clients
+
+load_dotenv()
+
+class VectorMigrator:
+    def __init__(self):
+        """Initialisation de la connexion MongoDB."""
+        self.client = get_client()
+        self.db = self.client[os.getenv("MONGO_DB_NAME")]
+        self.collection = self.db[os.getenv("MONGO_COLLECTION")]
+
+    def migrate(self, storage_format="float32", batch_size=500):
+        """Convertit les `content_vector` existants vers le format demandé, par lots."""
+        # Seuls les documents encore dans l'autre format sont relus
+        source_type = "array" if storage_format == "float32" else "binData"
+        query = {"content_vector": {"$type": source_type}}
+        print(f"🔄 Conversion de {self.collection.count_documents(query)} vecteurs vers le format {storage_format}...")
+
+        converted = 0
+        cursor = self.collection.find(query, {"content_vector": 1}, batch_size=batch_size)
+        operations = []
+        for document in cursor:
+            vector = encode_vector(decode_vector(document["content_vector"]), storage_format)
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": {"content_vector": vector}}))
+            if len(operations) >= batch_size:
+                converted += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                print(f"📦 {converted} vecteurs convertis...")
+        if operations:
+            converted += self.collection.bulk_write(operations, ordered=False).modified_count
+
+        print(f"✅ Migration terminée : {converted} vecteurs convertis.")
+        return converted
+
+    def close(self):
+        """Ferme la connexion MongoDB."""
+        close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion du format de stockage des embeddings")
+    parser.add_argument("--format", choices=["float32", "array"], default="float32", help="Format cible")
+    parser.add_argument("--batch-size", type=int, default=500, help="Nombre de documents par bulk_write")
+    args = parser.parse_args()
+
+    migrator = VectorMigrator()
+    migrator.migrate(storage_format=args.format, batch_size=args.batch_size)
+    migrator.close()
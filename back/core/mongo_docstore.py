@@ -1,10 +1,12 @@
 from llama_index.core import Document
-from pymongo import MongoClient
+from pymongo import UpdateOne
 from bson import ObjectId
+from vector_codec import decode_document
+from mongo_registry import get_client
 
 class MongoDBDocStore:
     def __init__(self, uri, db_name, collection_name):
-        self.client = MongoClient(uri)
+        self.client = get_client(uri)  # Client partagé avec DatabaseManager
         self.collection = self.client[db_name][collection_name]
 
     def add_document(self, document: Document):
@@ -13,7 +15,7 @@ class MongoDBDocStore:
 
     def get_document_by_id(self, doc_id: str):
         """Récupère un document par son identifiant."""
-        return self.collection.find_one({"_id": ObjectId(doc_id)})
+        return decode_document(self.collection.find_one({"_id": ObjectId(doc_id)}))
 
     def delete_document_by_id(self, doc_id: str):
         """Supprime un document par son identifiant."""
@@ -23,10 +25,30 @@ class MongoDBDocStore:
         """Met à jour un document existant."""
         self.collection.update_one({"_id": ObjectId(doc_id)}, {"$set": updates})
 
+    def bulk_update_documents(self, updates):
+        """Met à jour plusieurs documents en un seul `bulk_write` : `updates` est une liste de (doc_id, champs)."""
+        if not updates:
+            return
+        self.collection.bulk_write(
+            [UpdateOne({"_id": ObjectId(doc_id)}, {"$set": fields}) for doc_id, fields in updates],
+            ordered=False
+        )
+
+    def iter_documents(self, filter_query, projection=None, batch_size=1000):
+        """Parcourt en flux les documents correspondant à un filtre (curseur par lots)."""
+        for doc in self.collection.find(filter_query, projection, batch_size=batch_size):
+            yield decode_document(doc)
+
+    def get_documents_by_ids(self, doc_ids, projection=None):
+        """Récupère plusieurs documents par identifiant en une requête, dans l'ordre demandé."""
+        object_ids = [ObjectId(doc_id) for doc_id in doc_ids]
+        found = {doc["_id"]: decode_document(doc) for doc in self.collection.find({"_id": {"$in": object_ids}}, projection)}
+        return [found[object_id] for object_id in object_ids if object_id in found]
+
     def get_all_documents(self):
         """Récupère tous les documents."""
-        return list(self.collection.find())
+        return [decode_document(doc) for doc in self.collection.find()]
 
     def filter_documents(self, filter_query: dict):
         """Filtre les documents selon une condition."""
-        return list(self.collection.find(filter_query))
+        return [decode_document(doc) for doc in self.collection.find(filter_query)]
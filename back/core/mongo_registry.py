@@ -0,0 +1,63 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from metrics import get_metrics
+
+load_dotenv()
+
+_clients = {}
+_lock = threading.Lock()
+
+def client_options():
+    """Réglages du pool de connexions (surchargeables par variables d'environnement)."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000)),
+        "retryWrites": True,
+        "event_listeners": [get_metrics().mongo_listener],  # Allers-retours comptés par étape du workflow
+    }
+    if os.getenv("MONGO_COMPRESSORS"):
+        options["compressors"] = os.getenv("MONGO_COMPRESSORS")  # ex. "zstd,snappy,zlib"
+    return options
+
+def get_client(uri=None, **overrides):
+    """
+    Renvoie le MongoClient partagé du processus pour une URI (créé à la première demande).
+    Un client n'étant pas réutilisable après un fork, chaque processus a le sien.
+    :param uri: URI MongoDB (par défaut `MONGO_URI`).
+    :param overrides: Options du client remplaçant les réglages par défaut (ex. listeners d'événements).
+    """
+    uri = uri or os.getenv("MONGO_URI")
+    key = (uri, os.getpid())
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(uri, **{**client_options(), **overrides})
+            _clients[key] = client
+        return client
+
+def set_client(client, uri=None):
+    """Enregistre un client déjà construit pour une URI (ex. base de substitution d'un banc d'essai)."""
+    with _lock:
+        _clients[(uri or os.getenv("MONGO_URI"), os.getpid())] = client
+
+def get_database(name=None, uri=None):
+    """Base de données sur le client partagé (par défaut `MONGO_DB_NAME`)."""
+    return get_client(uri)[name or os.getenv("MONGO_DB_NAME")]
+
+def get_collection(name=None, db_name=None, uri=None):
+    """Collection sur le client partagé (par défaut la collection des articles, `MONGO_COLLECTION`)."""
+    return get_database(db_name, uri)[name or os.getenv("MONGO_COLLECTION")]
+
+def close_clients():
+    """Ferme tous les clients du processus (fin de script)."""
+    with _lock:
+        for (_, pid), client in list(_clients.items()):
+            if pid == os.getpid():
+                client.close()
+        _clients.clear()
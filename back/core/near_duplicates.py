@@ -0,0 +1,117 @@
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import mmh3
+import numpy as np
+from bson import Binary
+from pymongo import ASCENDING, ReplaceOne
+
+NUM_PERM = 64            # Nombre de permutations MinHash
+BANDS = 8                # Bandes LSH (8 × 8 lignes : seuil de détection ≈ 0,77 de similarité)
+SHINGLE_SIZE = 5         # Taille des shingles, en mots
+MIN_WORDS = 50           # En dessous (paywall, bandeau cookies...), un texte court et générique n'est pas dédoublonné
+
+# Permutations « multiply-shift » : h(x) = (a·x + b mod 2⁶⁴) >> 32, avec a impair
+_rng = np.random.default_rng(42)
+_PERM_A = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_WORDS = re.compile(r"\w+")
+
+
+def minhash_signature(text, shingle_size=SHINGLE_SIZE, min_words=MIN_WORDS):
+    """
+    Signature MinHash d'un texte, sur des shingles de mots (minuscules).
+    Chaque shingle est haché une fois (mmh3, 32 bits) puis permuté de façon vectorisée.
+    :param min_words: Nombre minimal de mots pour calculer une signature.
+    :return: Vecteur uint32 de NUM_PERM valeurs, ou None si le texte est trop court.
+    """
+    words = _WORDS.findall(text.lower())
+    if not words or len(words) < min_words:
+        return None
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.fromiter((mmh3.hash(shingle, signed=False) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    # Les dépassements de capacité sont voulus : l'arithmétique uint64 se fait modulo 2⁶⁴
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimation de la similarité de Jaccard de deux textes à partir de leurs signatures."""
+    return float(np.mean(a == b))
+
+
+class NearDuplicateIndex:
+    """
+    Index LSH des signatures MinHash des articles récents (collection `article_signatures`, expiration par TTL).
+    Un article dont le texte est quasi identique à un article déjà indexé est rattaché à ce dernier (article canonique).
+    """
+
+    def __init__(self, collection, threshold=0.8, window_days=3, bands=BANDS):
+        """
+        :param collection: Collection MongoDB des signatures (ex. `db["article_signatures"]`).
+        :param threshold: Similarité estimée minimale pour considérer deux articles comme doublons.
+        :param window_days: Ancienneté maximale des articles canoniques candidats.
+        :param bands: Nombre de bandes LSH (doit diviser NUM_PERM).
+        """
+        self.collection = collection
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.window = timedelta(days=window_days)
+        self.buckets = defaultdict(list)  # {(bande, hachage de la bande): [liens]}
+        self.signatures = {}              # {lien canonique: signature}
+
+        self.collection.create_index([("created_at", ASCENDING)], name="created_at_ttl",
+                                     expireAfterSeconds=int(self.window.total_seconds()))
+        for doc in self.collection.find({"created_at": {"$gte": datetime.now() - self.window}}):
+            self._index(doc["_id"], np.frombuffer(doc["signature"], dtype=np.uint32))
+
+    def _band_keys(self, signature):
+        return [
+            (band, mmh3.hash_bytes(signature[band * self.rows:(band + 1) * self.rows].tobytes()))
+            for band in range(self.bands)
+        ]
+
+    def _index(self, link, signature):
+        self.signatures[link] = signature
+        for key in self._band_keys(signature):
+            self.buckets[key].append(link)
+
+    def find(self, signature):
+        """Article canonique le plus proche d'une signature : (lien, similarité), ou (None, 0.0)."""
+        candidates = {link for key in self._band_keys(signature) for link in self.buckets.get(key, ())}
+        best_link, best_score = None, 0.0
+        for link in candidates:
+            score = similarity(signature, self.signatures[link])
+            if score > best_score:
+                best_link, best_score = link, score
+        if best_score >= self.threshold:
+            return best_link, best_score
+        return None, 0.0
+
+    def add(self, link, signature):
+        """Indexe un article canonique en mémoire (voir `persist` pour l'enregistrer)."""
+        self.discard(link)
+        self._index(link, signature)
+
+    def discard(self, link):
+        """Retire un article de l'index en mémoire (écriture en échec, article canonique absent de la base)."""
+        signature = self.signatures.pop(link, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket and link in bucket:
+                bucket.remove(link)
+
+    def persist(self, links):
+        """Enregistre les signatures d'articles canoniques effectivement écrits en base."""
+        now = datetime.now()
+        operations = [
+            ReplaceOne({"_id": link}, {"signature": Binary(self.signatures[link].tobytes()), "created_at": now}, upsert=True)
+            for link in links if link in self.signatures
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
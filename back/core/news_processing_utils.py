@@ -1,13 +1,21 @@
 # news_processing_utils.py
 
 import numpy as np
-from sklearn.cluster import DBSCAN
+import hashlib
+import json
+from clustering import ClusteringEngine
 import openai
 import tiktoken
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import os
+import asyncio
+import random
+import time
+import weakref
 from dotenv import load_dotenv
 import requests
+from metrics import get_metrics
+from text_normalization import article_text, truncate_to_tokens
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -18,10 +26,10 @@ tokenizer = tiktoken.encoding_for_model("gpt-3.5-turbo")
 
 def cluster_articles(articles, eps=0.3, min_samples=2):
     embeddings = np.array([article["content_vector"] for article in articles])
-    clustering = DBSCAN(eps=eps, min_samples=min_samples, metric='cosine').fit(embeddings)
+    labels = ClusteringEngine(eps=eps, min_samples=min_samples).fit_predict(embeddings)
     
     clusters = {}
-    for label, article in zip(clustering.labels_, articles):
+    for label, article in zip(labels, articles):
         if label != -1:
             clusters.setdefault(label, []).append(article)
     return clusters
@@ -30,12 +38,19 @@ def cluster_articles(articles, eps=0.3, min_samples=2):
 def num_tokens(text):
     return len(tokenizer.encode(text))
 
-def chunk_text(texts, max_tokens=14000):
+def chunk_text(texts, max_tokens=14000, token_counts=None):
+    """
+    Découpe une liste de textes en chunks bornés en tokens ; un texte qui dépasse à lui seul la limite est tronqué.
+    :param token_counts: Comptes pré-calculés (alignés sur `texts`, None pour un texte à tokeniser).
+    """
     chunks, current_chunk, current_length = [], [], 0
-    for text in texts:
-        tokens = num_tokens(text)
+    for index, text in enumerate(texts):
+        tokens = token_counts[index] if token_counts and token_counts[index] is not None else num_tokens(text)
+        if tokens > max_tokens:
+            text, tokens, _ = truncate_to_tokens(text, max_tokens, tokenizer)
         if current_length + tokens > max_tokens:
-            chunks.append(current_chunk)
+            if current_chunk:  # Jamais de chunk vide : ce serait un appel LLM payant sur un prompt vide
+                chunks.append(current_chunk)
             current_chunk, current_length = [text], tokens
         else:
             current_chunk.append(text)
@@ -45,10 +60,7 @@ def chunk_text(texts, max_tokens=14000):
     return chunks
 
 def summarize_text(text):
-    prompt = (
-        "Tu es un expert en synthèse d'actualités. Résume ces articles bullets points de bullet points afin d'avoir une synthèse complète :\n\n"
-        f"{text}"
-    )
+    prompt = build_summary_prompt(text)
     response = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
@@ -58,29 +70,282 @@ def summarize_text(text):
     )
     return response.choices[0].message.content.strip()
 
-def summarize_cluster(cluster_articles):
-    articles_texts = [f"{a['title']}. {a.get('content', '')}" for a in cluster_articles]
+SUMMARY_MODEL = "gpt-4o-mini"
 
-    chunks = chunk_text(articles_texts)
 
-    intermediate_summaries = []
-    for chunk in chunks:
-        combined_text = "\n\n".join(chunk)
-        summary = summarize_text(combined_text)
-        intermediate_summaries.append(summary)
+class TokenBucket:
+    """Seau à jetons asynchrone : `rate_per_minute` jetons par minute, rafale bornée à `capacity`."""
 
-    final_summary = summarize_text("\n\n".join(intermediate_summaries))
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
 
-    return final_summary
+    async def acquire(self, amount=1):
+        """Attend que `amount` jetons soient disponibles puis les consomme."""
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
 
-def generate_cluster_label(titles):
-    prompt = (
+
+class LLMClientPool:
+    """
+    Client OpenAI asynchrone partagé par les étapes LLM du workflow :
+    concurrence bornée, seaux à jetons requêtes/minute et tokens/minute, retries avec backoff (et jitter)
+    sur les 429 et les erreurs 5xx.
+    """
+
+    def __init__(self, max_concurrency=8, requests_per_minute=500, tokens_per_minute=200000, max_retries=6, client=None):
+        self.client = client or AsyncOpenAI()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+
+    @staticmethod
+    def _retry_delay(error, attempt):
+        """Délai avant nouvel essai : `retry-after` si l'API le fournit, sinon backoff exponentiel avec jitter."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after) + random.random()
+            except ValueError:
+                pass
+        return min(60, 2 ** attempt) * (0.5 + random.random())
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    async def chat(self, messages, model=SUMMARY_MODEL, max_tokens=None, temperature=0.2, **kwargs):
+        """Envoie une requête de chat en respectant les quotas ; renvoie la réponse complète."""
+        estimate = sum(num_tokens(message["content"]) for message in messages) + (max_tokens or 1000)
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimate)
+            try:
+                async with self.semaphore:
+                    with get_metrics().openai_call("chat", model) as call:
+                        response = await self.client.chat.completions.create(
+                            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature, **kwargs
+                        )
+                        call.usage = response.usage
+                    return response
+            except openai.OpenAIError as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(e, attempt)
+                print(f"⏳ Erreur temporaire OpenAI ({type(e).__name__}), nouvel essai dans {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+
+_llm_pools = weakref.WeakKeyDictionary()  # Un pool par boucle d'événements (verrous et client y sont liés)
+
+def get_llm_pool():
+    """Renvoie le pool LLM partagé de la boucle d'événements courante (créé à la première utilisation)."""
+    loop = asyncio.get_running_loop()
+    pool = _llm_pools.get(loop)
+    if pool is None:
+        pool = _llm_pools[loop] = LLMClientPool(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", 500)),
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", 200000)),
+        )
+    return pool
+
+
+def build_summary_prompt(text):
+    return (
+        "Tu es un expert en synthèse d'actualités. Résume ces articles bullets points de bullet points afin d'avoir une synthèse complète :\n\n"
+        f"{text}"
+    )
+
+def build_label_prompt(titles):
+    return (
         "Tu es un expert en catégorisation de l'actualité. "
         "Génère un **titre explicite et descriptif** en 4-5 mots maximum pour le **thème principal** de ces articles :\n"
         + "\n".join(titles)
         + "\n\nRéponds uniquement par un titre court et explicite qui pourrait être utilisé comme catégorie d'un journal."
     )
 
+def build_summary_label_prompt(text):
+    return (
+        "Tu es un expert en synthèse et en catégorisation de l'actualité. À partir de ces articles, produis :\n"
+        "- \"label\" : un **titre explicite et descriptif** en 4-5 mots maximum pour le **thème principal**, "
+        "utilisable comme catégorie d'un journal ;\n"
+        "- \"summary\" : une synthèse complète en bullet points.\n"
+        "Réponds uniquement par un objet JSON {\"label\": ..., \"summary\": ...}.\n\n"
+        f"{text}"
+    )
+
+SUMMARY_PROMPT_ID = hashlib.sha256(build_summary_prompt("").encode("utf-8")).hexdigest()[:16]
+LABEL_PROMPT_ID = hashlib.sha256(build_label_prompt([]).encode("utf-8")).hexdigest()[:16]
+SUMMARY_LABEL_PROMPT_ID = hashlib.sha256(build_summary_label_prompt("").encode("utf-8")).hexdigest()[:16]
+REDUCE_MAX_TOKENS = 14000
+
+def reduce_groups(summaries, max_tokens=REDUCE_MAX_TOKENS):
+    """
+    Regroupe des résumés en groupes bornés en tokens pour le niveau de réduction suivant.
+    Si aucun regroupement n'est possible (résumés trop longs), on les réduit deux à deux pour garantir la convergence.
+    """
+    groups = chunk_text(summaries, max_tokens)
+    if len(groups) == len(summaries) > 1:
+        groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    return groups
+
+def stable_order(cluster_articles):
+    """
+    Ordre stable des articles d'un cluster : par id d'insertion (l'ObjectId croît avec la date d'insertion).
+    Les nouveaux articles arrivent en fin de liste et ne modifient que le dernier chunk.
+    """
+    return sorted(cluster_articles, key=lambda a: str(a["_id"]))
+
+def source_prefix(article):
+    """Mention du nombre de sources pour une dépêche reprise par plusieurs médias (textes canoniques uniquement)."""
+    count = article.get("duplicate_count") or 0
+    return f"[Repris par {count + 1} sources] " if count else ""
+
+async def asummarize_text(text, cache=None):
+    """
+    Version asynchrone de `summarize_text`, via le pool LLM partagé.
+    :param cache: SummaryCache optionnel (clé = modèle, prompt et texte).
+    """
+    key = None
+    if cache is not None:
+        key = cache.key("chunk", SUMMARY_MODEL, SUMMARY_PROMPT_ID, text)
+        cached = cache.get("chunk", key)
+        if cached is not None:
+            return cached
+
+    response = await get_llm_pool().chat(
+        [{"role": "user", "content": build_summary_prompt(text)}],
+        temperature=0.2
+    )
+    summary = response.choices[0].message.content.strip()
+    if cache is not None:
+        cache.put("chunk", key, summary)
+    return summary
+
+async def asummarize_with_label(text):
+    """
+    Résumé et label en un seul appel (réponse JSON).
+    :return: (label ou None si la réponse n'est pas exploitable, résumé).
+    """
+    response = await get_llm_pool().chat(
+        [{"role": "user", "content": build_summary_label_prompt(text)}],
+        temperature=0.2,
+        response_format={"type": "json_object"}
+    )
+    content = response.choices[0].message.content.strip()
+    try:
+        result = json.loads(content)
+        return (result.get("label") or "").strip() or None, str(result["summary"]).strip()
+    except (ValueError, KeyError, AttributeError):
+        return None, content
+
+async def asummarize_cluster(cluster_articles, cache=None, with_label=False):
+    """
+    Résume un cluster en arbre : les chunks sont résumés en parallèle, puis les résumés sont réduits
+    par groupes bornés en tokens, niveau par niveau, jusqu'à un seul texte.
+    Un cluster qui tient dans un seul chunk ne coûte qu'un appel.
+    :param cache: SummaryCache optionnel : résumé final (et label) mémorisé par membres du cluster, résumés intermédiaires par texte.
+    :param with_label: Produit aussi le label du cluster dans l'appel final.
+    :return: Le résumé, ou (label, résumé) si `with_label` (label None si la réponse JSON est inexploitable).
+    """
+    # Empreinte de chaque membre sur les champs lus par le prompt (titre, contenu, mention des reprises)
+    members = [(a["_id"], a["title"], a.get("content"), a.get("duplicate_count") or 0) for a in cluster_articles]
+    summary_key = label_key = None
+    if cache is not None:
+        # Le résumé combiné vient d'un autre prompt : ses entrées ne doivent pas être servies à l'autre mode
+        prompt_id = SUMMARY_LABEL_PROMPT_ID if with_label else SUMMARY_PROMPT_ID
+        summary_key = cache.members_key("summary", SUMMARY_MODEL, prompt_id, members)
+        summary = cache.get("summary", summary_key)
+        if with_label:
+            label_key = cache.members_key("label", SUMMARY_MODEL, SUMMARY_LABEL_PROMPT_ID, members)
+            label = cache.get("label", label_key) if summary is not None else None
+            if label is not None:
+                return label, summary
+        elif summary is not None:
+            return summary
+
+    ordered = stable_order(cluster_articles)
+    prefixes = [source_prefix(a) for a in ordered]
+    articles_texts = [prefix + article_text(a['title'], a.get('content')) for prefix, a in zip(prefixes, ordered)]
+    # Comptes de tokens enregistrés à l'ingestion (même texte) : seule la mention des sources est tokenisée
+    token_counts = [
+        a["token_count"] + (num_tokens(prefix) if prefix else 0) if a.get("token_count") is not None else None
+        for prefix, a in zip(prefixes, ordered)
+    ]
+    texts = ["\n\n".join(chunk) for chunk in chunk_text(articles_texts, token_counts=token_counts)] or [""]
+
+    # 🌳 Map puis réductions successives : la profondeur croît en log du nombre de chunks
+    while len(texts) > 1:
+        summaries = await asyncio.gather(*(asummarize_text(text, cache) for text in texts))
+        texts = ["\n\n".join(group) for group in reduce_groups(list(summaries))]
+
+    if not with_label:
+        summary = await asummarize_text(texts[0], cache)
+        if cache is not None:
+            cache.put("summary", summary_key, summary)
+        return summary
+
+    label, summary = await asummarize_with_label(texts[0])
+    if cache is not None:
+        cache.put("summary", summary_key, summary)
+        if label is not None:
+            cache.put("label", label_key, label)
+    return label, summary
+
+async def agenerate_cluster_label(titles, cache=None, member_ids=None):
+    """
+    Version asynchrone de `generate_cluster_label`.
+    :param cache: SummaryCache optionnel, utilisé avec `member_ids` (label mémorisé par membres du cluster et titres).
+    :param member_ids: Identifiants des articles, alignés sur `titles`.
+    """
+    key = None
+    if cache is not None and member_ids is not None:
+        key = cache.members_key("label", SUMMARY_MODEL, LABEL_PROMPT_ID, zip(member_ids, titles))
+        cached = cache.get("label", key)
+        if cached is not None:
+            return cached
+
+    response = await get_llm_pool().chat(
+        [{"role": "user", "content": build_label_prompt(titles)}],
+        max_tokens=12,  # Légèrement augmenté pour éviter les raccourcis
+        temperature=0
+    )
+    label = response.choices[0].message.content.strip()
+    if key is not None:
+        cache.put("label", key, label)
+    return label
+
+def summarize_cluster(cluster_articles):
+    articles_texts = [article_text(a['title'], a.get('content')) for a in stable_order(cluster_articles)]
+
+    texts = ["\n\n".join(chunk) for chunk in chunk_text(articles_texts)] or [""]
+
+    # Un seul chunk : un seul appel ; sinon réductions successives par groupes bornés en tokens
+    while len(texts) > 1:
+        summaries = [summarize_text(text) for text in texts]
+        texts = ["\n\n".join(group) for group in reduce_groups(summaries)]
+
+    return summarize_text(texts[0])
+
+def generate_cluster_label(titles):
+    prompt = build_label_prompt(titles)
+
     response = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
@@ -92,7 +357,7 @@ def generate_cluster_label(titles):
 
 def send_telegram_message(text):
     """Envoie un message via Telegram."""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     params = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "Markdown"}
     response = requests.post(url, params=params)
     
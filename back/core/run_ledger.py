@@ -0,0 +1,115 @@
+import hashlib
+import uuid
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+def to_storable(value):
+    """
+    Convertit une sortie d'étape en document MongoDB : les dictionnaires deviennent des listes de paires
+    (clés tuples ou contenant des points) et les tuples sont marqués pour être restitués à l'identique.
+    """
+    if isinstance(value, dict):
+        return {"__pairs__": [[to_storable(k), to_storable(v)] for k, v in value.items()]}
+    if isinstance(value, tuple):
+        return {"__tuple__": [to_storable(v) for v in value]}
+    if isinstance(value, list):
+        return [to_storable(v) for v in value]
+    return value
+
+def from_storable(value):
+    """Inverse de `to_storable`."""
+    if isinstance(value, dict):
+        if "__pairs__" in value:
+            return {from_storable(k): from_storable(v) for k, v in value["__pairs__"]}
+        if "__tuple__" in value:
+            return tuple(from_storable(v) for v in value["__tuple__"])
+        return {k: from_storable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [from_storable(v) for v in value]
+    return value
+
+
+class RunLedger:
+    """
+    Journal des exécutions du workflow (collection `workflow_runs`) : sortie de chaque étape terminée
+    et avancement élément par élément des étapes longues, pour reprendre un passage interrompu.
+    """
+
+    def __init__(self, collection):
+        """
+        :param collection: Collection MongoDB du journal (ex. `db["workflow_runs"]`).
+        """
+        self.collection = collection
+        self.collection.create_index([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at")
+
+    def start(self, params):
+        """Ouvre un nouveau passage et renvoie son identifiant."""
+        run_id = uuid.uuid4().hex[:12]
+        now = datetime.now()
+        self.collection.insert_one({
+            "_id": run_id,
+            "status": "running",
+            "params": params,
+            "steps": {},
+            "progress": {},
+            "created_at": now,
+            "updated_at": now
+        })
+        return run_id
+
+    def get(self, run_id):
+        """Document complet d'un passage (None s'il n'existe pas)."""
+        return self.collection.find_one({"_id": run_id})
+
+    def resume(self, run_id):
+        """Remet un passage interrompu en cours et renvoie ses paramètres."""
+        run = self.get(run_id)
+        if run is None:
+            raise ValueError(f"Passage inconnu : {run_id}")
+        self.collection.update_one({"_id": run_id}, {
+            "$set": {"status": "running", "updated_at": datetime.now()}, "$inc": {"resumed": 1}
+        })
+        return run["params"]
+
+    def complete_step(self, run_id, step_name, output):
+        """Enregistre la sortie d'une étape terminée."""
+        now = datetime.now()
+        self.collection.update_one({"_id": run_id}, {"$set": {
+            f"steps.{step_name}": {"output": to_storable(output), "completed_at": now},
+            "updated_at": now
+        }})
+
+    def step_output(self, run_id, step_name):
+        """Sortie enregistrée d'une étape (None si elle n'est pas terminée)."""
+        run = self.collection.find_one({"_id": run_id}, {f"steps.{step_name}": 1})
+        step = (run or {}).get("steps", {}).get(step_name)
+        return from_storable(step["output"]) if step else None
+
+    @staticmethod
+    def _progress_key(key):
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def record_progress(self, run_id, step_name, key, value):
+        """Enregistre le résultat d'un élément (ex. un cluster) d'une étape en cours."""
+        self.collection.update_one({"_id": run_id}, {"$set": {
+            f"progress.{step_name}.{self._progress_key(key)}": {"key": to_storable(key), "value": to_storable(value)},
+            "updated_at": datetime.now()
+        }})
+
+    def get_progress(self, run_id, step_name):
+        """Résultats déjà obtenus pour les éléments d'une étape : {clé: valeur}."""
+        run = self.collection.find_one({"_id": run_id}, {f"progress.{step_name}": 1})
+        entries = (run or {}).get("progress", {}).get(step_name, {})
+        return {from_storable(entry["key"]): from_storable(entry["value"]) for entry in entries.values()}
+
+    def finish(self, run_id, status="completed", error=None):
+        """Clôt un passage (`completed` ou `failed`)."""
+        self.collection.update_one({"_id": run_id}, {"$set": {
+            "status": status, "error": error, "finished_at": datetime.now(), "updated_at": datetime.now()
+        }})
+
+    def latest(self, status=None):
+        """Passage le plus récent (éventuellement filtré par statut)."""
+        query = {"status": status} if status else {}
+        return self.collection.find_one(query, sort=[("created_at", DESCENDING)])
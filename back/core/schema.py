@@ -0,0 +1,100 @@
+import argparse
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+load_dotenv()
+
+SCHEMA_VERSION = 2
+
+def article_indexes():
+    """Index de la collection des articles, nommés pour pouvoir vérifier leur présence."""
+    return [
+        IndexModel([("link", ASCENDING)], name="link_unique", unique=True),
+        IndexModel([("pub_date", ASCENDING)], name="pub_date"),
+        IndexModel([("category", ASCENDING), ("pub_date", ASCENDING)], name="category_pub_date"),
+        # Index partiel : ne contient que les articles à encoder (un index partiel ne peut pas filtrer sur `$exists: false`)
+        IndexModel([("needs_embedding", ASCENDING)], name="needs_embedding",
+                   partialFilterExpression={"needs_embedding": True}),
+        IndexModel([("title", TEXT), ("content", TEXT)], name="content_text_title_text"),
+    ]
+
+def source_indexes():
+    return [IndexModel([("url", ASCENDING)], name="url")]
+
+def ensure_indexes(collection, indexes):
+    """
+    Crée uniquement les index absents (aucune reconstruction des index existants).
+    :return: Noms des index qui manquent encore après la création (ex. `link_unique` sur une collection à doublons).
+    """
+    existing = set(collection.index_information())
+    failed = []
+    for index in indexes:
+        name = index.document["name"]
+        if name in existing:
+            continue
+        try:
+            collection.create_indexes([index])
+            print(f"✅ Index {name} créé sur {collection.name}.")
+        except OperationFailure as e:
+            print(f"❌ Impossible de créer l'index {name} sur {collection.name} (doublons existants ?) : {e}")
+            failed.append(name)
+    return failed
+
+def migrate_needs_embedding(collection):
+    """Version 2 : marque les articles encore sans embedding (hors doublons) avec `needs_embedding`."""
+    result = collection.update_many(
+        {"content_vector": {"$exists": False}, "duplicate_of": {"$exists": False}, "needs_embedding": {"$exists": False}},
+        {"$set": {"needs_embedding": True}}
+    )
+    if result.modified_count:
+        print(f"🏷️ {result.modified_count} articles marqués `needs_embedding`.")
+
+MIGRATIONS = {
+    2: migrate_needs_embedding,
+}
+
+def ensure_schema(db, collection_name=None, force=False):
+    """
+    Met la base au niveau de SCHEMA_VERSION, de façon idempotente : index manquants puis migrations de données
+    non encore appliquées. Une base déjà à jour ne coûte qu'une lecture.
+    :param force: Vérifie les index même si la version enregistrée est à jour.
+    La version n'est enregistrée que si tous les index existent : sinon la vérification est refaite au prochain démarrage.
+    :return: True si quelque chose a été vérifié ou modifié.
+    """
+    collection_name = collection_name or os.getenv("MONGO_COLLECTION")
+    meta = db["schema_version"]
+    state = meta.find_one({"_id": collection_name}) or {}
+    version = state.get("version", 0)
+    if version >= SCHEMA_VERSION and not force:
+        return False
+
+    collection = db[collection_name]
+    failed = ensure_indexes(collection, article_indexes()) + ensure_indexes(db["sources"], source_indexes())
+    for target in sorted(MIGRATIONS):
+        if version < target:
+            MIGRATIONS[target](collection)
+
+    if failed:
+        print(f"❌ Schéma de {collection_name} incomplet, index manquants : {', '.join(failed)}. "
+              f"Version non enregistrée : corriger la base (ex. doublons de `link`), nouvelle tentative au prochain démarrage.")
+        return True
+
+    meta.update_one({"_id": collection_name}, {"$set": {"version": SCHEMA_VERSION, "updated_at": datetime.now()}},
+                    upsert=True)
+    print(f"✅ Schéma de {collection_name} à jour (version {SCHEMA_VERSION}).")
+    return True
+
+
+if __name__ == "__main__":
+    from mongo_registry import get_database, close_clients
+
+    parser = argparse.ArgumentParser(description="Création des index et migrations du schéma MongoDB")
+    parser.add_argument("--force", action="store_true", help="Vérifie les index même si le schéma est à jour")
+    args = parser.parse_args()
+
+    ensure_schema(get_database(), force=args.force)
+    close_clients()
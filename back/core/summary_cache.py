@@ -0,0 +1,75 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+
+class SummaryCache:
+    """
+    Cache persistant des appels LLM de synthèse, avec expiration (index TTL) :
+    - "chunk" : résumés intermédiaires, clé = hash(modèle, prompt, texte du chunk) ;
+    - "summary" et "label" : résultat final d'un cluster, clé = hash(modèle, prompt, empreintes des membres triées).
+    """
+
+    def __init__(self, collection, ttl_days=30):
+        """
+        :param collection: Collection MongoDB dédiée (ex. `db["summary_cache"]`).
+        :param ttl_days: Durée de vie d'une entrée, en jours.
+        """
+        self.collection = collection
+        self.ttl = timedelta(days=ttl_days)
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.collection.create_index([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+
+    @staticmethod
+    def key(kind, *parts):
+        """Clé de cache : hash SHA-256 du type d'entrée et de ses composantes."""
+        digest = hashlib.sha256(kind.encode("utf-8"))
+        for part in parts:
+            digest.update(b"\0" + str(part).encode("utf-8"))
+        return digest.hexdigest()
+
+    @classmethod
+    def members_key(cls, kind, model, prompt_id, members):
+        """
+        Clé d'un résultat de cluster, indépendante de l'ordre des membres.
+        :param members: Un tuple par membre : (id, champs lus par le prompt...), ex. (id, titre, contenu, reprises).
+                        Un article mis à jour ou davantage repris change ainsi la clé.
+        """
+        return cls.key(kind, model, prompt_id, *sorted(cls.key("member", *member) for member in members))
+
+    def get(self, kind, key):
+        """Renvoie la valeur en cache (None si absente ou expirée) et met à jour les compteurs."""
+        entry = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now()}}, {"value": 1})
+        if entry is None:
+            self.misses[kind] += 1
+            return None
+        self.hits[kind] += 1
+        return entry["value"]
+
+    def put(self, kind, key, value):
+        """Enregistre une valeur ; sa durée de vie repart de zéro."""
+        now = datetime.now()
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {"kind": kind, "value": value, "created_at": now, "expires_at": now + self.ttl}},
+            upsert=True
+        )
+
+    def report(self):
+        """Taux de succès par type d'entrée depuis le dernier `reset_stats`."""
+        report = {}
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            total = self.hits[kind] + self.misses[kind]
+            report[kind] = {
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "hit_rate": self.hits[kind] / total if total else 0.0
+            }
+        return report
+
+    def reset_stats(self):
+        """Remet les compteurs à zéro (en début de passage)."""
+        self.hits.clear()
+        self.misses.clear()
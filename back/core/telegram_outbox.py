@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import aiohttp
+from dotenv import load_dotenv
+from pymongo import ASCENDING, UpdateOne
+
+from metrics import get_metrics
+
+load_dotenv()
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+class TelegramOutbox:
+    """
+    File d'envoi Telegram persistée (collection `telegram_outbox`) et expéditeur asynchrone.
+    Chaque message a une clé d'idempotence (passage du workflow, conversation, rang du message) : le ré-enregistrer
+    ne crée pas de doublon, et une reprise après crash n'envoie que les messages encore en attente du passage,
+    dans leur ordre d'origine.
+    """
+
+    def __init__(self, collection, token=None, chat_id=None, api_url=None, chat_interval=1.0,
+                 max_attempts=5, timeout=15, parse_mode="Markdown"):
+        """
+        :param collection: Collection MongoDB de la file (ex. `db["telegram_outbox"]`).
+        :param token: Token du bot (par défaut `TELEGRAM_TOKEN`).
+        :param chat_id: Conversation par défaut (par défaut `TELEGRAM_ID`).
+        :param api_url: URL de la Bot API (par défaut `TELEGRAM_API_URL`, utile pour un faux serveur local).
+        :param chat_interval: Délai minimal (en secondes) entre deux messages d'une même conversation.
+        :param max_attempts: Nombre maximal de tentatives par message avant abandon.
+        :param timeout: Délai maximal (en secondes) d'une requête.
+        """
+        self.collection = collection
+        self.token = token or os.getenv("TELEGRAM_TOKEN")
+        self.chat_id = chat_id or os.getenv("TELEGRAM_ID")
+        self.api_url = (api_url or TELEGRAM_API_URL).rstrip("/")
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.parse_mode = parse_mode
+        self.collection.create_index([("status", ASCENDING), ("created_at", ASCENDING), ("seq", ASCENDING)],
+                                     name="status_created_at")
+        self.collection.create_index([("run_id", ASCENDING), ("status", ASCENDING), ("seq", ASCENDING)],
+                                     name="run_id_status_seq")
+
+    @staticmethod
+    def key(run_id, chat_id, seq):
+        """
+        Clé d'idempotence d'un message : passage du workflow, conversation et rang du message.
+        Elle ne dépend ni de la date ni du texte : une reprise après minuit, ou dont les résumés diffèrent,
+        ne renvoie pas le digest.
+        """
+        return hashlib.sha256(f"{run_id}\0{chat_id}\0{seq}".encode("utf-8")).hexdigest()
+
+    def enqueue(self, messages, run_id, chat_id=None):
+        """
+        Ajoute des messages à la file (sans effet pour ceux qui y sont déjà).
+        :param messages: Textes à envoyer, dans l'ordre.
+        :param run_id: Identifiant du passage du workflow (journal des passages).
+        :return: Nombre de messages réellement ajoutés.
+        """
+        chat_id = str(chat_id or self.chat_id)
+        now = datetime.now()
+        operations = [
+            UpdateOne({"_id": self.key(run_id, chat_id, seq)}, {"$setOnInsert": {
+                "run_id": run_id,
+                "chat_id": chat_id,
+                "seq": seq,
+                "text": text,
+                "status": "pending",
+                "attempts": 0,
+                "created_at": now
+            }}, upsert=True)
+            for seq, text in enumerate(messages)
+        ]
+        if not operations:
+            return 0
+        return self.collection.bulk_write(operations, ordered=False).upserted_count
+
+    async def _send(self, session, message):
+        """
+        Envoie un message, en respectant `retry_after` sur les 429 et avec backoff sur les erreurs réseau / 5xx.
+        :return: (succès, latence de la requête réussie en secondes, erreur éventuelle).
+        """
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        payload = {"chat_id": message["chat_id"], "text": message["text"]}
+        if self.parse_mode:
+            payload["parse_mode"] = self.parse_mode
+
+        error = None
+        for attempt in range(message.get("attempts", 0), self.max_attempts):
+            started = time.monotonic()
+            try:
+                async with session.post(url, json=payload) as response:
+                    body = await response.json(content_type=None)
+                    latency = time.monotonic() - started
+                    if response.status == 200 and body.get("ok"):
+                        return True, latency, body.get("result", {}).get("message_id")
+                    error = body.get("description", f"HTTP {response.status}")
+                    if response.status == 429:
+                        delay = body.get("parameters", {}).get("retry_after", 1)
+                        print(f"⏳ Limite Telegram atteinte, nouvel essai dans {delay}s...")
+                    elif response.status >= 500:
+                        delay = min(60, 2 ** attempt) * (0.5 + random.random())
+                    else:
+                        return False, latency, error  # Erreur définitive (message invalide, chat inconnu...)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = str(e)
+                delay = min(60, 2 ** attempt) * (0.5 + random.random())
+            self.collection.update_one({"_id": message["_id"]}, {"$inc": {"attempts": 1}, "$set": {"error": error}})
+            await asyncio.sleep(delay)
+        return False, None, error
+
+    async def _deliver_chat(self, session, messages, stats):
+        """Envoie les messages d'une conversation dans l'ordre, espacés de `chat_interval`."""
+        for i, message in enumerate(messages):
+            if i:
+                await asyncio.sleep(self.chat_interval)
+            with get_metrics().span("telegram.send", chat_id=str(message["chat_id"])):
+                ok, latency, result = await self._send(session, message)
+            get_metrics().observe_telegram(latency, ok)
+            if ok:
+                self.collection.update_one({"_id": message["_id"]}, {"$set": {
+                    "status": "sent", "sent_at": datetime.now(), "latency": latency, "message_id": result
+                }})
+                stats["sent"] += 1
+                stats["latencies"].append(latency)
+            else:
+                self.collection.update_one({"_id": message["_id"]}, {"$set": {"status": "failed", "error": result}})
+                stats["failed"] += 1
+                print(f"❌ Erreur lors de l'envoi du message {message['_id'][:12]} : {result}")
+
+    async def deliver(self, run_id=None):
+        """
+        Envoie les messages en attente (conversations en parallèle, ordre conservé dans chacune).
+        :param run_id: Passage dont les messages sont envoyés ; None pour tous les passages (messages restés
+                       en attente d'un passage précédent compris, à réserver à une relance explicite).
+        :return: Statistiques {"sent", "failed", "latencies"}.
+        """
+        query = {"status": "pending"}
+        if run_id is not None:
+            query["run_id"] = run_id
+        by_chat = defaultdict(list)
+        for message in self.collection.find(query).sort([("created_at", ASCENDING), ("seq", ASCENDING)]):
+            by_chat[message["chat_id"]].append(message)
+
+        stats = {"sent": 0, "failed": 0, "latencies": []}
+        if not by_chat:
+            return stats
+
+        async with aiohttp.ClientSession(timeout=self.timeout, connector=aiohttp.TCPConnector(limit=10)) as session:
+            await asyncio.gather(*(self._deliver_chat(session, messages, stats) for messages in by_chat.values()))
+
+        latencies = sorted(stats["latencies"])
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"📨 {stats['sent']} messages envoyés sur Telegram ({stats['failed']} en échec) - "
+                  f"latence p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+        else:
+            print(f"❌ Aucun message envoyé sur Telegram ({stats['failed']} en échec)")
+        return stats
+
+    def retry_failed(self, run_id=None):
+        """Remet les messages en échec dans la file (ex. après correction du token ou du chat), d'un passage ou de tous."""
+        query = {"status": "failed"}
+        if run_id is not None:
+            query["run_id"] = run_id
+        return self.collection.update_many(query, {"$set": {"status": "pending", "attempts": 0}}).modified_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envoie les messages Telegram en attente dans la file.")
+    parser.add_argument("--run-id", help="Passage dont les messages en attente sont envoyés")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Remet d'abord les messages en échec dans la file ; sans --run-id, envoie ceux de tous les passages")
+    args = parser.parse_args()
+    if not args.run_id and not args.retry_failed:
+        parser.error("préciser --run-id, ou --retry-failed pour relancer les messages de tous les passages")
+
+    from mongo_registry import get_database, close_clients
+
+    outbox = TelegramOutbox(get_database()["telegram_outbox"])
+    if args.retry_failed:
+        print(f"🔁 {outbox.retry_failed(args.run_id)} messages remis dans la file")
+    asyncio.run(outbox.deliver(args.run_id))
+    close_clients()
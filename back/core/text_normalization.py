@@ -0,0 +1,77 @@
+import re
+import unicodedata
+
+import tiktoken
+
+TOKEN_ENCODING = "cl100k_base"  # Encodage commun au modèle d'embedding et au tokenizer de découpage des résumés
+MAX_EMBEDDING_TOKENS = 8191     # Limite par texte du modèle d'embedding
+
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad"), None)  # Espaces de largeur nulle, BOM, césures conditionnelles
+_SPACES = re.compile(r"[ \t\f\v\u00a0\u202f]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+_tokenizer = None
+
+def get_tokenizer():
+    """Tokenizer tiktoken partagé (chargé à la première utilisation)."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = tiktoken.get_encoding(TOKEN_ENCODING)
+    return _tokenizer
+
+def normalize_text(text):
+    """Nettoie un texte extrait : Unicode NFC, caractères invisibles retirés, espaces et lignes vides compactés."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text).translate(_INVISIBLE)
+    lines = [_SPACES.sub(" ", line).strip() for line in text.splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def article_text(title, content):
+    """Texte d'un article tel qu'il est encodé et résumé (les comptes de tokens enregistrés portent sur ce texte)."""
+    return f"{title or ''}. {content or ''}"
+
+def embedding_text(article):
+    """Texte envoyé au modèle d'embedding, tronqué à l'offset pré-calculé s'il y en a un."""
+    text = article_text(article.get("title"), article.get("content"))
+    limit = article.get("embedding_char_limit")
+    return text[:limit] if limit else text
+
+def truncate_to_tokens(text, max_tokens, tokenizer=None):
+    """
+    Tronque un texte à `max_tokens` tokens. Un préfixe décodé peut se re-tokeniser autrement (caractère multi-octets
+    coupé, fusions différentes) : le compte est vérifié après la coupe et la coupe resserrée si besoin.
+    :return: (texte tronqué, nombre de tokens, nombre de tokens du texte complet).
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    tokens = tokenizer.encode(text, disallowed_special=())
+    total = len(tokens)
+    if total <= max_tokens:
+        return text, total, total
+
+    keep = max_tokens
+    while True:
+        truncated = tokenizer.decode(tokens[:keep])
+        count = len(tokenizer.encode(truncated, disallowed_special=()))
+        if count <= max_tokens:
+            return truncated, count, total
+        keep -= count - max_tokens
+
+def prepare_article(title, content, max_embedding_tokens=MAX_EMBEDDING_TOKENS):
+    """
+    Normalise un article au moment de son enregistrement et pré-calcule ses comptes de tokens,
+    pour que l'embedding et le découpage des résumés n'aient plus à re-tokeniser le corpus.
+    :return: Champs à enregistrer : `title`, `content`, `token_count` (tokens du texte complet)
+             et `embedding_char_limit` (offset de troncature à la limite du modèle, None si le texte tient).
+    """
+    title = normalize_text(title)
+    content = normalize_text(content)
+    text = article_text(title, content)
+    truncated, _, token_count = truncate_to_tokens(text, max_embedding_tokens)
+
+    return {
+        "title": title,
+        "content": content,
+        "token_count": token_count,
+        "embedding_char_limit": len(truncated) if len(truncated) < len(text) else None
+    }
@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from mongo_registry import get_client, close_clients
 import os
 from dotenv import load_dotenv
 
@@ -31,7 +31,7 @@ OPTIMIZED_SOURCES = [
 class SourceUpdater:
     def __init__(self):
         """Initialisation de la connexion MongoDB."""
-        self.client = MongoClient(os.getenv("MONGO_URI"))
+        self.client = get_client()
         self.db = self.client[os.getenv("MONGO_DB_NAME")]
 
     def insert_new_sources(self, sources):
@@ -42,7 +42,7 @@ class SourceUpdater:
 
     def close(self):
         """Ferme la connexion MongoDB."""
-        self.client.close()
+        close_clients()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+from bson.binary import Binary
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Format de stockage de `content_vector` : "array" (tableau BSON de doubles) ou "float32" (BSON Binary compact)
+VECTOR_STORAGE_FORMAT = os.getenv("VECTOR_STORAGE_FORMAT", "array")
+
+VECTOR_SUBTYPE = 9          # Sous-type BSON "Binary Vector"
+FLOAT32_HEADER = b"\x27\x00"  # dtype FLOAT32 + padding, compatible avec `Binary.from_vector`
+
+
+def encode_vector(vector, storage_format=None):
+    """Convertit un embedding au format de stockage configuré."""
+    if vector is None:
+        return None
+    storage_format = storage_format or VECTOR_STORAGE_FORMAT
+    if storage_format == "float32":
+        return Binary(FLOAT32_HEADER + np.asarray(vector, dtype="<f4").tobytes(), VECTOR_SUBTYPE)
+    if isinstance(vector, np.ndarray):
+        return vector.astype(float).tolist()
+    return list(vector)
+
+
+def decode_vector(value):
+    """Renvoie un embedding stocké (tableau ou Binary float32) sous forme de np.ndarray float32."""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        # 🔥 Lecture directe du buffer, sans objet Python par composante
+        return np.frombuffer(value, dtype="<f4", offset=len(FLOAT32_HEADER))
+    return np.asarray(value, dtype=np.float32)
+
+
+def decode_document(document, field="content_vector"):
+    """Décode sur place le vecteur d'un document MongoDB (s'il en a un)."""
+    if document is not None and field in document:
+        document[field] = decode_vector(document[field])
+    return document
+
+
+def has_vector(document, field="content_vector"):
+    """Indique si un document possède un embedding non vide, quel que soit son format."""
+    value = document.get(field)
+    return value is not None and len(value) > 0
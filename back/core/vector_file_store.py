@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import numpy as np
+from dotenv import load_dotenv
+from vector_index import VectorIndex, EMBEDDING_DIM
+from vector_codec import decode_vector
+
+load_dotenv()
+
+class VectorFileStore:
+    """
+    Stockage de vecteurs sur disque, en ajout seul, ouvert par `np.memmap` :
+    - `vectors.f32` : vecteurs normalisés float32 little-endian, une ligne par entrée ;
+    - `ids.jsonl` : une ligne par entrée (id, catégorie, date) ; l'offset est le numéro de ligne ;
+    - `tombstones.bin` : bitmap des lignes supprimées ou remplacées.
+    """
+
+    def __init__(self, directory, dim=EMBEDDING_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.ids_path = os.path.join(directory, "ids.jsonl")
+        self.tombstones_path = os.path.join(directory, "tombstones.bin")
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Relit le sidecar et le bitmap, et répare une écriture interrompue."""
+        rows = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # Dernière ligne tronquée
+
+        row_bytes = self.dim * 4
+        n_vectors = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        count = min(len(rows), n_vectors)
+
+        # 🩹 Les deux fichiers sont ramenés à la même longueur après un arrêt brutal
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != count * row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(count * row_bytes)
+        if len(rows) != count:
+            rows = rows[:count]
+            self._write_rows(self.ids_path, rows)
+
+        self.rows = rows
+        self.tombstones = np.zeros(count, dtype=bool)
+        if os.path.exists(self.tombstones_path):
+            bits = np.unpackbits(np.fromfile(self.tombstones_path, dtype=np.uint8)).astype(bool)
+            known = min(len(bits), count)
+            self.tombstones[:known] = bits[:known]
+
+        self.positions = {}
+        for position, row in enumerate(rows):
+            if not self.tombstones[position]:
+                self.positions[row["id"]] = position
+
+    @staticmethod
+    def _write_rows(path, rows):
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    def _save_tombstones(self):
+        np.packbits(self.tombstones).tofile(self.tombstones_path)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, doc_id):
+        return str(doc_id) in self.positions
+
+    def append(self, ids, vectors, categories=None, dates=None):
+        """Ajoute des vecteurs en fin de fichier ; une entrée existante avec le même id est marquée supprimée."""
+        ids = [str(doc_id) for doc_id in ids]
+        if not ids:
+            return
+        vectors = VectorIndex.normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        categories = categories or [None] * len(ids)
+        dates = dates or [None] * len(ids)
+
+        start = len(self.rows)
+        new_rows = [
+            {"id": doc_id, "category": category, "pub_date": date.isoformat() if date is not None else None}
+            for doc_id, category, date in zip(ids, categories, dates)
+        ]
+
+        # Les vecteurs sont écrits avant le sidecar : une ligne d'id n'existe jamais sans son vecteur
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.astype("<f4").tobytes())
+        with open(self.ids_path, "a", encoding="utf-8") as f:
+            for row in new_rows:
+                f.write(json.dumps(row) + "\n")
+
+        self.rows.extend(new_rows)
+        self.tombstones = np.concatenate([self.tombstones, np.zeros(len(ids), dtype=bool)])
+        for offset, doc_id in enumerate(ids):
+            previous = self.positions.get(doc_id)
+            if previous is not None:
+                self.tombstones[previous] = True
+            self.positions[doc_id] = start + offset
+        self._save_tombstones()
+
+    def add_articles(self, articles, embeddings):
+        """Interface commune aux index alimentés par l'EmbeddingGenerator."""
+        self.append(
+            [article["_id"] for article in articles],
+            embeddings,
+            categories=[article.get("category") for article in articles],
+            dates=[article.get("pub_date") for article in articles]
+        )
+
+    def delete(self, ids):
+        """Marque des entrées comme supprimées (l'espace est récupéré par `compact`)."""
+        for doc_id in ids:
+            position = self.positions.pop(str(doc_id), None)
+            if position is not None:
+                self.tombstones[position] = True
+        self._save_tombstones()
+
+    def matrix(self):
+        """Ouvre le fichier de vecteurs en lecture seule, sans le charger en RAM."""
+        if not self.rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype="<f4", mode="r", shape=(len(self.rows), self.dim))
+
+    def get_vectors(self, ids):
+        """Renvoie les vecteurs des ids demandés (None pour les ids absents)."""
+        matrix = self.matrix()
+        return [
+            np.asarray(matrix[self.positions[str(doc_id)]]) if str(doc_id) in self.positions else None
+            for doc_id in ids
+        ]
+
+    def to_index(self):
+        """Construit un VectorIndex adossé au memmap : seules les pages consultées sont lues."""
+        alive = ~self.tombstones
+        dates = [
+            np.datetime64(row["pub_date"], "s") if row.get("pub_date") else np.datetime64("NaT")
+            for row in self.rows
+        ]
+        return VectorIndex.from_arrays(
+            self.matrix(),
+            [row["id"] for row in self.rows],
+            categories=[row.get("category") for row in self.rows],
+            dates=dates,
+            alive=alive
+        )
+
+    def compact(self, chunk_size=10000):
+        """Réécrit les fichiers sans les entrées supprimées (remplacement atomique)."""
+        live = np.flatnonzero(~self.tombstones)
+        matrix = self.matrix()
+        tmp_vectors, tmp_ids = self.vectors_path + ".tmp", self.ids_path + ".tmp"
+
+        with open(tmp_vectors, "wb") as f:
+            for i in range(0, len(live), chunk_size):
+                f.write(np.asarray(matrix[live[i:i + chunk_size]], dtype="<f4").tobytes())
+        self._write_rows(tmp_ids, [self.rows[position] for position in live])
+        del matrix
+
+        removed = len(self.rows) - len(live)
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_ids, self.ids_path)
+        if os.path.exists(self.tombstones_path):
+            os.remove(self.tombstones_path)
+        self._load()
+        print(f"🧹 Compaction terminée : {removed} entrées supprimées, {len(self)} conservées.")
+        return removed
+
+    def backfill(self, collection, ids=None, batch_size=1000):
+        """
+        Copie dans le fichier, en flux, les `content_vector` de MongoDB absents du stockage
+        (articles encodés avant l'activation du stockage, ou écriture interrompue entre MongoDB et le fichier).
+        :param ids: Identifiants à compléter (par défaut, tous les articles vectorisés de la collection).
+        :return: Nombre de vecteurs ajoutés.
+        """
+        query = {"content_vector": {"$exists": True}}
+        if ids is not None:
+            query["_id"] = {"$in": list(ids)}
+        cursor = collection.find(
+            query, {"_id": 1, "category": 1, "pub_date": 1, "content_vector": 1}, batch_size=batch_size
+        )
+
+        added, batch = 0, []
+        for article in cursor:
+            if str(article["_id"]) in self.positions:
+                continue
+            batch.append(article)
+            if len(batch) >= batch_size:
+                self.add_articles(batch, [decode_vector(article["content_vector"]) for article in batch])
+                added, batch = added + len(batch), []
+        if batch:
+            self.add_articles(batch, [decode_vector(article["content_vector"]) for article in batch])
+            added += len(batch)
+        return added
+
+    def reset(self):
+        """Vide le stockage (avant une reconstruction complète depuis MongoDB)."""
+        for path in (self.vectors_path, self.ids_path, self.tombstones_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._load()
+
+    def check_consistency(self, collection):
+        """Compare le contenu du fichier aux articles vectorisés de la collection MongoDB."""
+        mongo_ids = {
+            str(doc["_id"])
+            for doc in collection.find({"content_vector": {"$exists": True}}, {"_id": 1}, batch_size=10000)
+        }
+        store_ids = set(self.positions)
+        report = {
+            "store_count": len(store_ids),
+            "mongo_count": len(mongo_ids),
+            "missing_in_store": sorted(mongo_ids - store_ids),
+            "orphans_in_store": sorted(store_ids - mongo_ids),
+            "tombstoned": int(self.tombstones.sum())
+        }
+        print(f"🔎 Vecteurs sur disque : {report['store_count']}, en base : {report['mongo_count']}, "
+              f"manquants : {len(report['missing_in_store'])}, orphelins : {len(report['orphans_in_store'])}")
+        return report
+
+
+if __name__ == "__main__":
+    from bson import ObjectId
+    from mongo_registry import get_collection, close_clients
+
+    parser = argparse.ArgumentParser(description="Maintenance du stockage de vecteurs sur disque")
+    parser.add_argument("command", choices=["compact", "check", "rebuild"], help="Action à effectuer")
+    parser.add_argument("--path", default=os.getenv("VECTOR_STORE_PATH"), help="Répertoire du stockage")
+    parser.add_argument("--delete-orphans", action="store_true", help="Supprime les vecteurs absents de MongoDB (avec `check`)")
+    parser.add_argument("--repair", action="store_true", help="Ajoute les vecteurs manquants depuis MongoDB (avec `check`)")
+    args = parser.parse_args()
+
+    store = VectorFileStore(args.path)
+    if args.command == "compact":
+        store.compact()
+    elif args.command == "rebuild":
+        # 🏗️ Reconstruction complète depuis les `content_vector` de MongoDB
+        store.reset()
+        added = store.backfill(get_collection())
+        print(f"🏗️ Stockage reconstruit : {added} vecteurs copiés depuis MongoDB.")
+        close_clients()
+    else:
+        collection = get_collection()
+        report = store.check_consistency(collection)
+        if args.repair and report["missing_in_store"]:
+            added = store.backfill(collection, ids=[ObjectId(doc_id) for doc_id in report["missing_in_store"]])
+            print(f"🩹 {added} vecteurs manquants ajoutés depuis MongoDB.")
+        if args.delete_orphans and report["orphans_in_store"]:
+            store.delete(report["orphans_in_store"])
+            print(f"🗑️ {len(report['orphans_in_store'])} vecteurs orphelins supprimés.")
+        close_clients()
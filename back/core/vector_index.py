@@ -0,0 +1,207 @@
+import numpy as np
+
+EMBEDDING_DIM = 1536
+
+class VectorIndex:
+    """Index de similarité en mémoire : matrice float32 contiguë de vecteurs pré-normalisés."""
+
+    def __init__(self, dim=EMBEDDING_DIM, initial_capacity=1024, compact_ratio=0.5):
+        """
+        :param dim: Dimension des embeddings.
+        :param initial_capacity: Nombre de lignes pré-allouées (la capacité double si besoin).
+        :param compact_ratio: Proportion de lignes supprimées au-delà de laquelle la matrice est compactée.
+        """
+        self.dim = dim
+        self.compact_ratio = compact_ratio
+        self._size = 0
+        self._removed = 0
+        self._allocate(initial_capacity)
+        self._positions = {}
+        self._category_masks = {}
+
+    @classmethod
+    def from_arrays(cls, matrix, ids, categories=None, dates=None, alive=None):
+        """Construit un index autour d'une matrice déjà normalisée (ex. un np.memmap), sans la copier."""
+        size = len(ids)
+        index = cls(dim=matrix.shape[1], initial_capacity=1)
+        index._matrix = matrix
+        index._ids = np.array(ids, dtype=object)
+        index._categories = np.array(categories if categories is not None else [None] * size, dtype=object)
+        if dates is not None:
+            index._dates = np.array(dates, dtype="datetime64[s]")
+        else:
+            index._dates = np.full(size, np.datetime64("NaT"), dtype="datetime64[s]")
+        index._alive = np.ones(size, dtype=bool) if alive is None else np.array(alive, dtype=bool)
+        index._size = size
+        index._removed = int(size - index._alive.sum())
+        index._positions = {doc_id: position for position, doc_id in enumerate(ids) if index._alive[position]}
+        index._category_masks = {
+            category: index._categories == category
+            for category in set(index._categories) - {None}
+        }
+        return index
+
+    def _allocate(self, capacity):
+        """Alloue des tableaux vides d'une capacité donnée."""
+        self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=object)
+        self._categories = np.empty(capacity, dtype=object)
+        self._dates = np.full(capacity, np.datetime64("NaT"), dtype="datetime64[s]")
+        self._alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self._size - self._removed
+
+    def __contains__(self, doc_id):
+        return doc_id in self._positions
+
+    @staticmethod
+    def normalize(vectors):
+        """Normalise (L2) les lignes d'une matrice, en laissant les vecteurs nuls à zéro."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _grow(self, needed):
+        """Double la capacité jusqu'à pouvoir accueillir `needed` lignes."""
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        capacity = max(capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        old = (self._matrix, self._ids, self._categories, self._dates, self._alive)
+        self._allocate(capacity)
+        for new_array, old_array in zip(
+            (self._matrix, self._ids, self._categories, self._dates, self._alive), old
+        ):
+            new_array[:self._size] = old_array[:self._size]
+        for category, mask in self._category_masks.items():
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:self._size] = mask[:self._size]
+            self._category_masks[category] = grown
+
+    def add(self, ids, vectors, categories=None, dates=None):
+        """Ajoute (ou remplace) des vecteurs, avec leur catégorie et date de publication optionnelles."""
+        ids = [str(doc_id) for doc_id in ids]
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+
+        # Un id présent plusieurs fois dans le même appel : seule sa dernière occurrence est gardée
+        last = {doc_id: offset for offset, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[offset] for offset in keep]
+            vectors = vectors[keep]
+            categories = [categories[offset] for offset in keep] if categories is not None else None
+            dates = [dates[offset] for offset in keep] if dates is not None else None
+
+        self.remove([doc_id for doc_id in ids if doc_id in self._positions])
+
+        vectors = self.normalize(vectors)
+        start, end = self._size, self._size + len(ids)
+        self._grow(end)
+
+        self._matrix[start:end] = vectors
+        self._ids[start:end] = ids
+        self._alive[start:end] = True
+        if dates is not None:
+            self._dates[start:end] = np.array(
+                [np.datetime64(d, "s") if d is not None else np.datetime64("NaT") for d in dates],
+                dtype="datetime64[s]"
+            )
+        if categories is not None:
+            self._categories[start:end] = categories
+            for offset, category in enumerate(categories):
+                mask = self._category_masks.get(category)
+                if mask is None:
+                    mask = self._category_masks[category] = np.zeros(len(self._alive), dtype=bool)
+                mask[start + offset] = True
+
+        for offset, doc_id in enumerate(ids):
+            self._positions[doc_id] = start + offset
+        self._size = end
+
+    def remove(self, ids):
+        """Retire des vecteurs de l'index (la matrice est compactée quand trop de lignes sont mortes)."""
+        for doc_id in ids:
+            position = self._positions.pop(str(doc_id), None)
+            if position is None:
+                continue
+            self._alive[position] = False
+            category = self._categories[position]
+            if category in self._category_masks:
+                self._category_masks[category][position] = False
+            self._removed += 1
+
+        if self._size and self._removed / self._size > self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """Réécrit les tableaux sans les lignes supprimées."""
+        keep = np.flatnonzero(self._alive[:self._size])
+        matrix, ids = self._matrix[keep], self._ids[keep]
+        categories, dates = self._categories[keep], self._dates[keep]
+
+        self._allocate(max(len(keep), 1024))
+        self._size, self._removed = len(keep), 0
+        self._matrix[:self._size] = matrix
+        self._ids[:self._size] = ids
+        self._categories[:self._size] = categories
+        self._dates[:self._size] = dates
+        self._alive[:self._size] = True
+
+        self._positions = {doc_id: position for position, doc_id in enumerate(ids)}
+        self._category_masks = {}
+        for category in set(categories) - {None}:
+            mask = np.zeros(len(self._alive), dtype=bool)
+            mask[:self._size] = categories == category
+            self._category_masks[category] = mask
+
+    def _mask(self, category=None, start=None, end=None):
+        """Masque des lignes candidates selon la catégorie et la plage de dates."""
+        mask = self._alive[:self._size].copy()
+        if category is not None:
+            category_mask = self._category_masks.get(category)
+            if category_mask is None:
+                return np.zeros(self._size, dtype=bool)
+            mask &= category_mask[:self._size]
+        if start is not None:
+            mask &= self._dates[:self._size] >= np.datetime64(start, "s")
+        if end is not None:
+            mask &= self._dates[:self._size] < np.datetime64(end, "s")
+        return mask
+
+    def search_batch(self, queries, top_k=5, category=None, start=None, end=None):
+        """
+        Recherche les `top_k` voisins de plusieurs requêtes en un seul produit matriciel.
+        :return: Pour chaque requête, une liste de (id, similarité cosinus) triée par similarité décroissante.
+        """
+        queries = self.normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        mask = self._mask(category, start, end)
+        n_candidates = int(mask.sum())
+        if n_candidates == 0:
+            return [[] for _ in range(len(queries))]
+
+        # Produit sur la vue contiguë de la matrice (sans copie des lignes candidates), puis masquage des scores
+        scores = queries @ self._matrix[:self._size].T
+        if n_candidates < self._size:
+            scores[:, ~mask] = -np.inf
+
+        k = min(top_k, n_candidates)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(self._ids[row], float(score)) for row, score in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(top, top_scores)
+        ]
+
+    def search(self, query, top_k=5, category=None, start=None, end=None):
+        """Recherche les `top_k` voisins d'un embedding."""
+        return self.search_batch([query], top_k, category, start, end)[0]
@@ -0,0 +1,119 @@
+import logging
+import time
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from newspaper import Article
+from requests.adapters import HTTPAdapter
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+    "Accept-Encoding": "gzip, deflate"
+}
+MIN_TEXT_LENGTH = 100  # En dessous, le texte extrait est considéré comme inutilisable
+
+
+def extract_with_newspaper(url, html):
+    """Extraction du corps de l'article avec Newspaper3k, à partir d'un HTML déjà téléchargé."""
+    article = Article(url)
+    article.download(input_html=html.decode("utf-8", errors="replace") if isinstance(html, bytes) else html)
+    article.parse()
+    return article.text.strip() if article.text else None
+
+
+def extract_with_soup(url, html):
+    """Extraction des paragraphes `<p>` avec BeautifulSoup (parser lxml)."""
+    soup = BeautifulSoup(html, "lxml")
+    text = "\n".join(p.get_text() for p in soup.find_all("p") if p.get_text())
+    return text.strip()
+
+
+EXTRACTORS = {
+    "newspaper": extract_with_newspaper,
+    "soup": extract_with_soup,
+}
+
+
+def extract_article(url, html, preferred=None):
+    """
+    Extrait le texte d'une page, en commençant par l'extracteur qui fonctionne pour son domaine.
+    Fonction de module (sérialisable), utilisable depuis un pool de processus.
+    :param preferred: Nom de l'extracteur à essayer en premier ("newspaper" ou "soup").
+    :return: (texte ou None, nom de l'extracteur qui a réussi ou None).
+    """
+    order = [preferred] if preferred in EXTRACTORS else []
+    order += [name for name in EXTRACTORS if name not in order]
+    for name in order:
+        try:
+            text = EXTRACTORS[name](url, html)
+        except Exception as e:
+            logger.debug(f"❌ Extraction {name} en échec pour {url} : {e}")
+            continue
+        if text and len(text) > MIN_TEXT_LENGTH:
+            return text, name
+    return None, None
+
+
+class ArticleExtractor:
+    """
+    Téléchargement unique de chaque page sur une session HTTP partagée (keep-alive, compression),
+    puis extraction sur les mêmes octets ; retient par domaine l'extracteur qui fonctionne.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=15, pool_size=20):
+        """
+        :param connect_timeout: Délai maximal (en secondes) d'établissement de la connexion.
+        :param read_timeout: Délai maximal (en secondes) de lecture de la réponse.
+        :param pool_size: Nombre de connexions conservées par domaine.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.host_extractors = {}  # {domaine: extracteur qui a fonctionné en dernier}
+
+    def preferred(self, url):
+        """Extracteur à essayer en premier pour le domaine de l'URL (None si inconnu)."""
+        return self.host_extractors.get(urlparse(url).netloc)
+
+    def remember(self, url, extractor):
+        """Mémorise l'extracteur qui a fonctionné pour le domaine de l'URL."""
+        if extractor:
+            self.host_extractors[urlparse(url).netloc] = extractor
+
+    def fetch(self, url):
+        """Télécharge une page une seule fois ; renvoie son contenu (None en cas d'échec)."""
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            get_metrics().observe_fetch(url, time.perf_counter() - started, "error")
+            logger.info(f"❌ Impossible de récupérer {url} : {e}")
+            return None
+        get_metrics().observe_fetch(url, time.perf_counter() - started, response.status_code)
+        if response.status_code != 200:
+            logger.info(f"❌ HTTP {response.status_code} - Impossible de récupérer {url}")
+            return None
+        return response.content
+
+    def extract(self, url, html):
+        """Extrait le texte d'une page déjà téléchargée (None si aucun extracteur ne donne de texte utile)."""
+        text, extractor = extract_article(url, html, self.preferred(url))
+        self.remember(url, extractor)
+        return text
+
+    def scrape(self, url):
+        """Télécharge (une fois) puis extrait une page."""
+        html = self.fetch(url)
+        return self.extract(url, html) if html is not None else None
+
+    def close(self):
+        """Ferme la session HTTP partagée (et ses connexions keep-alive)."""
+        self.session.close()
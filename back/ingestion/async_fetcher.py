@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict, namedtuple
+from urllib.parse import urlparse
+
+import aiohttp
+from metrics import get_metrics
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
+}
+
+logger = logging.getLogger(__name__)
+
+FetchResponse = namedtuple("FetchResponse", ["url", "status", "headers", "body"])
+
+
+class AsyncFetcher:
+    """Client HTTP asynchrone partagé, limité globalement et par domaine."""
+
+    def __init__(self, max_connections=20, max_per_host=2, politeness_delay=1.0, timeout=15):
+        """
+        :param max_connections: Nombre maximal de requêtes simultanées (tous domaines confondus).
+        :param max_per_host: Nombre maximal de requêtes simultanées vers un même domaine.
+        :param politeness_delay: Délai minimal (en secondes) entre deux requêtes vers un même domaine.
+        :param timeout: Délai maximal (en secondes) d'une requête.
+        """
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.politeness_delay = politeness_delay
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+
+        self._global_semaphore = asyncio.Semaphore(max_connections)
+        self._host_semaphores = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+        self._host_locks = defaultdict(asyncio.Lock)
+        self._host_next_slot = defaultdict(float)
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=DEFAULT_HEADERS)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    async def _wait_for_host_slot(self, host):
+        """Respecte le délai de politesse propre à chaque domaine."""
+        async with self._host_locks[host]:
+            now = time.monotonic()
+            wait = self._host_next_slot[host] - now
+            self._host_next_slot[host] = max(now, self._host_next_slot[host]) + self.politeness_delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def fetch(self, url, headers=None):
+        """Télécharge une URL et renvoie un FetchResponse (body = None en cas d'échec réseau)."""
+        host = urlparse(url).netloc
+        async with self._host_semaphores[host]:
+            await self._wait_for_host_slot(host)
+            async with self._global_semaphore:
+                started = time.perf_counter()
+                try:
+                    async with self.session.get(url, headers=headers) as response:
+                        body = await response.read()
+                        headers = {key.lower(): value for key, value in response.headers.items()}
+                        get_metrics().observe_fetch(url, time.perf_counter() - started, response.status)
+                        return FetchResponse(str(response.url), response.status, headers, body)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    get_metrics().observe_fetch(url, time.perf_counter() - started, "error")
+                    logger.info(f"❌ Échec du téléchargement de {url} : {e}")
+                    return FetchResponse(url, None, {}, None)
@@ -2,6 +2,8 @@ from database_manager import DatabaseManager
 from rss_scraper import RSSScraper
 from embedding_generator import EmbeddingGenerator
 from mongo_docstore import MongoDBDocStore
+from embedding_cache import EmbeddingCache
+from mongo_registry import get_client
 import openai
 import pymongo
 import os
@@ -11,12 +13,13 @@ from llama_index.storage.index_store.mongodb import MongoIndexStore
 from llama_index.vector_stores.mongodb import MongoDBAtlasVectorSearch
 from llama_index.core import Document
 from llama_index.core import SimpleDirectoryReader, StorageContext
+from llama_index.core.bridge.pydantic import PrivateAttr
 
 
 def get_mongo_client(mongo_uri):
   """Establish connection to the MongoDB."""
   try:
-    client = pymongo.MongoClient(mongo_uri)
+    client = get_client(mongo_uri)
     print("Connection to MongoDB successful")
     return client
   except pymongo.errors.ConnectionFailure as e:
@@ -24,6 +27,29 @@ def get_mongo_client(mongo_uri):
     return None
 
 
+class CachedOpenAIEmbedding(OpenAIEmbedding):
+  """OpenAIEmbedding qui consulte l'EmbeddingCache partagé avant d'appeler OpenAI."""
+
+  _cache: EmbeddingCache = PrivateAttr()
+
+  def __init__(self, cache, **kwargs):
+    super().__init__(**kwargs)
+    self._cache = cache
+
+  def _get_text_embeddings(self, texts):
+    embeddings = self._cache.get_many(self.model_name, texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+      computed = super()._get_text_embeddings([texts[i] for i in missing])
+      self._cache.put_many(self.model_name, [texts[i] for i in missing], computed)
+      for i, embedding in zip(missing, computed):
+        embeddings[i] = embedding
+    return [list(map(float, embedding)) for embedding in embeddings]
+
+  def _get_text_embedding(self, text):
+    return self._get_text_embeddings([text])[0]
+
+
 uri=os.getenv("MONGO_URI")
 
 
@@ -35,7 +61,7 @@ DB_NAME="news_database"
 COLLECTION_NAME="llama"
 db = mongo_client[os.getenv("MONGO_DB_NAME")]
 
-embed_model = OpenAIEmbedding(model="text-embedding-ada-002")
+embed_model = CachedOpenAIEmbedding(EmbeddingCache(db["embedding_cache"]), model="text-embedding-ada-002")
 
 from llama_index.core.ingestion import IngestionPipeline
 
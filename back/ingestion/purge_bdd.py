@@ -1,4 +1,6 @@
-from pymongo import MongoClient
+from mongo_registry import get_client, close_clients
+from archive import get_archiver, RETENTION_DAYS, VECTOR_MODES
+import argparse
 import os
 from dotenv import load_dotenv
 
@@ -7,10 +9,23 @@ load_dotenv()
 class DatabaseCleaner:
     def __init__(self):
         """Initialisation de la connexion MongoDB."""
-        self.client = MongoClient(os.getenv("MONGO_URI"))
+        self.client = get_client()
         self.db = self.client[os.getenv("MONGO_DB_NAME")]
         self.collection = self.db[os.getenv("MONGO_COLLECTION")]
 
+    def apply_retention(self, max_age_days=RETENTION_DAYS, dry_run=False, **options):
+        """
+        Archive les articles plus anciens que `max_age_days` jours (voir `ArticleArchiver`) :
+        la collection chaude garde une taille stable sans perdre l'historique.
+        :param options: Réglages de l'archiveur (backend, vectors, batch_size...).
+        """
+        vector_store = None
+        if os.getenv("VECTOR_STORE_PATH"):
+            from vector_file_store import VectorFileStore
+            vector_store = VectorFileStore(os.getenv("VECTOR_STORE_PATH"))
+        archiver = get_archiver(self.collection, vector_store=vector_store, **options)
+        return archiver.archive(max_age_days, dry_run=dry_run)
+
     def purge_database(self):
         """Supprime toutes les sources et articles existants."""
         print("🚨 Suppression de toutes les sources et articles...")
@@ -20,10 +35,20 @@ class DatabaseCleaner:
 
     def close(self):
         """Ferme la connexion MongoDB."""
-        self.client.close()
+        close_clients()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rétention des articles (archivage des plus anciens) ou purge complète")
+    parser.add_argument("--all", action="store_true", help="Supprime toutes les sources et tous les articles, sans archivage")
+    parser.add_argument("--max-age-days", type=int, default=RETENTION_DAYS, help="Âge (en jours) au-delà duquel un article est archivé")
+    parser.add_argument("--vectors", choices=VECTOR_MODES, default=os.getenv("ARCHIVE_VECTORS", "int8"), help="Sort des embeddings archivés")
+    parser.add_argument("--dry-run", action="store_true", help="Compte les articles à archiver sans rien déplacer")
+    args = parser.parse_args()
+
     cleaner = DatabaseCleaner()
-    cleaner.purge_database()
+    if args.all:
+        cleaner.purge_database()
+    else:
+        cleaner.apply_retention(args.max_age_days, dry_run=args.dry_run, vectors=args.vectors)
     cleaner.close()
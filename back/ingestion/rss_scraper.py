@@ -2,120 +2,247 @@ from llama_index.core import Document, StorageContext
 from llama_index.core.node_parser import SentenceSplitter
 from datetime import datetime
 import feedparser
-import requests
-from bs4 import BeautifulSoup
-from newspaper import Article
-import time
+import asyncio
+import logging
+from async_fetcher import AsyncFetcher
+from article_extractor import ArticleExtractor, extract_article
+from scrape_pipeline import ScrapePipeline
+from near_duplicates import NearDuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_ATTEMPTS = 3  # Au-delà, une entrée toujours en échec (lien mort, page illisible) est abandonnée
 
 class RSSScraper:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, max_connections=20, max_per_host=2, politeness_delay=1.0, write_batch_size=100,
+                 extract_workers=None, queue_size=100, detect_duplicates=True):
         """
         Initialise le scraper avec une connexion à la BDD.
         :param db_manager: Instance de DatabaseManager.
+        :param max_connections: Nombre maximal de téléchargements simultanés.
+        :param max_per_host: Nombre maximal de téléchargements simultanés par domaine.
+        :param politeness_delay: Délai minimal (en secondes) entre deux requêtes vers un même domaine.
+        :param write_batch_size: Nombre d'articles par `bulk_write`.
+        :param extract_workers: Nombre de processus d'extraction HTML (par défaut, un par cœur).
+        :param queue_size: Taille des files du pipeline (borne la mémoire occupée par les pages en attente).
+        :param detect_duplicates: Rattache les quasi-doublons (dépêches reprises par plusieurs sources) à un article canonique.
         """
         self.db_manager = db_manager
         self.failed_sources = set()  # 🔴 Liste des sources qui posent problème
+        self.extractor = ArticleExtractor()  # Session HTTP partagée et extracteur retenu par domaine
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.politeness_delay = politeness_delay
+        self.write_batch_size = write_batch_size
+        self.extract_workers = extract_workers
+        self.queue_size = queue_size
+        self.duplicates = NearDuplicateIndex(db_manager.db["article_signatures"]) if detect_duplicates else None
 
     def get_rss_feeds_with_categories(self):
         """Récupère les flux RSS stockés dans MongoDB avec leur catégorie associée."""
         feeds = self.db_manager.db["sources"].find({}, {"_id": 0, "url": 1, "category": 1})
         return {feed["url"]: feed["category"] for feed in feeds}
 
-    def scrape_feed(self, feed_url, category):
-        """Scrape un flux RSS et stocke en base MongoDB avec la catégorie correspondante."""
+    async def scrape_feed(self, pipeline, feed_url, category):
+        """
+        Scrape un flux RSS et stocke en base MongoDB avec la catégorie correspondante.
+        :param pipeline: ScrapePipeline ouvert (son fetcher sert aussi à télécharger le flux).
+        :return: Compteurs {"inserted", "updated", "skipped", "failed"} et identifiants écrits ("ids") pour ce flux.
+        """
+        stats = {"inserted": 0, "updated": 0, "duplicates": 0, "skipped": 0, "failed": 0, "ids": []}
         if feed_url in self.failed_sources:
             print(f"🚫 Source bloquée, on la saute : {feed_url}")
-            return
+            return stats
+
+        # 📦 Requête conditionnelle : un flux inchangé ne coûte qu'un 304
+        state = self.db_manager.get_feed_state(feed_url)
+        retry_entries = {entry["guid"]: entry for entry in state.get("retry_entries", [])}
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
 
-        feed = feedparser.parse(feed_url)
+        response = await pipeline.fetcher.fetch(feed_url, headers=headers)
+        if response.status == 304 and not retry_entries:
+            print(f"⏭️ Flux inchangé depuis le dernier passage : {feed_url}")
+            return stats
+        if response.status != 304 and (response.body is None or response.status != 200):
+            print(f"❌ Flux inaccessible ({response.status}) : {feed_url}")
+            return stats
 
-        for entry in feed.entries:
+        high_water_mark = state.get("last_entry_date")
+        candidates, processed = [], []
+        if response.status == 304:
+            # ⏭️ Flux inchangé : seules les entrées en échec au passage précédent sont retentées, depuis l'état du flux
+            print(f"⏭️ Flux inchangé, {len(retry_entries)} entrées en échec retentées : {feed_url}")
+            validators = (state.get("etag"), state.get("last_modified"))
+            processed = [(guid, None) for guid in state.get("seen_guids", [])]
+            entries = []
+        else:
+            validators = (response.headers.get("etag"), response.headers.get("last-modified"))
+            entries = feedparser.parse(response.body, response_headers=response.headers).entries
+
+        seen_guids = set(state.get("seen_guids", []))
+        for entry in entries:
             if 'link' not in entry:
-                print(f"❌ Impossible de récupérer le lien pour l'article : {entry.get('title', 'Sans titre')}")
+                logger.info(f"❌ Impossible de récupérer le lien pour l'article : {entry.get('title', 'Sans titre')}")
                 continue
 
             title = entry.title
             link = entry.link
-            pub_date = datetime(*entry.published_parsed[:6]) if "published_parsed" in entry else datetime.now()
+            guid = entry.get("id") or link
+            is_dated = "published_parsed" in entry and entry.published_parsed
+            pub_date = datetime(*entry.published_parsed[:6]) if is_dated else datetime.now()
             description = entry.summary if "summary" in entry else None
+            entry_date = pub_date if is_dated else None
 
-            existing_content = self.db_manager.collection.find_one({"link": link}, {"content": 1})
-
-            if existing_content and "content" in existing_content and existing_content["content"]:
-                print(f"🔵 Article déjà en base, pas de mise à jour : {title}")
+            # 🔖 Seules les entrées jamais vues et plus récentes que le dernier passage sont traitées
+            # (les entrées en échec au passage précédent sont retentées quelle que soit leur date)
+            already_seen = guid in seen_guids or (is_dated and high_water_mark and pub_date < high_water_mark)
+            if already_seen and guid not in retry_entries:
+                stats["skipped"] += 1
+                processed.append((guid, entry_date))
                 continue
 
-            # 🔥 Scraping du contenu complet
-            content = self.scrape_full_article(link)
-
-            if not content:
-                print(f"❌ Impossible d'obtenir du contenu pour {link}. Article ignoré.")
-                continue
-
-            # 🔥 Insertion en base (sans toucher aux embeddings)
             article_data = {
                 "title": title,
                 "link": link,
                 "pub_date": pub_date,
                 "description": description,
-                "content": content,
                 "source": feed_url,
                 "category": category
             }
+            candidates.append((guid, entry_date, article_data))
+
+        # 🔁 Entrées en échec absentes du flux reçu (304, ou sorties du flux) : retentées depuis leur copie enregistrée
+        listed = {guid for guid, _, _ in candidates}
+        for guid, entry in retry_entries.items():
+            if guid not in listed:
+                candidates.append((guid, entry.get("entry_date"), {**entry["article"], "source": feed_url, "category": category}))
+
+        # 🔎 Une seule requête `$in` pour savoir quels liens du flux sont déjà en base
+        known_links = self.db_manager.get_links_with_content([data["link"] for _, _, data in candidates])
+
+        to_scrape, queued_links = [], set()
+        for guid, entry_date, article_data in candidates:
+            if article_data["link"] in known_links or article_data["link"] in queued_links:
+                stats["skipped"] += 1
+                processed.append((guid, entry_date))
+                continue
+            queued_links.add(article_data["link"])
+            to_scrape.append((guid, entry_date, article_data))
+
+        # 🏭 Les articles inconnus passent par le pipeline : téléchargement, extraction multi-processus, écriture par lots
+        results = await asyncio.gather(*(pipeline.process(data) for _, _, data in to_scrape))
 
-            self.db_manager.collection.update_one(
-                {"link": link},
-                {"$set": article_data},
-                upsert=True
-            )
+        failed_entries = []
+        for (guid, entry_date, article_data), (status, article_id) in zip(to_scrape, results):
+            if status == "failed":
+                stats["failed"] += 1
+                attempts = retry_entries.get(guid, {}).get("attempts", 0) + 1
+                if attempts >= MAX_RETRY_ATTEMPTS:
+                    print(f"⚠️ Entrée abandonnée après {attempts} tentatives : {article_data['link']}")
+                    processed.append((guid, entry_date))
+                    continue
+                failed_entries.append({  # Retentée au prochain passage, même si le flux répond 304
+                    "guid": guid,
+                    "entry_date": entry_date,
+                    "attempts": attempts,
+                    "article": {key: article_data[key] for key in ("title", "link", "pub_date", "description")},
+                })
+                continue
+            processed.append((guid, entry_date))
+            if status == "duplicate":
+                stats["duplicates"] += 1  # Renvoi vers l'article canonique, hors embeddings et clustering
+                continue
+            stats[status] += 1
+            if article_id is not None:
+                stats["ids"].append(article_id)
+
+        print(f"✅ {feed_url} : {stats['inserted']} ajoutés, {stats['updated']} mis à jour, "
+              f"{stats['duplicates']} doublons, {stats['skipped']} ignorés, {stats['failed']} en échec")
+
+        # 💾 Mise à jour de l'état du flux : les entrées en échec, gardées avec leurs métadonnées dans `retry_entries`,
+        # échappent aux filtres au prochain passage et sont retentées même sur un 304, jusqu'à MAX_RETRY_ATTEMPTS.
+        dates = [entry_date for _, entry_date in processed if entry_date is not None]
+        if high_water_mark:
+            dates.append(high_water_mark)
 
-            print(f"✅ Article ajouté/mis à jour : {title}")
+        self.db_manager.update_feed_state(feed_url, {
+            "etag": validators[0],
+            "last_modified": validators[1],
+            "seen_guids": [guid for guid, _ in processed],
+            "retry_entries": failed_entries,
+            "last_entry_date": max(dates) if dates else None
+        })
+        return stats
 
-            # 🕒 Pause pour éviter le throttling
-            time.sleep(1)
+    async def scrape_full_article_async(self, fetcher, url):
+        """Télécharge la page via le client asynchrone puis l'analyse hors de la boucle d'événements."""
+        response = await fetcher.fetch(url)
+        if response.body is None or response.status != 200:
+            logger.info(f"❌ HTTP {response.status} - Impossible de récupérer {url}")
+            return None
+
+        return await asyncio.to_thread(self.parse_article, url, response.body)
+
+    def parse_article(self, url, html):
+        """Extrait le texte d'une page déjà téléchargée (extracteur adapté au domaine, l'autre en fallback)."""
+        text = self.extractor.extract(url, html)
+        if text is None:
+            logger.info(f"⚠️ Aucun contenu exploitable extrait pour {url}")
+            self.failed_sources.add(url)  # 🔴 On garde en mémoire les sources problématiques
+        return text
 
     def scrape_full_article(self, url):
-        """Scrape le contenu complet d'un article avec Newspaper3k et BeautifulSoup en fallback."""
-        try:
-            # 🌍 On tente d'abord avec Newspaper3k
-            article = Article(url)
-            article.download()
-            article.parse()
-
-            if article.text and len(article.text) > 100:  # 🔍 Vérifier qu'on a du contenu valide
-                return article.text.strip()
-            else:
-                print(f"⚠️ Contenu trop court avec Newspaper3k, on tente BeautifulSoup : {url}")
-                self.failed_sources.add(url)  # 🔴 On garde en mémoire les sources problématiques
-                return self.scrape_fallback(url)
-
-        except Exception as e:
-            print(f"❌ Newspaper3k a échoué pour {url} : {e}")
+        """Scrape le contenu complet d'un article : un seul téléchargement, sur la session HTTP partagée."""
+        html = self.extractor.fetch(url)
+        if html is None:
             self.failed_sources.add(url)
-            return self.scrape_fallback(url)
-
-    def scrape_fallback(self, url):
-        """Fallback avec BeautifulSoup si Newspaper3k échoue."""
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                              "(KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            return None
+        return self.parse_article(url, html)
 
-            if response.status_code != 200:
-                print(f"❌ HTTP {response.status_code} - Impossible de récupérer {url}")
+    def scrape_fallback(self, url, html=None):
+        """
+        Fallback qui essaie BeautifulSoup en premier (puis newspaper si le texte est inutilisable),
+        sur le HTML déjà téléchargé si on l'a (sinon un unique téléchargement).
+        """
+        if html is None:
+            html = self.extractor.fetch(url)
+            if html is None:
                 return None
+        text, _ = extract_article(url, html, preferred="soup")
+        return text
 
-            soup = BeautifulSoup(response.content, "html.parser")
-            paragraphs = soup.find_all("p")  # 🔍 On récupère tous les paragraphes
+    async def scrape_all(self, feeds_with_categories):
+        """Scrape tous les flux en parallèle, avec limites globales et par domaine, et renvoie les compteurs cumulés."""
+        async with AsyncFetcher(
+            max_connections=self.max_connections,
+            max_per_host=self.max_per_host,
+            politeness_delay=self.politeness_delay
+        ) as fetcher:
+            async with ScrapePipeline(
+                self.db_manager, fetcher, self.extractor,
+                extract_workers=self.extract_workers,
+                queue_size=self.queue_size,
+                write_batch_size=self.write_batch_size,
+                duplicates=self.duplicates
+            ) as pipeline:
+                tasks = []
+                for feed_url, category in feeds_with_categories.items():
+                    print(f"📡 Scraping {feed_url} ... (Catégorie : {category})")
+                    tasks.append(self.scrape_feed(pipeline, feed_url, category))
+                results = await asyncio.gather(*tasks)
 
-            text = "\n".join([p.get_text() for p in paragraphs if p.get_text()])
-            return text.strip() if len(text) > 100 else None  # 🔍 Vérifier si le texte est utile
+        totals = {"inserted": 0, "updated": 0, "duplicates": 0, "skipped": 0, "failed": 0, "ids": []}
+        for stats in results:
+            for key, value in stats.items():
+                totals[key] += value
 
-        except Exception as e:
-            print(f"❌ Échec du fallback BeautifulSoup pour {url} : {e}")
-            return None
+        print(f"📊 Ingestion : {totals['inserted']} ajoutés, {totals['updated']} mis à jour, "
+              f"{totals['duplicates']} doublons, {totals['skipped']} ignorés, {totals['failed']} en échec")
+        return totals
 
     def run(self):
         """Lance le scraping pour tous les flux RSS enregistrés avec leurs catégories."""
@@ -124,8 +251,9 @@ class RSSScraper:
             print("❌ Aucun flux RSS enregistré en base !")
             return
 
-        for feed_url, category in feeds_with_categories.items():
-            print(f"📡 Scraping {feed_url} ... (Catégorie : {category})")
-            self.scrape_feed(feed_url, category)
+        try:
+            asyncio.run(self.scrape_all(feeds_with_categories))
+        finally:
+            self.extractor.close()
 
         print("✅ Scraping terminé !")
@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from article_extractor import extract_article
+from text_normalization import prepare_article
+from near_duplicates import minhash_signature
+
+logger = logging.getLogger(__name__)
+
+WRITTEN = ("inserted", "updated")  # Statuts d'un article effectivement écrit
+
+
+def extract_and_prepare(url, html, title, preferred=None):
+    """
+    Travail d'un processus extracteur : extraction du texte, normalisation et comptage des tokens, signature MinHash.
+    Fonction de module (sérialisable) pour le ProcessPoolExecutor.
+    :return: (champs normalisés ou None, nom de l'extracteur qui a réussi ou None, signature ou None).
+    """
+    text, extractor = extract_article(url, html, preferred)
+    if text is None:
+        return None, None, None
+    fields = prepare_article(title, text)
+    return fields, extractor, minhash_signature(fields["content"])
+
+
+class StageStats:
+    """Compteurs d'un étage du pipeline : éléments traités, échecs et temps passé."""
+
+    def __init__(self):
+        self.done = 0
+        self.failed = 0
+        self.busy = 0.0
+
+    def as_dict(self, elapsed):
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy, 2),
+            "per_second": round(self.done / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
+
+class ScrapePipeline:
+    """
+    Pipeline producteur / consommateur d'ingestion des articles :
+    téléchargements asynchrones → file bornée de HTML → extraction dans un pool de processus
+    → file bornée d'articles prêts → écriture MongoDB par lots.
+    Un téléchargement ne démarre qu'après avoir obtenu une place (rendue une fois la page extraite) et les files
+    sont bornées : un étage lent ralentit l'étage précédent au lieu de remplir la mémoire.
+    """
+
+    def __init__(self, db_manager, fetcher, extractor, extract_workers=None, queue_size=100,
+                 write_batch_size=100, report_interval=30, duplicates=None):
+        """
+        :param db_manager: Instance de DatabaseManager (écriture des lots).
+        :param fetcher: AsyncFetcher ouvert, partagé avec le téléchargement des flux.
+        :param extractor: ArticleExtractor dont on réutilise la mémoire des extracteurs par domaine.
+        :param extract_workers: Nombre de processus d'extraction (par défaut, un par cœur).
+        :param queue_size: Taille maximale de chacune des deux files, et nombre maximal de pages téléchargées
+                           (ou en cours de téléchargement) en attente d'extraction.
+        :param write_batch_size: Nombre maximal d'articles par `bulk_write`.
+        :param report_interval: Intervalle (en secondes) d'affichage de l'état du pipeline (0 pour le désactiver).
+        :param duplicates: NearDuplicateIndex optionnel : les quasi-doublons sont enregistrés comme renvois vers l'article canonique.
+        """
+        self.db_manager = db_manager
+        self.fetcher = fetcher
+        self.extractor = extractor
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.write_batch_size = write_batch_size
+        self.report_interval = report_interval
+        self.duplicates = duplicates
+        self.duplicate_count = 0
+
+        self.stages = {"fetch": StageStats(), "extract": StageStats(), "write": StageStats()}
+        self.max_depth = {"html": 0, "write": 0}
+        self.started_at = None
+        self.html_queue = None
+        self.write_queue = None
+        self.page_slots = None
+        self.pool = None
+
+    async def __aenter__(self):
+        self.started_at = time.monotonic()
+        self.html_queue = asyncio.Queue(self.queue_size)
+        self.write_queue = asyncio.Queue(self.queue_size)
+        self.page_slots = asyncio.Semaphore(self.queue_size)
+        self.pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        # Deux consommateurs par processus : le pool a toujours une tâche d'avance
+        self._extract_tasks = [asyncio.create_task(self._extract_worker()) for _ in range(self.extract_workers * 2)]
+        self._writer_task = asyncio.create_task(self._writer())
+        self._monitor_task = asyncio.create_task(self._monitor()) if self.report_interval else None
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for _ in self._extract_tasks:
+            await self.html_queue.put(None)
+        await asyncio.gather(*self._extract_tasks)
+        await self.write_queue.put(None)
+        await self._writer_task
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        self.pool.shutdown()
+        self.report()
+
+    async def process(self, article_data):
+        """
+        Fait passer un article (métadonnées du flux) par tout le pipeline.
+        :return: (statut, id) avec statut parmi "inserted", "updated", "duplicate", "skipped" ou "failed".
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        # ⏸️ Place réservée avant le téléchargement et rendue après l'extraction : si les extracteurs sont en retard,
+        # les téléchargements attendent au lieu d'accumuler les pages en mémoire (contre-pression)
+        await self.page_slots.acquire()
+        try:
+            started = time.monotonic()
+            response = await self.fetcher.fetch(article_data["link"])
+            self.stages["fetch"].busy += time.monotonic() - started
+            if response.body is None or response.status != 200:
+                logger.info(f"❌ HTTP {response.status} - Impossible de récupérer {article_data['link']}")
+                self.stages["fetch"].failed += 1
+                self.page_slots.release()
+                return "failed", None
+            self.stages["fetch"].done += 1
+            await self.html_queue.put((article_data, response.body, future))
+        except BaseException:
+            self.page_slots.release()
+            raise
+        self.max_depth["html"] = max(self.max_depth["html"], self.html_queue.qsize())
+        return await future
+
+    async def _extract_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.html_queue.get()
+            if item is None:
+                return
+            article_data, html, future = item
+            url = article_data["link"]
+
+            started = time.monotonic()
+            try:
+                fields, extractor, signature = await loop.run_in_executor(
+                    self.pool, extract_and_prepare, url, html, article_data["title"], self.extractor.preferred(url)
+                )
+            except Exception as e:
+                logger.info(f"❌ Extraction impossible pour {url} : {e}")
+                fields, extractor, signature = None, None, None
+            finally:
+                self.page_slots.release()  # Le HTML n'est plus retenu : un autre téléchargement peut démarrer
+            self.stages["extract"].busy += time.monotonic() - started
+
+            if fields is None:
+                logger.info(f"❌ Impossible d'obtenir du contenu pour {url}. Article ignoré.")
+                self.stages["extract"].failed += 1
+                future.set_result(("failed", None))
+                continue
+            self.stages["extract"].done += 1
+            self.extractor.remember(url, extractor)
+
+            # 👯 Le rattachement à un article canonique est décidé par l'écrivain, au moment d'écrire (voir `_flush`)
+            await self.write_queue.put((article_data, fields, signature, future))
+            self.max_depth["write"] = max(self.max_depth["write"], self.write_queue.qsize())
+
+    def _match(self, batch):
+        """
+        Cherche l'article canonique de chaque article du lot. Appelé par le seul écrivain, lot après lot et sans
+        `await` : deux copies ne peuvent pas être toutes deux considérées comme canoniques. Les articles sans
+        correspondance sont indexés provisoirement (retirés de l'index si leur écriture échoue).
+        :return: Liste alignée sur le lot de (lien canonique ou None, similarité).
+        """
+        matches = []
+        for article, _, signature, _ in batch:
+            canonical, score = None, 0.0
+            if self.duplicates is not None and signature is not None:
+                canonical, score = self.duplicates.find(signature)
+                if canonical is None or canonical == article["link"]:
+                    canonical, score = None, 0.0
+                    self.duplicates.add(article["link"], signature)
+            matches.append((canonical, score))
+        return matches
+
+    async def _stored_links(self, links):
+        """Liens effectivement présents en base parmi des articles canoniques indexés lors de lots précédents."""
+        if not links:
+            return set()
+        try:
+            return await asyncio.to_thread(self.db_manager.get_links_with_content, links)
+        except Exception as e:
+            print(f"❌ Vérification des articles canoniques impossible : {e}")
+            return set()
+
+    async def _write(self, batch, indexes, decisions, statuses):
+        """
+        Écrit en un `bulk_write` les articles `indexes` du lot : renvoi si `decisions[i]` vaut (canonique, score),
+        article complet sinon. Renseigne `statuses` ; un article complet non écrit est retiré de l'index des doublons.
+        """
+        if not indexes:
+            return
+        articles = []
+        for i in indexes:
+            article, fields, signature, _ = batch[i]
+            if decisions[i] is not None:
+                # Renvoi vers l'article canonique : ni contenu, ni embedding, ni clustering
+                canonical, score = decisions[i]
+                article.update({"title": fields["title"], "duplicate_of": canonical, "duplicate_score": score})
+            else:
+                article.update(fields)
+                article["needs_embedding"] = True
+                if self.duplicates is not None and signature is not None and article["link"] not in self.duplicates.signatures:
+                    self.duplicates.add(article["link"], signature)  # Copie promue article canonique
+            articles.append(article)
+
+        started = time.monotonic()
+        try:
+            written = (await asyncio.to_thread(self.db_manager.upsert_articles, articles))["statuses"]
+        except Exception as e:
+            print(f"❌ Échec de l'écriture d'un lot de {len(articles)} articles : {e}")
+            written = [("failed", None)] * len(articles)
+        self.stages["write"].busy += time.monotonic() - started
+
+        for i, status in zip(indexes, written):
+            statuses[i] = status
+            if decisions[i] is None and status[0] not in WRITTEN and self.duplicates is not None:
+                self.duplicates.discard(batch[i][0]["link"])
+
+    async def _flush(self, batch):
+        """
+        Écrit un lot. Un renvoi ne vise qu'un article canonique présent en base : ceux des lots précédents sont
+        vérifiés dans MongoDB, ceux du lot sont écrits d'abord et leurs copies ensuite. Une copie dont l'article
+        canonique manque est enregistrée comme article à part entière.
+        """
+        matches = self._match(batch)
+        in_batch = {batch[i][0]["link"] for i, (canonical, _) in enumerate(matches) if canonical is None}
+        earlier = {canonical for canonical, _ in matches if canonical is not None and canonical not in in_batch}
+        stored = await self._stored_links(earlier)
+        for link in earlier - stored:
+            self.duplicates.discard(link)  # Article canonique purgé, archivé ou jamais écrit
+
+        decisions, statuses = [None] * len(batch), [None] * len(batch)
+        first = [i for i, (canonical, _) in enumerate(matches) if canonical not in in_batch]
+        for i in first:
+            canonical, score = matches[i]
+            decisions[i] = (canonical, score) if canonical in stored else None
+        await self._write(batch, first, decisions, statuses)
+
+        written = {batch[i][0]["link"] for i in first if decisions[i] is None and statuses[i][0] in WRITTEN}
+        second = [i for i, (canonical, _) in enumerate(matches) if canonical in in_batch]
+        for i in second:
+            canonical, score = matches[i]
+            decisions[i] = (canonical, score) if canonical in written else None
+        await self._write(batch, second, decisions, statuses)
+
+        duplicates, canonical_links = [], []
+        for i, (article, _, _, future) in enumerate(batch):
+            status = statuses[i]
+            if status[0] == "failed":
+                self.stages["write"].failed += 1
+            else:
+                self.stages["write"].done += 1
+                if decisions[i] is not None:
+                    # Seuls les renvois nouvellement créés comptent (un lien rejeté par l'index unique l'a déjà été)
+                    if status[0] == "inserted":
+                        duplicates.append((decisions[i][0], article.get("source")))
+                    if status[0] != "skipped":
+                        status = ("duplicate", status[1])
+                elif status[0] in WRITTEN:
+                    canonical_links.append(article["link"])
+            future.set_result(status)
+
+        if self.duplicates is not None:
+            try:
+                await asyncio.to_thread(self.db_manager.register_duplicates, duplicates)
+                await asyncio.to_thread(self.duplicates.persist, canonical_links)
+            except Exception as e:
+                print(f"❌ Échec de l'enregistrement des doublons : {e}")
+            self.duplicate_count += len(duplicates)
+
+    def _fail(self, batch):
+        """Marque en échec les articles du lot encore en attente (et les retire de l'index des doublons)."""
+        for article, _, _, future in batch:
+            if future.done():
+                continue
+            if self.duplicates is not None:
+                self.duplicates.discard(article["link"])
+            self.stages["write"].failed += 1
+            future.set_result(("failed", None))
+
+    async def _writer(self):
+        """Écrit par lots : dès que la file est vide (faible latence) ou que le lot est plein (débit)."""
+        batch = []
+        while True:
+            item = await self.write_queue.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= self.write_batch_size or self.write_queue.empty()):
+                try:
+                    await self._flush(batch)
+                except Exception as e:
+                    # ⚠️ L'écrivain ne doit pas mourir : les articles non résolus du lot sont en échec, la file continue
+                    print(f"❌ Échec du traitement d'un lot de {len(batch)} articles : {e}")
+                    self._fail(batch)
+                batch = []
+            if item is None:
+                return
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.report()
+
+    def stats(self):
+        """État du pipeline : profondeur (actuelle et maximale) des files et débit de chaque étage."""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "queues": {
+                "html": {"depth": self.html_queue.qsize() if self.html_queue else 0, "max_depth": self.max_depth["html"]},
+                "write": {"depth": self.write_queue.qsize() if self.write_queue else 0, "max_depth": self.max_depth["write"]}
+            },
+            "stages": {name: stage.as_dict(elapsed) for name, stage in self.stages.items()},
+            "duplicates": self.duplicate_count,
+            "extract_workers": self.extract_workers
+        }
+
+    def report(self):
+        """Affiche l'état du pipeline (pour dimensionner les pools)."""
+        stats = self.stats()
+        queues = stats["queues"]
+        stages = " | ".join(
+            f"{name} {stage['done']} ({stage['per_second']}/s, {stage['failed']} échecs)"
+            for name, stage in stats["stages"].items()
+        )
+        print(f"🏭 Pipeline ({stats['elapsed_seconds']}s) : {stages} | {stats['duplicates']} doublons | "
+              f"files html {queues['html']['depth']}/{self.queue_size} (max {queues['html']['max_depth']}), "
+              f"écriture {queues['write']['depth']}/{self.queue_size} (max {queues['write']['max_depth']})")
+        return stats
@@ -1,4 +1,5 @@
 import os
+import logging
 import argparse  # ➤ Ajout pour gérer les arguments
 from dotenv import load_dotenv
 from database_manager import DatabaseManager
@@ -7,10 +8,13 @@ from embedding_generator import EmbeddingGenerator
 import asyncio
 from workflow import NewsProcessingWorkflow  # ➤ Import mis à jour pour utiliser la classe avec durée
 from workflow import get_news_workflow
+from metrics import configure_logging, setup_tracing, get_metrics
+from mongo_registry import close_clients
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
-async def main(duration):
+async def main(duration, timeout=600, resume=None, retry_failed=False):
     """
     # Ancien menu interactif (désactivé temporairement)
     db_manager = DatabaseManager()
@@ -53,14 +57,43 @@ async def main(duration):
     """
 
     # Nouvelle version : Lancement direct du workflow avec durée personnalisée
-    print(f"🚀 Exécution du workflow pour les {duration} derniers jours...")
-    news_workflow = get_news_workflow(duration=duration)
-    result = await news_workflow.run(timeout=600)
+    news_workflow = get_news_workflow(duration=duration, timeout=timeout, run_id=resume, retry_failed=retry_failed)
+    if resume:
+        print(f"🔁 Reprise du passage {resume} (les étapes terminées ne sont pas rejouées)...")
+    else:
+        print(f"🚀 Exécution du workflow pour les {duration} derniers jours (passage {news_workflow.run_id})...")
+
+    try:
+        result = await news_workflow.run()
+    except Exception as e:
+        news_workflow.ledger.finish(news_workflow.run_id, "failed", error=str(e))
+        print(f"❌ Passage {news_workflow.run_id} interrompu : {e}")
+        print(f"➡️  Pour le reprendre : python main.py --resume {news_workflow.run_id}")
+        raise
+    finally:
+        # 📈 Métriques du passage (réussi ou non) : synthèse par étape, export JSON et Prometheus
+        # Un échec de l'export (ex. METRICS_DIR non accessible en écriture) ne doit pas masquer l'erreur du workflow
+        try:
+            metrics = get_metrics()
+            metrics.report()
+            json_path, prom_path = metrics.export(news_workflow.run_id)
+            print(f"💾 Métriques enregistrées dans {json_path} et {prom_path}")
+        except Exception:
+            logger.exception(f"❌ Export des métriques du passage {news_workflow.run_id} impossible")
     print(result)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Lancement du workflow avec une période personnalisée")
     parser.add_argument("--duration", type=int, default=1, help="Nombre de jours à analyser (ex: 1, 3, 7...)")
+    parser.add_argument("--timeout", type=float, default=600, help="Durée maximale du passage en secondes (0 pour aucune limite)")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Reprend un passage interrompu à partir de sa dernière étape terminée")
+    parser.add_argument("--retry-failed", action="store_true", help="Renvoie aussi les messages Telegram en échec ou en attente des passages précédents")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO"), help="DEBUG pour les traces article par article, WARNING pour les masquer toutes")
     args = parser.parse_args()
 
-    asyncio.run(main(args.duration))
+    configure_logging(args.log_level)
+    setup_tracing()
+    try:
+        asyncio.run(main(args.duration, timeout=args.timeout or None, resume=args.resume, retry_failed=args.retry_failed))
+    finally:
+        close_clients()  # 🔌 Fermeture du client MongoDB partagé, une seule fois pour tout le processus
@@ -0,0 +1,23 @@
+import os
+import sys
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for module_dir in ("core", "ingestion", "workflow"):
+    sys.path.insert(0, os.path.join(BACK_DIR, module_dir))
+
+import mongomock
+import pytest
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """Base mongomock servie par le registre de clients (MONGO_URI, MONGO_DB_NAME, MONGO_COLLECTION)."""
+    from mongo_registry import set_client, close_clients
+
+    monkeypatch.setenv("MONGO_URI", "mongodb://tests")
+    monkeypatch.setenv("MONGO_DB_NAME", "tests")
+    monkeypatch.setenv("MONGO_COLLECTION", "articles")
+    client = mongomock.MongoClient()
+    set_client(client)
+    yield client["tests"]
+    close_clients()
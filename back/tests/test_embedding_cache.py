@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-ada-002"
+
+
+def new_cache(**options):
+    return EmbeddingCache(mongomock.MongoClient().db.embedding_cache, **options)
+
+
+def test_normalized_texts_share_an_entry():
+    cache = new_cache()
+    cache.put(MODEL, "Dépêche  AFP\n reprise", [0.5, -0.5])
+
+    assert cache.key(MODEL, "Dépêche AFP reprise") == cache.key(MODEL, " Dépêche  AFP\n reprise ")
+    np.testing.assert_array_equal(cache.get(MODEL, "Dépêche AFP reprise"), np.float32([0.5, -0.5]))
+    assert cache.get("autre-modele", "Dépêche AFP reprise") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_entries_survive_a_new_instance():
+    collection = mongomock.MongoClient().db.embedding_cache
+    EmbeddingCache(collection).put_many(MODEL, ["a", "b", "c"], [[1.0], None, [3.0]])
+
+    cache = EmbeddingCache(collection, lru_size=0)  # Lectures servies par MongoDB seul
+    results = cache.get_many(MODEL, ["a", "b", "c", "a"])
+    np.testing.assert_array_equal(results[0], np.float32([1.0]))
+    assert results[1] is None
+    np.testing.assert_array_equal(results[2], np.float32([3.0]))
+    np.testing.assert_array_equal(results[3], results[0])
+    assert isinstance(collection.find_one({"_id": cache.key(MODEL, "a")})["vector"], bytes)  # Stocké en float32
+
+
+def test_eviction_drops_least_recently_used():
+    cache = new_cache(max_entries=2, lru_size=0)
+    cache.put_many(MODEL, ["old", "used"], [[1.0], [2.0]])
+    cache.collection.update_many({}, {"$set": {"last_used": datetime.now() - timedelta(days=1)}})
+    cache.get(MODEL, "used")  # Rafraîchit `last_used`
+
+    cache.put(MODEL, "new", [3.0])
+
+    assert cache.collection.count_documents({}) == 2
+    assert cache.get(MODEL, "old") is None
+    assert cache.get(MODEL, "used") is not None and cache.get(MODEL, "new") is not None
+
+
+def test_memory_lru_is_bounded():
+    cache = new_cache(lru_size=2)
+    cache.put_many(MODEL, ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    assert list(cache.lru) == [cache.key(MODEL, "b"), cache.key(MODEL, "c")]
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from run_ledger import RunLedger
+
+
+def new_ledger():
+    return RunLedger(mongomock.MongoClient().db.workflow_runs)
+
+
+def test_step_output_is_replayed_identically():
+    ledger = new_ledger()
+    run_id = ledger.start({"duration": 3})
+    output = {
+        "labeled_clusters": {("Économie", "0"): {"label": "Taux", "article_ids": ["a", "b"]}},
+        "clusters": {"sport.foot": {"1": ["c"]}},  # Clé avec un point : interdite telle quelle dans MongoDB
+        "start_date": datetime(2024, 5, 1),
+    }
+
+    assert ledger.step_output(run_id, "label_clusters") is None
+    ledger.complete_step(run_id, "label_clusters", output)
+
+    assert ledger.step_output(run_id, "label_clusters") == output
+    assert ledger.step_output(run_id, "summarize_clusters") is None
+
+
+def test_progress_survives_a_resume():
+    ledger = new_ledger()
+    run_id = ledger.start({"duration": 1})
+    ledger.record_progress(run_id, "summarize_clusters", ("Sport", "2"), ("Sport - Finale", "Résumé"))
+    ledger.record_progress(run_id, "summarize_clusters", ("Sport", "2"), ("Sport - Finale", "Résumé v2"))
+    ledger.finish(run_id, "failed", error="timeout")
+
+    assert ledger.resume(run_id) == {"duration": 1}
+    run = ledger.get(run_id)
+    assert run["status"] == "running" and run["resumed"] == 1
+    assert ledger.get_progress(run_id, "summarize_clusters") == {("Sport", "2"): ("Sport - Finale", "Résumé v2")}
+    assert ledger.get_progress(run_id, "label_clusters") == {}
+
+
+def test_resume_unknown_run():
+    with pytest.raises(ValueError):
+        new_ledger().resume("inconnu")
+
+
+def test_latest_by_status():
+    ledger = new_ledger()
+    first = ledger.start({})
+    ledger.finish(first)
+    ledger.collection.update_one({"_id": first}, {"$set": {"created_at": datetime(2024, 1, 1)}})
+    second = ledger.start({})
+
+    assert ledger.latest()["_id"] == second
+    assert ledger.latest("completed")["_id"] == first
@@ -0,0 +1,125 @@
+import asyncio
+
+from database_manager import DatabaseManager
+from near_duplicates import NearDuplicateIndex, minhash_signature
+from scrape_pipeline import ScrapePipeline
+
+
+def article(number):
+    return {"link": f"http://example.com/{number}", "source": "http://example.com/feed.xml"}
+
+
+def fields(number):
+    return {"title": f"Titre {number}", "content": f"Contenu {number}", "token_count": 10}
+
+
+async def write_batches(pipeline, batches):
+    """
+    Fait passer des lots de (article, champs, signature) par l'écrivain du pipeline, un lot après l'autre.
+    :return: Statuts de chaque lot, puis l'écrivain est arrêté (il doit se terminer sur la sentinelle).
+    """
+    pipeline.write_queue = asyncio.Queue()
+    writer = asyncio.create_task(pipeline._writer())
+    loop = asyncio.get_running_loop()
+    results = []
+    for batch in batches:
+        futures = []
+        for article_data, article_fields, signature in batch:
+            futures.append(loop.create_future())
+            pipeline.write_queue.put_nowait((article_data, article_fields, signature, futures[-1]))
+        results.append(await asyncio.wait_for(asyncio.gather(*futures), timeout=5))
+    await pipeline.write_queue.put(None)
+    await asyncio.wait_for(writer, timeout=5)
+    return results
+
+
+class BrokenIndex:
+    """Index des doublons en panne au premier lot seulement."""
+
+    def __init__(self):
+        self.calls = 0
+        self.signatures = {}
+
+    def find(self, signature):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("index indisponible")
+        return None, 0.0
+
+    def add(self, link, signature):
+        self.signatures[link] = signature
+
+    def discard(self, link):
+        self.signatures.pop(link, None)
+
+    def persist(self, links):
+        pass
+
+
+def test_writer_survives_a_failed_flush(mongo_db):
+    pipeline = ScrapePipeline(DatabaseManager(), fetcher=None, extractor=None, duplicates=BrokenIndex())
+
+    first, second = asyncio.run(write_batches(pipeline, [
+        [(article(1), fields(1), "sig-1")],
+        [(article(2), fields(2), "sig-2")],
+    ]))
+
+    assert first == [("failed", None)]
+    assert second[0][0] == "inserted"
+    assert pipeline.stages["write"].failed == 1 and pipeline.stages["write"].done == 1
+    assert mongo_db["articles"].count_documents({}) == 1
+
+
+def wire_text(variant=""):
+    """Dépêche d'agence d'environ 80 mots ; `variant` modifie la fin (reprise légèrement retouchée)."""
+    words = [f"mot{i}" for i in range(80)]
+    return " ".join(words) + variant
+
+
+def new_pipeline(mongo_db):
+    duplicates = NearDuplicateIndex(mongo_db["article_signatures"])
+    return ScrapePipeline(DatabaseManager(), fetcher=None, extractor=None, duplicates=duplicates)
+
+
+def test_copies_are_linked_to_the_canonical(mongo_db):
+    pipeline = new_pipeline(mongo_db)
+    original, copy = wire_text(), wire_text(" source")
+
+    [statuses] = asyncio.run(write_batches(pipeline, [[
+        (article(1), fields(1) | {"content": original}, minhash_signature(original)),
+        (article(2), fields(2) | {"content": copy}, minhash_signature(copy)),
+    ]]))
+
+    assert [status for status, _ in statuses] == ["inserted", "duplicate"]
+    stub = mongo_db["articles"].find_one({"link": article(2)["link"]})
+    assert stub["duplicate_of"] == article(1)["link"] and "content" not in stub and "needs_embedding" not in stub
+    assert mongo_db["articles"].find_one({"link": article(1)["link"]})["duplicate_count"] == 1
+    assert mongo_db["article_signatures"].count_documents({}) == 1  # Seul l'article canonique est indexé
+    assert pipeline.duplicate_count == 1
+
+
+def test_copy_of_a_missing_canonical_is_promoted(mongo_db):
+    pipeline = new_pipeline(mongo_db)
+    original, copy = wire_text(), wire_text(" source")
+    asyncio.run(write_batches(pipeline, [[(article(1), fields(1) | {"content": original}, minhash_signature(original))]]))
+    mongo_db["articles"].delete_many({})  # Article canonique purgé entre deux lots
+
+    [statuses] = asyncio.run(write_batches(pipeline, [[
+        (article(2), fields(2) | {"content": copy}, minhash_signature(copy)),
+    ]]))
+
+    assert statuses[0][0] == "inserted"
+    assert "duplicate_of" not in mongo_db["articles"].find_one({"link": article(2)["link"]})
+    assert pipeline.duplicates.find(minhash_signature(copy))[0] == article(2)["link"]
+
+
+def test_short_texts_are_not_deduplicated(mongo_db):
+    pipeline = new_pipeline(mongo_db)
+    banner = "Abonnez-vous pour lire la suite de cet article."
+
+    [statuses] = asyncio.run(write_batches(pipeline, [[
+        (article(1), fields(1) | {"content": banner}, minhash_signature(banner)),
+        (article(2), fields(2) | {"content": banner}, minhash_signature(banner)),
+    ]]))
+
+    assert [status for status, _ in statuses] == ["inserted", "inserted"]
@@ -0,0 +1,76 @@
+import asyncio
+
+import mongomock
+from aiohttp import web
+
+from telegram_outbox import TelegramOutbox
+
+
+async def deliver_with_server(outbox, run_id=None, rejected=()):
+    """
+    Envoie la file vers une Bot API locale : les textes de `rejected` reçoivent une erreur définitive (400).
+    :return: (statistiques d'envoi, textes reçus dans l'ordre).
+    """
+    received = []
+
+    async def send_message(request):
+        payload = await request.json()
+        if payload["text"] in rejected:
+            return web.json_response({"ok": False, "description": "Bad Request"}, status=400)
+        received.append(payload["text"])
+        return web.json_response({"ok": True, "result": {"message_id": len(received)}})
+
+    app = web.Application()
+    app.router.add_post("/bottest/sendMessage", send_message)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    outbox.api_url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    try:
+        stats = await outbox.deliver(run_id)
+    finally:
+        await runner.cleanup()
+    return stats, received
+
+
+def new_outbox():
+    return TelegramOutbox(mongomock.MongoClient().db.telegram_outbox, token="test", chat_id="chat", chat_interval=0)
+
+
+def test_enqueue_is_idempotent_per_run():
+    outbox = new_outbox()
+    assert outbox.enqueue(["un", "deux"], run_id="run-1") == 2
+    # Reprise du même passage, résumés régénérés différemment : rien n'est ajouté
+    assert outbox.enqueue(["un bis", "deux bis"], run_id="run-1") == 0
+    assert outbox.enqueue(["un"], run_id="run-2") == 1
+    assert outbox.collection.count_documents({}) == 3
+
+
+def test_deliver_sends_only_the_run_in_order():
+    outbox = new_outbox()
+    outbox.enqueue(["ancien"], run_id="run-1")
+    outbox.enqueue(["premier", "second", "troisième"], run_id="run-2")
+
+    stats, received = asyncio.run(deliver_with_server(outbox, "run-2"))
+
+    assert received == ["premier", "second", "troisième"] and stats["sent"] == 3
+    assert outbox.collection.count_documents({"run_id": "run-1", "status": "pending"}) == 1
+
+    _, received = asyncio.run(deliver_with_server(outbox, "run-2"))
+    assert received == []  # Déjà envoyés : aucune réexpédition
+
+
+def test_failed_messages_are_retried_on_request():
+    outbox = new_outbox()
+    outbox.enqueue(["ok", "refusé"], run_id="run-1")
+
+    stats, _ = asyncio.run(deliver_with_server(outbox, "run-1", rejected={"refusé"}))
+    assert stats == {"sent": 1, "failed": 1, "latencies": stats["latencies"]}
+    assert outbox.collection.find_one({"text": "refusé"})["status"] == "failed"
+
+    assert outbox.retry_failed("run-2") == 0
+    assert outbox.retry_failed("run-1") == 1
+    stats, received = asyncio.run(deliver_with_server(outbox, "run-1"))
+    assert received == ["refusé"] and stats["sent"] == 1
+    assert outbox.collection.count_documents({"status": "sent"}) == 2
@@ -0,0 +1,68 @@
+import numpy as np
+from bson import BSON
+from bson.binary import Binary
+
+from vector_codec import encode_vector, decode_vector, decode_document, has_vector
+
+
+def test_float32_roundtrip():
+    vector = np.random.default_rng(0).normal(size=1536).astype(np.float32)
+    encoded = encode_vector(vector, "float32")
+    assert isinstance(encoded, Binary)
+    assert len(encoded) == 2 + 1536 * 4
+    np.testing.assert_array_equal(decode_vector(encoded), vector)
+
+
+def test_float32_roundtrip_through_bson():
+    vector = [0.5, -1.25, 3.0]
+    document = BSON.encode({"content_vector": encode_vector(vector, "float32")}).decode()
+    np.testing.assert_array_equal(decode_document(document)["content_vector"], np.float32(vector))
+
+
+def test_array_roundtrip():
+    vector = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+    encoded = encode_vector(vector, "array")
+    assert isinstance(encoded, list)
+    np.testing.assert_allclose(decode_vector(encoded), vector)
+
+
+def test_none_and_has_vector():
+    assert encode_vector(None) is None
+    assert decode_vector(None) is None
+    assert not has_vector({})
+    assert not has_vector({"content_vector": []})
+    assert has_vector({"content_vector": encode_vector([1.0], "float32")})
+
+
+def test_decode_document_without_vector():
+    assert decode_document(None) is None
+    assert decode_document({"title": "t"}) == {"title": "t"}
+
+
+def test_mixed_formats_decode_alike(mongo_db):
+    vector = np.array([0.25, -0.5, 1.0], dtype=np.float32)
+    mongo_db["articles"].insert_many([
+        {"_id": "array", "content_vector": encode_vector(vector, "array")},
+        {"_id": "float32", "content_vector": encode_vector(vector, "float32")},
+    ])
+    for document in mongo_db["articles"].find():
+        np.testing.assert_array_equal(decode_document(document)["content_vector"], vector)
+
+
+def test_migration_to_float32_and_back(mongo_db):
+    from migrate_vectors import VectorMigrator
+
+    vectors = np.random.default_rng(1).normal(size=(3, 4)).astype(np.float32)
+    mongo_db["articles"].insert_many([
+        {"_id": i, "content_vector": encode_vector(vector, "array")} for i, vector in enumerate(vectors)
+    ])
+    migrator = VectorMigrator()
+
+    assert migrator.migrate("float32", batch_size=2) == 3
+    assert migrator.migrate("float32") == 0  # Idempotente : seuls les vecteurs encore au format tableau sont relus
+    for document in mongo_db["articles"].find():
+        assert isinstance(document["content_vector"], bytes)
+        np.testing.assert_array_equal(decode_vector(document["content_vector"]), vectors[document["_id"]])
+
+    assert migrator.migrate("array") == 3
+    assert all(isinstance(doc["content_vector"], list) for doc in mongo_db["articles"].find())
@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import numpy as np
+
+from vector_file_store import VectorFileStore
+
+DIM = 8
+
+
+def random_vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def test_append_and_reopen(tmp_path):
+    vectors = random_vectors(4)
+    store = VectorFileStore(str(tmp_path), dim=DIM)
+    store.append(["a", "b", "c", "d"], vectors, categories=["x"] * 4,
+                 dates=[datetime(2024, 1, 1)] * 4)
+
+    reopened = VectorFileStore(str(tmp_path), dim=DIM)
+    assert len(reopened) == 4 and "c" in reopened
+    got = reopened.get_vectors(["c", "inconnu"])
+    np.testing.assert_allclose(got[0], normalized(vectors)[2], rtol=1e-6)
+    assert got[1] is None
+
+
+def test_replace_delete_and_compact(tmp_path):
+    vectors = random_vectors(3)
+    store = VectorFileStore(str(tmp_path), dim=DIM)
+    store.append(["a", "b"], vectors[:2])
+    store.append(["a"], vectors[2:])
+    store.delete(["b"])
+
+    reopened = VectorFileStore(str(tmp_path), dim=DIM)
+    assert len(reopened) == 1 and int(reopened.tombstones.sum()) == 2
+    np.testing.assert_allclose(reopened.get_vectors(["a"])[0], normalized(vectors)[2], rtol=1e-6)
+
+    assert reopened.compact() == 2
+    assert len(reopened.rows) == 1
+    np.testing.assert_allclose(reopened.get_vectors(["a"])[0], normalized(vectors)[2], rtol=1e-6)
+
+
+def test_interrupted_append_is_repaired(tmp_path):
+    vectors = random_vectors(3)
+    store = VectorFileStore(str(tmp_path), dim=DIM)
+    store.append(["a", "b"], vectors[:2])
+    with open(store.vectors_path, "ab") as f:
+        f.write(vectors[2].tobytes()[:10])  # Vecteur tronqué, sans ligne d'id
+
+    reopened = VectorFileStore(str(tmp_path), dim=DIM)
+    assert len(reopened) == 2
+    reopened.append(["c"], vectors[2:])
+    np.testing.assert_allclose(reopened.get_vectors(["c"])[0], normalized(vectors)[2], rtol=1e-6)
+
+
+def test_to_index_searches_memmap(tmp_path):
+    vectors = random_vectors(5)
+    store = VectorFileStore(str(tmp_path), dim=DIM)
+    store.append([str(i) for i in range(5)], vectors, categories=["x", "y", "x", "y", "x"])
+    store.delete(["2"])
+
+    index = store.to_index()
+    assert len(index) == 4
+    assert index.search(vectors[4], top_k=1)[0][0] == "4"
+    assert {doc_id for doc_id, _ in index.search(vectors[0], top_k=5, category="x")} == {"0", "4"}
+
+
+def test_backfill_from_mongo(tmp_path):
+    import mongomock
+    from vector_codec import encode_vector
+
+    vectors = random_vectors(3)
+    collection = mongomock.MongoClient().db.articles
+    collection.insert_many([
+        {"_id": "a", "category": "x", "pub_date": datetime(2024, 1, 1), "content_vector": encode_vector(vectors[0], "float32")},
+        {"_id": "b", "category": "y", "pub_date": datetime(2024, 1, 2), "content_vector": encode_vector(vectors[1], "array")},
+        {"_id": "c", "category": "y"},
+    ])
+    store = VectorFileStore(str(tmp_path), dim=DIM)
+    store.append(["a"], vectors[:1])
+
+    assert store.check_consistency(collection)["missing_in_store"] == ["b"]
+    assert store.backfill(collection, ids=["b", "c"]) == 1
+    np.testing.assert_allclose(store.get_vectors(["b"])[0], normalized(vectors)[1], rtol=1e-6)
+    assert store.backfill(collection) == 0
+    assert store.check_consistency(collection)["missing_in_store"] == []
+
+    store.reset()
+    assert store.backfill(collection) == 2 and len(store) == 2
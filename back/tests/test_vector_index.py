@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import numpy as np
+
+from vector_index import VectorIndex
+
+DIM = 8
+
+
+def random_vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def test_search_returns_nearest_first():
+    vectors = random_vectors(50)
+    index = VectorIndex(dim=DIM, initial_capacity=4)
+    index.add([f"a{i}" for i in range(50)], vectors)
+
+    hits = index.search(vectors[7], top_k=3)
+    assert hits[0][0] == "a7"
+    assert abs(hits[0][1] - 1.0) < 1e-5
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert len(index) == 50
+
+
+def test_filters_on_category_and_dates():
+    vectors = random_vectors(6)
+    index = VectorIndex(dim=DIM)
+    index.add(
+        [f"a{i}" for i in range(6)], vectors,
+        categories=["eco", "sport"] * 3,
+        dates=[datetime(2024, 1, day) for day in range(1, 7)]
+    )
+
+    hits = index.search(vectors[0], top_k=10, category="sport")
+    assert {doc_id for doc_id, _ in hits} == {"a1", "a3", "a5"}
+
+    hits = index.search(vectors[0], top_k=10, category="eco", start=datetime(2024, 1, 2), end=datetime(2024, 1, 5))
+    assert {doc_id for doc_id, _ in hits} == {"a2"}
+
+    assert index.search(vectors[0], category="inconnue") == []
+
+
+def test_replace_and_remove():
+    vectors = random_vectors(3)
+    index = VectorIndex(dim=DIM)
+    index.add(["a", "b", "c"], vectors)
+    index.add(["a"], vectors[2:3])
+
+    assert len(index) == 3
+    assert index.search(vectors[2], top_k=1)[0][1] > 0.999
+
+    index.remove(["a", "c"])
+    assert len(index) == 1
+    assert [doc_id for doc_id, _ in index.search(vectors[2], top_k=5)] == ["b"]
+
+
+def test_duplicate_ids_in_one_add_keep_last():
+    vectors = random_vectors(3)
+    index = VectorIndex(dim=DIM)
+    index.add(["a", "b", "a"], vectors, categories=["x", "y", "z"])
+
+    assert len(index) == 2
+    hits = index.search(vectors[2], top_k=5)
+    assert hits[0][0] == "a" and hits[0][1] > 0.999
+    assert index.search(vectors[2], category="x") == []
+
+    index.remove(["a"])
+    assert [doc_id for doc_id, _ in index.search(vectors[0], top_k=5)] == ["b"]
+
+
+def test_compaction_keeps_live_rows():
+    vectors = random_vectors(10)
+    index = VectorIndex(dim=DIM, compact_ratio=0.3)
+    index.add([str(i) for i in range(10)], vectors, categories=["c"] * 10)
+    index.remove([str(i) for i in range(5)])
+
+    assert index._removed == 0  # Compactée
+    hits = index.search_batch(vectors[5:7], top_k=1, category="c")
+    assert [row[0][0] for row in hits] == ["5", "6"]
@@ -0,0 +1,77 @@
+import numpy as np
+
+class OutlierReassigner:
+    """
+    Réaffecte les articles isolés par DBSCAN vers la catégorie la plus proche.
+    La matrice des embeddings (triée par catégorie) et les normes sont construites une seule fois par passage ;
+    toutes les distances moyennes article isolé → catégorie sont calculées par produit matriciel.
+    """
+
+    def __init__(self, categories, min_articles=3, max_distance=0.2, block_size=256):
+        """
+        :param categories: Dictionnaire {catégorie: [articles]} (les articles sans vecteur sont ignorés).
+        :param min_articles: Nombre minimal d'articles (et d'embeddings) pour qu'une catégorie soit candidate.
+        :param max_distance: Distance euclidienne moyenne maximale pour accepter une réaffectation.
+        :param block_size: Nombre d'articles isolés traités par bloc (borne la mémoire de la matrice de distances).
+        """
+        self.max_distance = max_distance
+        self.block_size = block_size
+
+        self.names, blocks = [], []
+        for name, articles in categories.items():
+            vectors = [article["content_vector"] for article in articles if article.get("content_vector") is not None]
+            if len(articles) < min_articles or len(vectors) < min_articles:
+                continue
+            self.names.append(name)
+            blocks.append(np.asarray(vectors, dtype=np.float32))
+
+        if blocks:
+            self.counts = np.array([len(block) for block in blocks])
+            self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+            self.matrix = np.vstack(blocks)
+            self.squared_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        else:
+            self.matrix = None
+
+    def mean_distances(self, vectors):
+        """Distance euclidienne moyenne de chaque vecteur à chaque catégorie candidate (matrice n × catégories)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        result = np.empty((len(vectors), len(self.names)), dtype=np.float32)
+        for start in range(0, len(vectors), self.block_size):
+            block = vectors[start:start + self.block_size]
+            # ‖a − b‖² = ‖a‖² + ‖b‖² − 2·a·b, pour toutes les paires du bloc en une opération
+            squared = (
+                np.einsum("ij,ij->i", block, block)[:, None]
+                + self.squared_norms[None, :]
+                - 2.0 * (block @ self.matrix.T)
+            )
+            distances = np.sqrt(np.maximum(squared, 0.0))
+            result[start:start + len(block)] = np.add.reduceat(distances, self.offsets, axis=1) / self.counts
+        return result
+
+    def reassign(self, outliers):
+        """
+        Choisit une catégorie cible pour chaque article isolé.
+        :param outliers: Liste de (article, catégorie d'origine).
+        :return: Liste de (article, catégorie d'origine, catégorie cible ou None).
+        """
+        scorable = [i for i, (article, _) in enumerate(outliers) if article.get("content_vector") is not None]
+        targets = [None] * len(outliers)
+        if self.matrix is None or not scorable:
+            return [(article, source, None) for article, source in outliers]
+
+        distances = self.mean_distances([outliers[i][0]["content_vector"] for i in scorable])
+
+        # La catégorie d'origine d'un article n'est jamais candidate
+        for row, i in enumerate(scorable):
+            source = outliers[i][1]
+            if source in self.names:
+                distances[row, self.names.index(source)] = np.inf
+
+        best = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(len(scorable)), best]
+        for row, i in enumerate(scorable):
+            if best_distances[row] < self.max_distance:
+                targets[i] = self.names[best[row]]
+
+        return [(article, source, target) for (article, source), target in zip(outliers, targets)]
@@ -1,28 +1,97 @@
 import numpy as np
+from vector_codec import decode_vector
+from vector_index import VectorIndex
+from bson import ObjectId
 
 class SearchEmbeddings:
     """Classe pour rechercher des articles par similarité d'embeddings."""
 
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, batch_size=1000, vector_store=None):
+        """
+        :param vector_store: VectorFileStore optionnel ; s'il est fourni, l'index est ouvert depuis le disque au lieu de MongoDB.
+        """
         self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.vector_store = vector_store
+        self.index = None
+        self.titles = {}
 
     def cosine_similarity(self, vec1, vec2):
         """Calcule la similarité cosinus entre deux vecteurs."""
         vec1, vec2 = np.array(vec1), np.array(vec2)
         return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
-    def search_similar_articles(self, query_embedding, top_k=5):
-        """Recherche les articles les plus proches d'un embedding donné."""
-        articles = self.db_manager.collection.find(
+    def build_index(self):
+        """Charge tous les articles vectorisés dans un VectorIndex, par lots."""
+        if self.vector_store is not None:
+            # ⚡ Ouverture en memmap : les titres sont chargés à la demande
+            self.index = self.vector_store.to_index()
+            self.titles = {}
+            print(f"📚 Index de similarité ouvert depuis le disque : {len(self.index)} articles")
+            return self.index
+
+        self.index = VectorIndex()
+        self.titles = {}
+        cursor = self.db_manager.collection.find(
             {"content_vector": {"$exists": True}},
-            {"_id": 0, "title": 1, "content_vector": 1}
+            {"_id": 1, "title": 1, "category": 1, "pub_date": 1, "content_vector": 1},
+            batch_size=self.batch_size
         )
 
-        scored_articles = []
-        for article in articles:
-            similarity = self.cosine_similarity(query_embedding, article["content_vector"])
-            scored_articles.append((article["title"], similarity))
+        batch = []
+        for article in cursor:
+            batch.append(article)
+            if len(batch) >= self.batch_size:
+                self.add_articles(batch)
+                batch = []
+        if batch:
+            self.add_articles(batch)
+
+        print(f"📚 Index de similarité construit : {len(self.index)} articles")
+        return self.index
+
+    def add_articles(self, articles, embeddings=None):
+        """Ajoute des articles (et leurs embeddings, s'ils ne sont pas dans les documents) à l'index."""
+        if self.index is None:
+            return
+        if embeddings is None:
+            embeddings = [decode_vector(article["content_vector"]) for article in articles]
+        ids = [str(article["_id"]) for article in articles]
+        self.index.add(
+            ids,
+            np.asarray(embeddings, dtype=np.float32),
+            categories=[article.get("category") for article in articles],
+            dates=[article.get("pub_date") for article in articles]
+        )
+        for doc_id, article in zip(ids, articles):
+            self.titles[doc_id] = article.get("title")
 
-        # 🔥 Trier par similarité décroissante et renvoyer les `top_k`
-        scored_articles.sort(key=lambda x: x[1], reverse=True)
-        return scored_articles[:top_k]
+    def remove_articles(self, ids):
+        """Retire des articles de l'index."""
+        if self.index is None:
+            return
+        ids = [str(doc_id) for doc_id in ids]
+        self.index.remove(ids)
+        for doc_id in ids:
+            self.titles.pop(doc_id, None)
+
+    def search_similar_batch(self, query_embeddings, top_k=5, category=None, start=None, end=None):
+        """Recherche les articles les plus proches de plusieurs embeddings en une passe."""
+        if self.index is None:
+            self.build_index()
+        results = self.index.search_batch(query_embeddings, top_k, category, start, end)
+        self._load_titles([doc_id for hits in results for doc_id, _ in hits])
+        return [[(self.titles.get(doc_id), score) for doc_id, score in hits] for hits in results]
+
+    def _load_titles(self, ids):
+        """Récupère en une requête les titres des résultats qui ne sont pas encore connus."""
+        missing = list({doc_id for doc_id in ids if doc_id not in self.titles})
+        if not missing:
+            return
+        cursor = self.db_manager.collection.find({"_id": {"$in": [ObjectId(doc_id) for doc_id in missing]}}, {"title": 1})
+        for article in cursor:
+            self.titles[str(article["_id"])] = article.get("title")
+
+    def search_similar_articles(self, query_embedding, top_k=5, category=None, start=None, end=None):
+        """Recherche les articles les plus proches d'un embedding donné."""
+        return self.search_similar_batch([query_embedding], top_k, category, start, end)[0]
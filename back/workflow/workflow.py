@@ -8,38 +8,46 @@ from llama_index.core.workflow import (
 from database_manager import DatabaseManager
 from rss_scraper import RSSScraper
 from embedding_generator import EmbeddingGenerator
+from embedding_cache import EmbeddingCache
+from summary_cache import SummaryCache
+from telegram_outbox import TelegramOutbox
+from run_ledger import RunLedger
+from vector_file_store import VectorFileStore
 from search_embeddings import SearchEmbeddings
-from news_processing_utils import summarize_cluster, generate_cluster_label, send_telegram_message
+from news_processing_utils import asummarize_cluster, agenerate_cluster_label
 from mongo_docstore import MongoDBDocStore
-from datetime import date
+from vector_codec import has_vector
+from outlier_reassignment import OutlierReassigner
+from metrics import get_metrics
+from datetime import date, datetime
 import numpy as np
 import os
-from sklearn.cluster import DBSCAN
-from collections import defaultdict
+import asyncio
+import logging
+from clustering import ClusteringEngine
+from cluster_store import ClusterStore
+from collections import Counter, defaultdict
 from dotenv import load_dotenv
 from llama_index.utils.workflow import draw_all_possible_flows
 from datetime import date, timedelta
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+metrics = get_metrics()  # Durées, requêtes MongoDB/OpenAI et coûts attribués à chaque étape
 
-MAX_TOKENS = 8000  # Pour garder une marge de sécurité
-
-def truncate_text(text, max_tokens=MAX_TOKENS):
-    tokens = text.split()
-    if len(tokens) > max_tokens:
-        print(f"⚠️ Texte tronqué à {max_tokens} tokens")
-        return " ".join(tokens[:max_tokens])
-    return text
-
-# Définition des événements
+# Définition des événements (identifiants d'articles uniquement : les étapes chargent les champs utiles)
 class ArticlesScraped(Event):
-    articles: list
+    article_ids: list
+    start_date: datetime
+    end_date: datetime
 
 class ArticlesIndexed(Event):
-    articles: list
+    article_ids: list
+    start_date: datetime
+    end_date: datetime
 
 class ArticlesClustered(Event):
-    clusters: dict
+    clusters: dict  # {catégorie: {id_cluster: [ids d'articles]}}
 
 class ClustersLabeled(Event):
     labeled_clusters: dict
@@ -49,64 +57,135 @@ class ArticlesSummarized(Event):
 
 # Classe principale du workflow
 class NewsProcessingWorkflow(Workflow):
-    def __init__(self, duration=1):  
-        super().__init__(timeout=600, verbose=True)
+    def __init__(self, duration=1, batch_size=1000, incremental_clusters=True, max_parallel_clusters=16,
+                 combined_labels=False, timeout=600, run_id=None, retry_failed=False):  
+        """
+        :param timeout: Durée maximale du passage en secondes (None pour aucune limite).
+        :param run_id: Identifiant d'un passage interrompu à reprendre (ses étapes terminées ne sont pas rejouées).
+        :param retry_failed: Envoie aussi les messages Telegram en échec ou restés en attente des passages précédents.
+        """
+        super().__init__(timeout=timeout, verbose=True)
         self.db_manager = DatabaseManager()
+        # 🧾 Journal des passages : sortie de chaque étape et avancement cluster par cluster
+        self.ledger = RunLedger(self.db_manager.db["workflow_runs"])
+        if run_id is None:
+            self.run_id = self.ledger.start({"duration": duration})
+        else:
+            self.run_id = run_id
+            duration = self.ledger.resume(run_id).get("duration", duration)
         self.scraper = RSSScraper(self.db_manager)
         self.docstore = MongoDBDocStore(
             uri=os.getenv("MONGO_URI"),
             db_name=os.getenv("MONGO_DB_NAME"),
             collection_name=os.getenv("MONGO_COLLECTION")
         )
-        self.embedder = EmbeddingGenerator(self.db_manager, self.docstore, os.getenv("OPENAI_API_KEY"))
+        self.embedding_cache = EmbeddingCache(self.db_manager.db["embedding_cache"])
+        self.embedder = EmbeddingGenerator(
+            self.db_manager, self.docstore, os.getenv("OPENAI_API_KEY"), cache=self.embedding_cache
+        )
+        # 🗃️ Résumés et labels mémorisés d'un passage à l'autre (expiration via index TTL)
+        self.summary_cache = SummaryCache(
+            self.db_manager.db["summary_cache"], ttl_days=int(os.getenv("SUMMARY_CACHE_TTL_DAYS", 30))
+        )
+        # 📨 File d'envoi Telegram persistée : une reprise n'envoie que les messages encore en attente
+        self.outbox = TelegramOutbox(self.db_manager.db["telegram_outbox"])
+        self.retry_failed = retry_failed
         self.duration = duration  
-        
+        self.batch_size = batch_size
+        self.max_parallel_clusters = max_parallel_clusters
+        # 🏷️ Label produit dans le même appel que le résumé (plus d'appel dédié pour les clusters sans label)
+        self.combined_labels = combined_labels
+        self.clustering = ClusteringEngine(eps=0.2, min_samples=4)
+        # 🧷 Clusters persistés : chaque passage ne rattache que les nouveaux articles
+        self.cluster_store = ClusterStore(self.db_manager.db["clusters"], self.clustering) if incremental_clusters else None
+
+        # 💽 Stockage de vecteurs sur disque (optionnel), alimenté par l'étape d'embedding
+        vector_store_path = os.getenv("VECTOR_STORE_PATH")
+        self.vector_store = VectorFileStore(vector_store_path) if vector_store_path else None
+        if self.vector_store is not None:
+            self.embedder.vector_sinks.append(self.vector_store)
+
+    def _replay(self, step_name, event_cls):
+        """Renvoie l'événement enregistré si l'étape est déjà terminée pour ce passage (None sinon)."""
+        output = self.ledger.step_output(self.run_id, step_name)
+        if output is None:
+            return None
+        print(f"⏩ Étape {step_name} déjà terminée pour le passage {self.run_id}, reprise de son résultat.")
+        return event_cls(**output)
+
+    def _checkpoint(self, step_name, event_cls, **fields):
+        """Enregistre la sortie d'une étape dans le journal et renvoie l'événement correspondant."""
+        self.ledger.complete_step(self.run_id, step_name, fields)
+        return event_cls(**fields)
 
     @step
+    @metrics.instrument_step
     async def scrape_articles(self, ev: StartEvent) -> ArticlesScraped:
+        replayed = self._replay("scrape_articles", ArticlesScraped)
+        if replayed is not None:
+            return replayed
         print("📡 Scraping des flux RSS en cours...")
 
+        start_date, end_date = self.db_manager.get_time_window(self.duration)
+
         feeds_with_categories = self.scraper.get_rss_feeds_with_categories()
         if not feeds_with_categories:
             print("❌ Aucun flux RSS enregistré en base !")
-            return ArticlesScraped(articles=[])
+            return self._checkpoint("scrape_articles", ArticlesScraped,
+                                    article_ids=[], start_date=start_date, end_date=end_date)
 
-        for feed_url, category in feeds_with_categories.items():
-            print(f"📡 Scraping {feed_url} (Catégorie : {category})")
-            self.scraper.scrape_feed(feed_url, category)
+        totals = await self.scraper.scrape_all(feeds_with_categories)
 
-        articles = self.docstore.get_all_documents()
-        print(f"📌 Articles à indexer : {len(articles)}")
-        return ArticlesScraped(articles=articles)
+        print(f"📌 Articles ajoutés ou mis à jour : {len(totals['ids'])}")
+        return self._checkpoint("scrape_articles", ArticlesScraped,
+                                article_ids=totals["ids"], start_date=start_date, end_date=end_date)
 
     @step
+    @metrics.instrument_step
     async def index_articles(self, ev: ArticlesScraped) -> ArticlesIndexed:
+        replayed = self._replay("index_articles", ArticlesIndexed)
+        if replayed is not None:
+            return replayed
         print("🔍 Génération des embeddings...")
 
-        articles_to_update = [
-            article for article in ev.articles 
-            if not article.get("content_vector")
-        ]
-
-        print(f"📌 Articles nécessitant un embedding : {len(articles_to_update)}")
+        # 🚀 Seuls les articles sans `content_vector` sont lus (en flux), puis encodés par requêtes groupées
+        embedded_ids = await self.embedder.aembed_missing(batch_size=self.batch_size)
 
-        for article in articles_to_update:
-            title = article.get('title', 'Titre inconnu')
-            content = article.get('content', '')
-            text = truncate_text(f"{title} {content}")
-            embedding = self.embedder.generate_embedding(text)
-            if embedding:
-                self.docstore.update_document(article["_id"], {"content_vector": embedding})
-
-        updated_articles = self.docstore.get_all_documents()
-        return ArticlesIndexed(articles=updated_articles)
+        print(f"📌 Articles encodés : {len(embedded_ids)}")
+        print(f"🗃️ Cache d'embeddings : {self.embedding_cache.stats()}")
+        return self._checkpoint("index_articles", ArticlesIndexed,
+                                article_ids=embedded_ids, start_date=ev.start_date, end_date=ev.end_date)
 
     @step
+    @metrics.instrument_step
     async def refine_article_categories(self, ev: ArticlesIndexed) -> ArticlesClustered:
+        replayed = self._replay("refine_article_categories", ArticlesClustered)
+        if replayed is not None:
+            return replayed
         print(f"🧩 Vérification et ajustement des catégories des articles publiés ces {self.duration} derniers jours...")
 
-        # Récupération des articles selon cette période
-        articles = self.db_manager.get_articles_since(self.duration)
+        # Récupération des seuls champs utiles des articles de la période
+        projection = {"title": 1, "category": 1}
+        if self.vector_store is None:
+            projection["content_vector"] = 1
+        # 👯 Les quasi-doublons ne sont ni encodés ni clusterisés : seul l'article canonique représente la dépêche
+        articles = list(self.db_manager.iter_articles_between(
+            ev.start_date, ev.end_date, projection, batch_size=self.batch_size,
+            filters={"duplicate_of": {"$exists": False}}
+        ))
+        if self.vector_store is not None:
+            # ⚡ Vecteurs lus depuis le memmap, sans les faire transiter par MongoDB
+            vectors = self.vector_store.get_vectors([article["_id"] for article in articles])
+            missing = [article["_id"] for article, vector in zip(articles, vectors) if vector is None]
+            if missing:
+                # 🩹 Articles encodés avant l'activation du stockage (ou écriture interrompue) : complétés depuis MongoDB
+                added = self.vector_store.backfill(self.db_manager.collection, ids=missing, batch_size=self.batch_size)
+                if added:
+                    print(f"⚠️ {added} vecteurs absents du stockage sur disque, recopiés depuis MongoDB.")
+                    vectors = self.vector_store.get_vectors([article["_id"] for article in articles])
+            for article, vector in zip(articles, vectors):
+                if vector is not None:
+                    article["content_vector"] = vector
 
         # Log pour vérification
         print(f"📅 Nombre d'articles récupérés : {len(articles)}")
@@ -117,7 +196,9 @@ class NewsProcessingWorkflow(Workflow):
             categories[category].append(article)
 
         updated_clusters = {}
+        isolated_articles = []
 
+        groups = {}
         for category, cat_articles in categories.items():
             print(f"📌 Analyse de la catégorie : {category} ({len(cat_articles)} articles)")
 
@@ -127,95 +208,161 @@ class NewsProcessingWorkflow(Workflow):
                 updated_clusters[category] = {"0": cat_articles}  # ✅ Fixe le format de la structure
                 continue  
 
-            embeddings = np.array([article["content_vector"] for article in cat_articles if article.get("content_vector")])
+            vectorized = [article for article in cat_articles if has_vector(article)]
 
-            if embeddings.shape[0] < 3:  # ✅ Vérification qu'on a assez d'embeddings valides
+            if len(vectorized) < 3:  # ✅ Vérification qu'on a assez d'embeddings valides
                 print(f"⚠️ Pas assez de données pour clusteriser {category}.")
                 updated_clusters[category] = {"0": cat_articles}
                 continue
 
-            # 🔥 Clustering avec DBSCAN (on garde un eps raisonnable)
-            clustering = DBSCAN(eps=0.2, min_samples=4, metric='cosine').fit(embeddings)
-
-            category_clusters = defaultdict(list)
-            isolated_articles = []
-
-            for label, article in zip(clustering.labels_, cat_articles):
-                if label == -1:
-                    isolated_articles.append(article)
-                else:
-                    category_clusters[label].append(article)
-
-            updated_clusters[category] = {str(label): articles for label, articles in category_clusters.items()}
-
-            # 📌 Vérification des articles isolés
-            for article in isolated_articles:
-                best_category = None
-                best_distance = float("inf")
-
-                for other_category, other_articles in categories.items():
-                    if other_category == category or len(other_articles) < 3:
-                        continue
-                    
-                    other_embeddings = np.array([a["content_vector"] for a in other_articles if a.get("content_vector")])
-
-                    if other_embeddings.shape[0] < 3:
-                        continue
-
-                    avg_distance = np.mean([np.linalg.norm(article["content_vector"] - emb) for emb in other_embeddings])
-
-                    if avg_distance < best_distance:
-                        best_distance = avg_distance
-                        best_category = other_category
-
-                if best_category and best_distance < 0.2:
-                    print(f"🔄 Changement de catégorie : {article['title']} passe de {category} à {best_category}")
-                    if "0" not in updated_clusters[best_category]:
-                        updated_clusters[best_category]["0"] = []  # 🛠️ Initialisation correcte
-                    updated_clusters[best_category]["0"].append(article)
-                else:
-                    print(f"❌ {article['title']} reste dans {category}.")
-                    if "0" not in updated_clusters[category]:  
-                        updated_clusters[category]["0"] = []  # 🛠️ Initialisation correcte
-                    updated_clusters[category]["0"].append(article)
+            groups[category] = vectorized
+
+        if self.cluster_store is not None:
+            # 🧷 Rattachement incrémental aux clusters persistés (re-clustering complet seulement périodique)
+            persisted_clusters, isolated_articles = await self.cluster_store.aupdate(groups)
+            updated_clusters.update(persisted_clusters)
+        else:
+            # 🔥 Clustering (DBSCAN cosinus, eps raisonnable) de toutes les catégories en parallèle
+            labels_by_category = await self.clustering.acluster_many({
+                category: np.array([article["content_vector"] for article in vectorized])
+                for category, vectorized in groups.items()
+            })
+
+            for category, vectorized in groups.items():
+                category_clusters = defaultdict(list)
+
+                for label, article in zip(labels_by_category[category], vectorized):
+                    if label == -1:
+                        isolated_articles.append((article, category))
+                    else:
+                        category_clusters[label].append(article)
+
+                updated_clusters[category] = {str(label): members for label, members in category_clusters.items()}
+
+        # 📌 Vérification des articles isolés : une seule passe vectorisée sur toutes les catégories
+        # (détail article par article en DEBUG, synthèse par catégorie sinon)
+        reassigner = OutlierReassigner(categories)
+        moved, kept = Counter(), Counter()
+        for article, category, best_category in reassigner.reassign(isolated_articles):
+            if best_category:
+                logger.debug(f"🔄 Changement de catégorie : {article['title']} passe de {category} à {best_category}")
+                moved[category] += 1
+                target = best_category
+            else:
+                logger.debug(f"❌ {article['title']} reste dans {category}.")
+                kept[category] += 1
+                target = category
+            updated_clusters.setdefault(target, {}).setdefault("0", []).append(article)
+        for category in sorted(moved.keys() | kept.keys()):
+            print(f"🔄 {category} : {moved[category]} articles isolés changent de catégorie, {kept[category]} restent.")
 
         print(f"✅ Vérification des catégories terminée avec {len(updated_clusters)} catégories mises à jour.")
-        return ArticlesClustered(clusters=updated_clusters)
+
+        # 🆔 Seuls les identifiants sont transmis aux étapes suivantes
+        clusters = {
+            category: {
+                cluster_id: [str(article["_id"]) for article in members]
+                for cluster_id, members in category_clusters.items()
+            }
+            for category, category_clusters in updated_clusters.items()
+        }
+        return self._checkpoint("refine_article_categories", ArticlesClustered, clusters=clusters)
 
     @step
+    @metrics.instrument_step
     async def label_clusters(self, ev: ArticlesClustered) -> ClustersLabeled:
+        replayed = self._replay("label_clusters", ClustersLabeled)
+        if replayed is not None:
+            return replayed
         print("🏷️ Génération des labels pour chaque cluster...")
-
-        labeled_clusters = {}
-        
-        for category, category_clusters in ev.clusters.items():
-            for cluster_id, articles in category_clusters.items():
-                titles = [article["title"] for article in articles]
-                label = generate_cluster_label(titles)
-                
-                labeled_clusters[(category, cluster_id)] = {
-                    "label": label,
-                    "category": category,
-                    "articles": articles
-                }
+        self.summary_cache.reset_stats()
+
+        # 🧾 Clusters déjà traités lors d'une tentative précédente de ce passage
+        done = self.ledger.get_progress(self.run_id, "label_clusters")
+
+        async def label_cluster(category, cluster_id, article_ids):
+            if (category, cluster_id) in done:
+                return (category, cluster_id), done[(category, cluster_id)]
+
+            articles = self.docstore.get_documents_by_ids(article_ids, {"title": 1})
+            titles = [article["title"] for article in articles]
+
+            # 🏷️ Un cluster persisté garde son label d'un passage à l'autre
+            label = None
+            if self.cluster_store is not None and cluster_id != "0":
+                label = self.cluster_store.get_label(cluster_id)
+            if label is None and not self.combined_labels:
+                label = await agenerate_cluster_label(titles, self.summary_cache, [article["_id"] for article in articles])
+                if self.cluster_store is not None and cluster_id != "0":
+                    self.cluster_store.set_label(cluster_id, label)
+
+            cluster_info = {
+                "label": label,
+                "category": category,
+                "article_ids": article_ids
+            }
+            self.ledger.record_progress(self.run_id, "label_clusters", (category, cluster_id), cluster_info)
+            return (category, cluster_id), cluster_info
+
+        # 🚀 Tous les clusters en parallèle : le débit est borné par le pool LLM (quotas OpenAI)
+        labeled_clusters = dict(await asyncio.gather(*(
+            label_cluster(category, cluster_id, article_ids)
+            for category, category_clusters in ev.clusters.items()
+            for cluster_id, article_ids in category_clusters.items()
+        )))
 
         print(f"✅ Labels générés pour {len(labeled_clusters)} clusters.")
-        return ClustersLabeled(labeled_clusters=labeled_clusters)
+        return self._checkpoint("label_clusters", ClustersLabeled, labeled_clusters=labeled_clusters)
 
     @step
+    @metrics.instrument_step
     async def summarize_clusters(self, ev: ClustersLabeled) -> ArticlesSummarized:
+        replayed = self._replay("summarize_clusters", ArticlesSummarized)
+        if replayed is not None:
+            return replayed
         print("📝 Génération des résumés pour chaque cluster...")
 
-        summaries = {}
-        for (category, cluster_id), cluster_info in ev.labeled_clusters.items():
-            label = cluster_info["label"]
-            articles = cluster_info["articles"]
-            summary = summarize_cluster(articles)
-            summaries[f"{category} - {label}"] = summary
-
-        return ArticlesSummarized(summaries=summaries)
+        in_flight = asyncio.Semaphore(self.max_parallel_clusters)
+        done = self.ledger.get_progress(self.run_id, "summarize_clusters")
+        if done:
+            print(f"⏩ {len(done)} résumés déjà obtenus pour le passage {self.run_id}")
+
+        async def summarize_one(category, cluster_id, cluster_info):
+            if (category, cluster_id) in done:
+                return done[(category, cluster_id)]
+            # 📥 Contenus chargés cluster par cluster : la mémoire reste bornée par les clusters en cours
+            async with in_flight:
+                articles = self.docstore.get_documents_by_ids(cluster_info["article_ids"], {"title": 1, "content": 1, "token_count": 1, "duplicate_count": 1})
+                label = cluster_info["label"]
+                if label is not None:
+                    summary = await asummarize_cluster(articles, self.summary_cache)
+                else:
+                    # 🏷️ Label et résumé en un seul appel (repli sur l'appel dédié si la réponse JSON est inexploitable)
+                    label, summary = await asummarize_cluster(articles, self.summary_cache, with_label=True)
+                    if label is None:
+                        label = await agenerate_cluster_label(
+                            [article["title"] for article in articles], self.summary_cache,
+                            [article["_id"] for article in articles]
+                        )
+                    if self.cluster_store is not None and cluster_id != "0":
+                        self.cluster_store.set_label(cluster_id, label)
+            result = (f"{category} - {label}", summary)
+            self.ledger.record_progress(self.run_id, "summarize_clusters", (category, cluster_id), result)
+            return result
+
+        summaries = dict(await asyncio.gather(*(
+            summarize_one(category, cluster_id, cluster_info)
+            for (category, cluster_id), cluster_info in ev.labeled_clusters.items()
+        )))
+
+        # 📊 Taux de succès du cache de synthèse sur ce passage (labels + résumés)
+        for kind, stats in self.summary_cache.report().items():
+            print(f"🗃️ Cache {kind} : {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%})")
+
+        return self._checkpoint("summarize_clusters", ArticlesSummarized, summaries=summaries)
 
     @step
+    @metrics.instrument_step
     async def finalize_workflow(self, ev: ArticlesSummarized) -> StopEvent:
         print("📅 Synthèse des faits marquants du jour par thème :")
 
@@ -232,21 +379,31 @@ class NewsProcessingWorkflow(Workflow):
                 messages.append(text)
             return messages
 
+        messages = []
         for cluster_name, summary in ev.summaries.items():
             category, label = cluster_name.split(" - ", 1)
             message = f"\n🌍 {category.capitalize()} : {label}\n{summary}"
+            messages.extend(split_message(message))
 
-            for chunk in split_message(message):
-                try:
-                    # Utilise ton code d'envoi de message ici (ajuste en fonction de ton implémentation Telegram)
-                    send_telegram_message(chunk)
-                except Exception as e:
-                    print(f"❌ Erreur lors de l'envoi du message : {e}")
+        # 📨 Messages rattachés au passage : une reprise (`--resume`) ne renvoie pas ceux déjà partis
+        print(f"📥 {self.outbox.enqueue(messages, self.run_id)} nouveaux messages dans la file Telegram")
+        if self.retry_failed:
+            print(f"🔁 {self.outbox.retry_failed()} messages en échec remis dans la file")
+            await self.outbox.deliver()  # Messages en attente de tous les passages
+        else:
+            await self.outbox.deliver(self.run_id)
+        self.ledger.finish(self.run_id)
 
         return StopEvent(result="✅ Workflow terminé avec succès !")
 
 # Création du workflow
-def get_news_workflow(duration=1):
-    return NewsProcessingWorkflow(duration=duration)
+def get_news_workflow(duration=1, timeout=600, run_id=None, retry_failed=False):
+    return NewsProcessingWorkflow(
+        duration=duration,
+        timeout=timeout,
+        run_id=run_id,
+        retry_failed=retry_failed,
+        combined_labels=os.getenv("COMBINED_LABELS", "false").lower() == "true"
+    )
 
 #draw_all_possible_flows(NewsProcessingWorkflow, filename="NewsProcessingWorkflow.html")
\ No newline at end of file